@@ -1,49 +1,223 @@
+"""
+Benchmark the alignment pipeline stage by stage on synthetic witness families.
+
+Every (stage, size) measurement runs in a fresh process, so its peak RSS is
+its own. Results are written as JSON; with --baseline, the run fails when a
+stage is slower or larger than the stored baseline by more than --tolerance.
+
+    python benchmark.py --sizes 1000 5000 20000 --output bench.json
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
 import time
-import random
-import string
-from lib.genalog_lcs import LCS
-from lib.genalog_anchor import align_w_anchor
 
+from textual_synopsis import genalog_alignment
+from textual_synopsis.genalog_anchor import align_w_anchor
+from textual_synopsis.genalog_lcs import LCS
+from textual_synopsis.multi_align import StarAligner
+from textual_synopsis.synthetic import generate_witness_family
+from textual_synopsis.to_excel import align_to_words, create_excel_from_texts
 
-def generate_random_string(length):
-    return "".join(random.choices(string.ascii_letters + " ", k=length))
+DEFAULT_SIZES = [1000, 5000, 20000]
+DEFAULT_TOLERANCE = 0.25
+# Timer noise allowance, so sub-millisecond stages don't flag regressions
+MIN_SLACK_SECONDS = 0.005
 
 
-def benchmark_lcs(length):
-    s1 = generate_random_string(length)
-    s2 = generate_random_string(length)
+def _pair(family):
+    return family[0][1], family[1][1]
 
-    start = time.time()
-    lcs = LCS(s1, s2)
-    duration = time.time() - start
-    print(f"LCS (size={length}): {duration:.4f}s")
 
+def _star(family):
+    return StarAligner(family).align()
 
-def benchmark_anchor_align(length):
-    s1 = generate_random_string(length)
-    # Make s2 similar to s1 to simulate real case
-    s2 = list(s1)
-    # Mutate 10%
-    for _ in range(length // 10):
-        idx = random.randint(0, length - 1)
-        if random.random() < 0.5:
-            s2[idx] = random.choice(string.ascii_letters)  # Subst
-        else:
-            # Deletion (replace with empty, handle join later) or Insert
-            pass
-    s2 = "".join(s2)
 
-    start = time.time()
-    res = align_w_anchor(s1, s2)
-    duration = time.time() - start
-    print(f"Align Anchor (size={length}): {duration:.4f}s")
+def _word_texts(family):
+    return [{"name": tid, "content": row} for tid, row in _star(family)]
 
 
-if __name__ == "__main__":
-    print("Benchmarking LCS...")
-    for size in [100, 1000, 5000, 10000]:
-        benchmark_lcs(size)
+# Each stage: (setup(family) -> input, run(input), chars processed(family))
+STAGES = {
+    "lcs": (
+        lambda f: _pair(f),
+        lambda pair: LCS(*pair),
+        lambda f: len(f[0][1]) + len(f[1][1]),
+    ),
+    "score": (
+        lambda f: _pair(f),
+        lambda pair: genalog_alignment.score(*pair),
+        lambda f: len(f[0][1]) + len(f[1][1]),
+    ),
+    "global_align": (
+        lambda f: _pair(f),
+        lambda pair: genalog_alignment.align(*pair),
+        lambda f: len(f[0][1]) + len(f[1][1]),
+    ),
+    "anchored_align": (
+        lambda f: _pair(f),
+        lambda pair: align_w_anchor(*pair),
+        lambda f: len(f[0][1]) + len(f[1][1]),
+    ),
+    "star_align": (
+        lambda f: f,
+        _star,
+        lambda f: sum(len(t) for _, t in f),
+    ),
+    "align_to_words": (
+        _word_texts,
+        align_to_words,
+        lambda f: sum(len(t) for _, t in f),
+    ),
+    "excel": (
+        _word_texts,
+        lambda texts: create_excel_from_texts(texts, io.BytesIO()),
+        lambda f: sum(len(t) for _, t in f),
+    ),
+}
+
+
+def _peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def _measure(conn, stage, size, witnesses, mutation_rate, repeat):
+    setup, run, chars = STAGES[stage]
+    family = generate_witness_family(size, witnesses, mutation_rate, seed=size)
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull  # stages report progress with print
+    try:
+        data = setup(family)
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run(data)
+            timings.append(time.perf_counter() - start)
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+    seconds = min(timings)
+    conn.send(
+        {
+            "stage": stage,
+            "size": size,
+            "witnesses": witnesses,
+            "seconds": seconds,
+            "peak_rss_mb": _peak_rss_mb(),
+            "chars_per_second": chars(family) / seconds if seconds else None,
+        }
+    )
+    conn.close()
+
+
+def measure(stage, size, witnesses, mutation_rate, repeat):
+    """Measure one stage at one size in a fresh process"""
+    recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(
+        target=_measure,
+        args=(send_conn, stage, size, witnesses, mutation_rate, repeat),
+    )
+    process.start()
+    send_conn.close()
+    try:
+        result = recv_conn.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError(
+            f"{stage} at size {size} crashed (exit code {process.exitcode})"
+        )
+    return result
+
 
-    print("\nBenchmarking Anchor Alignment...")
-    for size in [100, 1000, 5000, 10000]:
-        benchmark_anchor_align(size)
+def _key(result):
+    return (result["stage"], result["size"], result["witnesses"])
+
+
+def find_regressions(results, baseline, tolerance):
+    """Compare results against a baseline, return a list of regression messages"""
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(_key(result))
+        if before is None:
+            continue
+        for metric, slack in [("seconds", MIN_SLACK_SECONDS), ("peak_rss_mb", 0)]:
+            limit = before[metric] * (1 + tolerance) + slack
+            if result[metric] > limit:
+                regressions.append(
+                    f"{result['stage']} (size {result['size']}): {metric} "
+                    f"{result[metric]:.3f} > {before[metric]:.3f} + {tolerance:.0%}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--witnesses", type=int, default=3)
+    parser.add_argument("--mutation-rate", type=float, default=0.02)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--stages", nargs="+", choices=sorted(STAGES), default=list(STAGES)
+    )
+    parser.add_argument("--output", help="Write results as JSON to this file.")
+    parser.add_argument("--baseline", help="Fail if results regress past this file.")
+    parser.add_argument("--save-baseline", help="Write results as a new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'stage':<16}{'size':>8}{'seconds':>10}{'peak MB':>10}{'chars/s':>12}")
+    for stage in args.stages:
+        for size in args.sizes:
+            r = measure(stage, size, args.witnesses, args.mutation_rate, args.repeat)
+            results.append(r)
+            print(
+                f"{stage:<16}{size:>8}{r['seconds']:>10.4f}"
+                f"{r['peak_rss_mb']:>10.1f}{r['chars_per_second'] or 0:>12.0f}"
+            )
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "witnesses": args.witnesses,
+            "mutation_rate": args.mutation_rate,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+            print(f"Written results to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
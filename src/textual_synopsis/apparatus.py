@@ -0,0 +1,310 @@
+"""
+Variant apparatus and consensus text of a multiple alignment.
+
+The apparatus is built in one streaming pass over the word columns of the
+alignment (see ``to_excel.iter_word_columns``): every column gets its
+consensus (majority) reading, the share of witnesses that read it, and the
+variant readings with the sigla of the witnesses reading them. An empty
+reading is an omission. Nothing but the current column and running counts
+is held in memory, so long collations export in linear time.
+
+Outputs, written next to the alignment:
+
+    consensus.txt           the consensus readings, joined by spaces
+    apparatus.jsonl / .csv  the variant columns (or all columns)
+    apparatus_stats.json    column counts and the agreement of every witness
+"""
+
+import argparse
+import bisect
+import csv
+import json
+import logging
+import os
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from .instrument import span
+from .to_excel import iter_word_columns, load_aligned_texts
+
+CONSENSUS_FILENAME = "consensus.txt"
+STATS_FILENAME = "apparatus_stats.json"
+APPARATUS_FORMATS = ("jsonl", "csv")
+# Columns of a .tsmsa file decoded at a time, rounded up to the next word break
+CHUNK_COLUMNS = 1 << 16
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ApparatusEntry:
+    """The readings of one word column"""
+
+    column: int  # index of the word column
+    consensus: str  # the majority reading, ties going to the earlier witness
+    agreement: float  # share of the witnesses reading the consensus
+    readings: dict  # reading -> sigla reading it, the consensus first
+
+    @property
+    def is_variant(self):
+        return len(self.readings) > 1
+
+
+@dataclass
+class ApparatusStats:
+    """Running totals of an apparatus"""
+
+    sigla: list
+    columns: int = 0
+    variant_columns: int = 0
+    consensus_words: int = 0
+    agreements: list = field(default_factory=list)  # per witness, consensus readings
+
+    def __post_init__(self):
+        if not self.agreements:
+            self.agreements = [0] * len(self.sigla)
+
+    def add(self, entry, words):
+        self.columns += 1
+        self.consensus_words += bool(entry.consensus)
+        if not entry.is_variant:
+            self.agreements = [count + 1 for count in self.agreements]
+            return
+        self.variant_columns += 1
+        for i, word in enumerate(words):
+            self.agreements[i] += word == entry.consensus
+
+    def summary(self):
+        columns = self.columns or 1
+        return {
+            "columns": self.columns,
+            "variant_columns": self.variant_columns,
+            "consensus_words": self.consensus_words,
+            "witness_agreement": {
+                siglum: count / columns
+                for siglum, count in zip(self.sigla, self.agreements)
+            },
+        }
+
+
+def iter_msa_word_columns(msa, chunk_columns=CHUNK_COLUMNS):
+    """
+    Yield the word columns of an ``msa_format.MSAFile`` without decoding all of it
+
+    Arguments:
+        msa (MSAFile) : an open ``.tsmsa`` alignment
+        chunk_columns (int, optional) : alignment columns decoded at a time, extended
+            to the next word break. Defaults to ``CHUNK_COLUMNS``.
+
+    Returns:
+        generator : the same word tuples as ``iter_word_columns`` over ``msa.rows()``
+    """
+    boundaries = msa.word_boundaries
+    start = 0
+    while True:
+        next_break = bisect.bisect_left(boundaries, start + chunk_columns)
+        if next_break == len(boundaries):
+            rows = [row for _, row in msa.rows(start)]
+            yield from iter_word_columns(rows, gap_char=msa.gap_char)
+            return
+        end = int(boundaries[next_break])
+        rows = [row for _, row in msa.rows(start, end)]
+        # The chunk ends right before a break, so its last word is complete
+        yield from iter_word_columns(rows, gap_char=msa.gap_char)
+        start = end + 1
+
+
+def iter_apparatus(sigla, columns):
+    """
+    Yield the apparatus entry of every word column
+
+    Arguments:
+        sigla (list) : the witness sigla, in row order
+        columns (iterable) : word tuples, one word per witness
+
+    Returns:
+        generator : ``(ApparatusEntry, words)`` of every column
+    """
+    all_sigla = list(sigla)
+    for index, words in enumerate(columns):
+        if words.count(words[0]) == len(words):
+            # Most columns agree, skip counting
+            yield ApparatusEntry(index, words[0], 1.0, {words[0]: all_sigla}), words
+            continue
+        ranked = Counter(words).most_common()
+        consensus, count = ranked[0]
+        readings = {reading: [] for reading, _ in ranked}
+        for siglum, word in zip(sigla, words):
+            readings[word].append(siglum)
+        yield ApparatusEntry(index, consensus, count / len(words), readings), words
+
+
+def write_apparatus(
+    sigla, columns, output_dir, apparatus_format="jsonl", variants_only=True
+):
+    """
+    Stream the consensus text, apparatus and statistics of an alignment to output_dir
+
+    Arguments:
+        sigla (list) : the witness sigla, in row order
+        columns (iterable) : word tuples, one word per witness
+        output_dir (str) : directory to write to
+        apparatus_format (str, optional) : "jsonl" (one column per line) or "csv"
+            (one reading per line). Defaults to "jsonl".
+        variants_only (bool, optional) : leave out the columns where all witnesses
+            agree. Defaults to True.
+
+    Raises:
+        ValueError: for an unknown apparatus format
+
+    Returns:
+        dict : the statistics written to ``apparatus_stats.json``
+    """
+    if apparatus_format not in APPARATUS_FORMATS:
+        raise ValueError(
+            f"Unknown apparatus format {apparatus_format!r}, use one of {APPARATUS_FORMATS}"
+        )
+    os.makedirs(output_dir, exist_ok=True)
+    apparatus_path = os.path.join(output_dir, f"apparatus.{apparatus_format}")
+    stats = ApparatusStats(sigla=list(sigla))
+
+    with (
+        span("apparatus", format=apparatus_format) as fields,
+        open(
+            os.path.join(output_dir, CONSENSUS_FILENAME), "w", encoding="utf-8"
+        ) as consensus_file,
+        open(apparatus_path, "w", encoding="utf-8", newline="") as apparatus_file,
+    ):
+        if apparatus_format == "csv":
+            writer = csv.writer(apparatus_file)
+            writer.writerow(
+                ["column", "consensus", "agreement", "reading", "witnesses"]
+            )
+
+        separator = ""
+        for entry, words in iter_apparatus(stats.sigla, columns):
+            stats.add(entry, words)
+            if entry.consensus:
+                consensus_file.write(separator + entry.consensus)
+                separator = " "
+            if variants_only and not entry.is_variant:
+                continue
+            if apparatus_format == "csv":
+                for reading, witnesses in entry.readings.items():
+                    writer.writerow(
+                        [
+                            entry.column,
+                            entry.consensus,
+                            f"{entry.agreement:.3f}",
+                            reading,
+                            " ".join(witnesses),
+                        ]
+                    )
+            else:
+                record = {
+                    "column": entry.column,
+                    "consensus": entry.consensus,
+                    "agreement": round(entry.agreement, 4),
+                    "readings": entry.readings,
+                }
+                apparatus_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        fields["columns"] = stats.columns
+
+    summary = stats.summary()
+    with open(os.path.join(output_dir, STATS_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    logger.info(
+        f"Written apparatus to {apparatus_path}: {stats.variant_columns} of "
+        f"{stats.columns} word columns vary"
+    )
+    return summary
+
+
+@contextmanager
+def open_word_columns(source):
+    """
+    Open a saved alignment as its witness sigla and its word columns
+
+    Arguments:
+        source (str) : a ``.tsmsa`` file, or a directory of ``aligned_*.txt`` files
+
+    Raises:
+        ValueError: for a directory without aligned files
+
+    Returns:
+        tuple : the sigla and a generator of word tuples, valid inside the ``with`` block
+    """
+    if os.path.isdir(source):
+        texts = load_aligned_texts(source)
+        if not texts:
+            raise ValueError(f"No aligned files found in {source}")
+        yield [t["name"] for t in texts], iter_word_columns(
+            [t["content"] for t in texts]
+        )
+        return
+
+    # numpy is only needed for the binary format
+    from .msa_format import load_msa
+
+    with load_msa(source) as msa:
+        yield [tid.replace(".txt", "") for tid in msa.ids], iter_msa_word_columns(msa)
+
+
+def export_apparatus(source, output_dir, apparatus_format="jsonl", variants_only=True):
+    """
+    Write the apparatus of a saved alignment, see ``write_apparatus``
+
+    Arguments:
+        source (str) : a ``.tsmsa`` file, or a directory of ``aligned_*.txt`` files
+        output_dir (str) : directory to write to
+
+    Returns:
+        dict : the apparatus statistics
+    """
+    with open_word_columns(source) as (sigla, columns):
+        return write_apparatus(
+            sigla,
+            columns,
+            output_dir,
+            apparatus_format=apparatus_format,
+            variants_only=variants_only,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export the consensus text and variant apparatus of an alignment."
+    )
+    parser.add_argument(
+        "source", help="An alignment.tsmsa file or a directory of aligned_*.txt files."
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="Directory to write to. Defaults to the directory of the alignment.",
+    )
+    parser.add_argument("--format", choices=APPARATUS_FORMATS, default="jsonl")
+    parser.add_argument(
+        "--all-columns",
+        action="store_true",
+        help="Also list the columns where all witnesses agree.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    output_dir = args.output_dir or (
+        args.source
+        if os.path.isdir(args.source)
+        else os.path.dirname(args.source) or "."
+    )
+    export_apparatus(
+        args.source,
+        output_dir,
+        apparatus_format=args.format,
+        variants_only=not args.all_columns,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+Align many collections in one run, on one shared worker pool.
+
+A collection is a directory of text files, aligned the way ``pipeline``
+aligns its input_dir. Collections are every directory below a root that
+holds files (``aligned`` output directories excluded), or the directories
+listed in a manifest, one per line, relative to the manifest.
+
+The pairwise alignments of all collections are scheduled on one process
+pool, so imports are paid once and small collections don't leave workers
+idle. A collection is collated and written, also in the pool, as soon as
+its last pair is done. A worker killed by the OS breaks the pool: the pool
+is replaced and the work it lost is rerun one task at a time, so that only
+the pair or collection that kills its worker fails. Collections whose files
+and settings have not changed since the last run (recorded in a state file)
+are skipped, and a report with the timing and failures of every collection
+is written at the end.
+
+    python -m textual_synopsis.pipeline batch corpus/ --output-root out/
+    python -m textual_synopsis.pipeline batch chapters.txt --report report.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass, field
+
+from .corpus import hash_file, load_corpus, scan_corpus
+from .engines import run_engine
+from .jobs import digest_key
+from .multi_align import StarAligner
+from .pipeline import _megabytes, write_alignment
+from .workers import PairFailure
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = "batch_state.json"
+REPORT_FILENAME = "batch_report.json"
+OUTPUT_DIRNAME = "aligned"
+
+
+@dataclass
+class Collection:
+    """One directory of texts to align, and the outcome of aligning it"""
+
+    name: str  # path relative to the root or manifest, identifies it in the state
+    input_dir: str
+    output_dir: str
+    status: str = "pending"  # "aligned", "skipped" or "failed"
+    texts: int = 0
+    seconds: float = 0.0
+    input_hash: str = None
+    error: str = None
+    failures: list = field(default_factory=list)  # PairFailure as dicts
+
+
+def discover_collections(
+    source, output_root=None, exclude=(STATE_FILENAME, REPORT_FILENAME)
+):
+    """Find the collections of a root directory or a manifest file
+
+    Arguments:
+        source (str) : a root directory, or a manifest file listing one collection
+            directory per line (blank lines and ``#`` comments are ignored)
+        output_root (str, optional) : directory to write outputs under, mirroring the
+            collection paths. Defaults to an ``aligned`` directory in each collection.
+        exclude (iterable, optional) : file names that are not texts, such as the
+            state and report files of a batch. Defaults to their default names.
+
+    Returns:
+        list : ``Collection`` in sorted (root) or listed (manifest) order
+    """
+    if os.path.isdir(source):
+        base = source
+        names = []
+        skip = os.path.abspath(output_root) if output_root else None
+        for dirpath, dirnames, filenames in os.walk(source):
+            dirnames[:] = sorted(
+                d
+                for d in dirnames
+                if d != OUTPUT_DIRNAME
+                and not d.startswith(".")
+                and os.path.abspath(os.path.join(dirpath, d)) != skip
+            )
+            if any(not f.startswith(".") and f not in exclude for f in filenames):
+                names.append(os.path.relpath(dirpath, source))
+    else:
+        base = os.path.dirname(source)
+        with open(source, "r", encoding="utf-8") as f:
+            lines = [line.split("#", 1)[0].strip() for line in f]
+        names = [line for line in lines if line]
+
+    collections = []
+    for name in names:
+        input_dir = os.path.normpath(os.path.join(base, name))
+        if output_root:
+            output_dir = os.path.normpath(os.path.join(output_root, name))
+        else:
+            output_dir = os.path.join(input_dir, OUTPUT_DIRNAME)
+        collections.append(Collection(name, input_dir, output_dir))
+    return collections
+
+
+def _quiet_worker():
+    # Per-collection progress messages from the pool would drown the batch ones
+    package_logger = logging.getLogger(__name__.rpartition(".")[0])
+    package_logger.setLevel(max(logging.WARNING, package_logger.getEffectiveLevel()))
+
+
+def _align_pair(engines, gt, noise):
+    """Runs in the pool: tries the engines of a pair in order
+
+    Returns ``(aligned, attempts)``, ``aligned`` is None if every engine failed.
+    """
+    attempts = []
+    for engine, params in engines:
+        try:
+            return run_engine(engine, gt, noise, **params), attempts
+        except MemoryError:
+            attempts.append((engine, "memory", "MemoryError"))
+        except Exception as e:
+            attempts.append((engine, "error", f"{type(e).__name__}: {e}"))
+    return None, attempts
+
+
+def _write_collection(aligner, pairwise, failures, output_dir, output_format, excel):
+    """Runs in the pool: collates a collection and writes its outputs.
+    Returns the failures, including those of duplicates of failed texts."""
+    os.makedirs(output_dir, exist_ok=True)
+    results = aligner.collate(pairwise, failures)
+    write_alignment(
+        output_dir,
+        aligner.texts,
+        results,
+        pivot_id=aligner.pivot_id,
+        failures=aligner.failures,
+        output_format=output_format,
+        excel=excel,
+    )
+    return aligner.failures
+
+
+class _Running:
+    """A collection whose pairs are being aligned"""
+
+    def __init__(self, collection, aligner, num_pairs, started):
+        self.collection = collection
+        self.aligner = aligner
+        self.remaining = num_pairs
+        self.pairwise = {}
+        self.failures = []
+        self.started = started
+
+
+def _load_state(path):
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
+
+
+def _save_state(path, state):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def run_batch(
+    collections,
+    state_path=None,
+    force=False,
+    max_workers=None,
+    output_format="text",
+    excel=True,
+    exclude=(STATE_FILENAME, REPORT_FILENAME),
+    **aligner_options,
+):
+    """Align every collection, sharing one process pool
+
+    Arguments:
+        collections (list) : ``Collection`` to align, see ``discover_collections()``
+        state_path (str, optional) : JSON file of the input hashes of aligned collections.
+            Defaults to no state: nothing is skipped or recorded.
+        force (bool, optional) : align unchanged collections too. Defaults to False.
+        max_workers (int, optional) : pool processes. Defaults to the CPU count.
+        output_format (str, optional) : see ``pipeline.write_alignment()``. Defaults to "text".
+        excel (bool, optional) : write the Excel table of every collection. Defaults to True.
+        exclude (iterable, optional) : file names of the collections that are not
+            texts, see ``discover_collections()``. Defaults to the state and report files.
+        **aligner_options : passed on to the ``StarAligner`` of every collection
+
+    Returns:
+        list : the collections, with their status, timing and failures filled in
+    """
+    state = _load_state(state_path)
+    settings = dict(aligner_options, output_format=output_format, excel=excel)
+    max_workers = max_workers or os.cpu_count() or 1
+    # Collections with pairs in the pool at once, bounds memory on large corpora
+    max_running = 2 * max_workers
+
+    pending = iter(collections)
+    running = {}  # future -> (_Running, PairJob) or (_Running, None) for the write
+    lost = []  # the work of a broken pool
+    suspects = deque()  # lost work, rerun one at a time in a pool of its own
+    num_running = 0
+    num_done = 0
+
+    def submit(pool, run, job=None):
+        """Submits a pair, or the write of the collection without a job"""
+        try:
+            if job is None:
+                future = pool.submit(
+                    _write_collection,
+                    run.aligner,
+                    run.pairwise,
+                    run.failures,
+                    run.collection.output_dir,
+                    output_format,
+                    excel,
+                )
+            else:
+                future = pool.submit(_align_pair, job.engines, job.gt, job.noise)
+        except BrokenProcessPool:
+            lost.append((run, job))
+            return None
+        running[future] = (run, job)
+        return future
+
+    def schedule(pool, collection):
+        started = time.monotonic()
+        try:
+            # Hashing alone decides whether to skip, before decoding anything
+            files = scan_corpus(collection.input_dir, exclude=exclude)
+            collection.input_hash = digest_key(
+                [(f.name, hash_file(f.path, f.size)) for f in files], settings
+            )
+            unchanged = state.get(collection.name) == collection.input_hash
+            if unchanged and not force and os.path.isdir(collection.output_dir):
+                collection.status = "skipped"
+                return False
+            texts = [
+                (f.name, f.text)
+                for f in load_corpus(
+                    collection.input_dir, max_workers=1, exclude=exclude
+                )
+            ]
+            collection.texts = len(texts)
+            if len(texts) < 2:
+                raise ValueError("Need at least 2 text files to align")
+            # Pivot scoring runs in this process, the pool is busy with pairs
+            aligner = StarAligner(texts, **dict(aligner_options, max_workers=1))
+            jobs = aligner.pair_jobs()
+        except Exception as e:
+            collection.status = "failed"
+            collection.error = f"{type(e).__name__}: {e}"
+            logger.error(f"{collection.name}: {collection.error}")
+            return False
+        run = _Running(collection, aligner, len(jobs), started)
+        # Largest pairs first, so that the last ones to finish are short
+        jobs.sort(key=lambda job: len(job.gt) * len(job.noise), reverse=True)
+        for job in jobs:
+            submit(pool, run, job)
+        if not jobs:
+            # All texts are duplicates of the pivot
+            submit(pool, run)
+        return True
+
+    def written(run, failures=None, error=None):
+        nonlocal num_running, num_done
+        collection = run.collection
+        num_running -= 1
+        num_done += 1
+        collection.seconds = time.monotonic() - run.started
+        if error is not None:
+            collection.status = "failed"
+            collection.error = error
+            logger.error(f"{collection.name}: {collection.error}")
+            return
+        collection.status = "aligned"
+        collection.failures = [asdict(f) for f in failures]
+        if state_path:
+            state[collection.name] = collection.input_hash
+        logger.info(
+            f"[{num_done}/{len(collections)}] {collection.name}: "
+            f"aligned {collection.texts} texts in {collection.seconds:.1f}s"
+        )
+
+    def pair_done(pool, run, job, aligned, attempts):
+        if aligned is None:
+            engine, reason, detail = attempts[-1]
+            run.failures.append(
+                PairFailure(
+                    other_id=job.other_id,
+                    reason=reason,
+                    engine=engine,
+                    detail=detail,
+                    attempts=[(e, r) for e, r, _ in attempts],
+                )
+            )
+        else:
+            run.pairwise[job.key] = aligned
+        run.remaining -= 1
+        if run.remaining == 0:
+            submit(pool, run)
+
+    def failed(pool, run, job, reason, error):
+        if job is None:
+            written(run, error=error)
+        else:
+            pair_done(pool, run, job, None, [(job.engines[0][0], reason, error)])
+
+    pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_quiet_worker)
+    # A worker killed by the OS (out of memory on Linux) breaks its pool and
+    # loses all the work in it. That work is rerun alone in a pool of one, so
+    # that only the task that kills its worker again fails.
+    isolation = None
+    isolated = None  # the future running in isolation
+    try:
+        while True:
+            while num_running < max_running and not lost:
+                collection = next(pending, None)
+                if collection is None:
+                    break
+                if schedule(pool, collection):
+                    num_running += 1
+                else:
+                    num_done += 1
+            if lost:
+                for future in [f for f in running if f is not isolated]:
+                    lost.append(running.pop(future))
+                logger.error(f"A worker died, rerunning its {len(lost)} tasks alone")
+                suspects.extend(lost)
+                lost.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(
+                    max_workers=max_workers, initializer=_quiet_worker
+                )
+            if isolated is None and suspects:
+                if isolation is None:
+                    isolation = ProcessPoolExecutor(
+                        max_workers=1, initializer=_quiet_worker
+                    )
+                isolated = submit(isolation, *suspects.popleft())
+            if not running:
+                break
+
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                run, job = running.pop(future)
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    if future is isolated:
+                        error = "the worker died, killed out of memory?"
+                        failed(pool, run, job, "crashed", error)
+                        isolation.shutdown(wait=False)
+                        isolation = None
+                    else:
+                        lost.append((run, job))
+                    continue
+                except Exception as e:
+                    failed(pool, run, job, "error", f"{type(e).__name__}: {e}")
+                    continue
+                finally:
+                    if future is isolated:
+                        isolated = None
+                if job is None:
+                    written(run, failures=result)
+                else:
+                    pair_done(pool, run, job, *result)
+    finally:
+        for executor in (pool, isolation):
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+        if state_path:
+            _save_state(state_path, state)
+    return collections
+
+
+def write_report(path, collections, seconds):
+    """Write a JSON summary of a batch run, returns the counts by status"""
+    counts = {}
+    for c in collections:
+        counts[c.status] = counts.get(c.status, 0) + 1
+    report = {
+        "seconds": seconds,
+        "counts": counts,
+        "failed_pairs": sum(len(c.failures) for c in collections),
+        "collections": [asdict(c) for c in collections],
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="textual_synopsis.pipeline batch",
+        description="Align every collection of a root directory or manifest on one shared worker pool.",
+    )
+    parser.add_argument(
+        "source",
+        help="Root directory of collections, or a manifest file listing one collection directory per line.",
+    )
+    parser.add_argument(
+        "--output-root",
+        default=None,
+        help="Write outputs under this directory, mirroring the collections. Defaults to an 'aligned' directory in each collection.",
+    )
+    parser.add_argument(
+        "--state",
+        default=None,
+        help=f"State file of unchanged collections to skip. Defaults to {STATE_FILENAME} in the output root, root or manifest directory.",
+    )
+    parser.add_argument(
+        "--report",
+        default=None,
+        help=f"Summary report file. Defaults to {REPORT_FILENAME} next to the state file.",
+    )
+    parser.add_argument(
+        "--force", action="store_true", help="Align unchanged collections too."
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help="Worker processes. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--pivot",
+        default="longest",
+        help="Pivot selection: 'longest' or 'centroid'. Defaults to longest.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Peak memory (MB) allowed per pairwise alignment. Enables engine planning.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Estimated time (seconds) allowed for the pairwise alignments of a collection. Enables engine planning.",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["text", "msa", "both"],
+        default="text",
+        help="Save aligned_*.txt files (text), a compact binary alignment.tsmsa (msa), or both.",
+    )
+    parser.add_argument(
+        "--no-excel",
+        action="store_true",
+        help="Skip the Excel tables. Skips importing pandas and openpyxl.",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="Logging level.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(message)s")
+
+    if not os.path.exists(args.source):
+        logger.error(f"Error: '{args.source}' does not exist.")
+        return 1
+
+    base = args.output_root or (
+        args.source if os.path.isdir(args.source) else os.path.dirname(args.source)
+    )
+    state_path = args.state or os.path.join(base, STATE_FILENAME)
+    report_path = args.report or os.path.join(
+        os.path.dirname(state_path), REPORT_FILENAME
+    )
+    # The state and report may be written into the scanned tree, they are not texts
+    exclude = {
+        STATE_FILENAME,
+        REPORT_FILENAME,
+        os.path.basename(state_path),
+        os.path.basename(report_path),
+    }
+
+    collections = discover_collections(
+        args.source, output_root=args.output_root, exclude=exclude
+    )
+    logger.info(f"Found {len(collections)} collections in {args.source}")
+    if args.output_root:
+        os.makedirs(args.output_root, exist_ok=True)
+
+    started = time.monotonic()
+    run_batch(
+        collections,
+        state_path=state_path,
+        force=args.force,
+        max_workers=args.max_workers,
+        output_format=args.output_format,
+        excel=not args.no_excel,
+        exclude=exclude,
+        pivot=args.pivot,
+        memory_budget=_megabytes(args.memory_budget),
+        time_budget=args.time_budget,
+    )
+    seconds = time.monotonic() - started
+    counts = write_report(report_path, collections, seconds)
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    logger.info(f"Batch done in {seconds:.1f}s: {summary}. Report: {report_path}")
+    return 1 if counts.get("failed") else 0
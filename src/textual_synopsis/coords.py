@@ -0,0 +1,188 @@
+"""
+Random access between witness coordinates and alignment columns.
+
+An aligned row maps the characters of its witness's text (the row without
+gaps) to alignment columns, but answering "which column holds character
+80,000 of witness C" from the row alone means counting the gaps before it.
+``AlignmentIndex`` keeps, for every row, its number of characters before
+every ``SAMPLE_COLUMNS``-th column. A lookup binary searches the samples
+and then counts within one stretch of ``SAMPLE_COLUMNS`` columns, so it
+costs ``O(log n + SAMPLE_COLUMNS)`` whatever the length of the alignment,
+for 4 bytes per row every ``SAMPLE_COLUMNS`` columns.
+
+The word columns of ``to_excel.align_to_words`` are indexed too, by the
+columns that separate them (``MSAFile.word_boundaries``), as are the word
+starts of every witness, found on their first query.
+"""
+
+import numpy as np
+
+from .genalog_alignment import GAP_CHAR
+
+# Columns between two sampled character counts
+SAMPLE_COLUMNS = 64
+
+
+def _codes(row):
+    return np.frombuffer(row.encode("utf-32-le"), dtype=np.uint32)
+
+
+class AlignmentIndex:
+    """Coordinate lookups over equal-length aligned rows"""
+
+    def __init__(
+        self, rows, gap_char=GAP_CHAR, word_boundaries=None, sample=SAMPLE_COLUMNS
+    ):
+        """
+        Arguments:
+            rows (list) : ``(id, aligned_row)`` tuples, as returned by ``StarAligner.align()``
+            gap_char (str, optional) : gap char of the rows. Defaults to GAP_CHAR.
+            word_boundaries (array, optional) : the columns with a space in any row,
+                if already known (see ``MSAFile.word_boundaries``). Defaults to
+                finding them.
+            sample (int, optional) : columns between sampled counts. Defaults to
+                ``SAMPLE_COLUMNS``.
+
+        Raises:
+            ValueError: for rows of different lengths
+        """
+        self.ids = [tid for tid, _ in rows]
+        self._rows = dict(rows)
+        self.gap_char = gap_char
+        self.sample = sample
+        self.num_columns = len(rows[0][1]) if rows else 0
+
+        gap = ord(gap_char)
+        spaces = np.zeros(self.num_columns, dtype=bool)
+        self._counts = {}
+        self._word_starts = {}
+        for tid, row in rows:
+            if len(row) != self.num_columns:
+                raise ValueError(
+                    f"Length mismatch: {tid} has {len(row)} vs {self.num_columns}"
+                )
+            codes = _codes(row)
+            counts = np.zeros(len(codes) + 1, dtype=np.int64)
+            np.cumsum(codes != gap, out=counts[1:])
+            # The samples end with the row's total, for lookups past the last one
+            self._counts[tid] = np.append(counts[::sample], counts[-1]).astype(
+                np.uint32
+            )
+            if word_boundaries is None:
+                spaces |= codes == ord(" ")
+        if word_boundaries is None:
+            word_boundaries = np.flatnonzero(spaces)
+        self.word_boundaries = np.asarray(word_boundaries, dtype=np.int64)
+
+    @classmethod
+    def from_msa(cls, msa, sample=SAMPLE_COLUMNS):
+        """The index of an ``msa_format.MSAFile``. Its rows are decoded, once."""
+        return cls(
+            msa.rows(),
+            gap_char=msa.gap_char,
+            word_boundaries=msa.word_boundaries,
+            sample=sample,
+        )
+
+    def length(self, tid):
+        """Number of characters of the text of witness ``tid``"""
+        return int(self._counts[tid][-1])
+
+    def chars_before(self, tid, column):
+        """Number of characters of witness ``tid`` in the columns before ``column``"""
+        column = min(max(column, 0), self.num_columns)
+        k = column // self.sample
+        start = k * self.sample
+        stretch = self._rows[tid][start:column]
+        return int(self._counts[tid][k]) + len(stretch) - stretch.count(self.gap_char)
+
+    def position_at(self, tid, column):
+        """
+        The character of witness ``tid`` in ``column``
+
+        Returns:
+            int : its position in the witness's text, or None where the row has a gap
+        """
+        if self._rows[tid][column] == self.gap_char:
+            return None
+        return self.chars_before(tid, column)
+
+    def column_of(self, tid, position):
+        """
+        The column holding character ``position`` of the text of witness ``tid``
+
+        Raises:
+            IndexError: for a position past the end of the text
+        """
+        counts = self._counts[tid]
+        if not 0 <= position < counts[-1]:
+            raise IndexError(f"{tid} has no character {position}")
+        # The last sample at or before the character, then a count within its stretch
+        k = int(np.searchsorted(counts, position, side="right")) - 1
+        remaining = position - int(counts[k])
+        column = k * self.sample
+        row = self._rows[tid]
+        while True:
+            if row[column] != self.gap_char:
+                if remaining == 0:
+                    return column
+                remaining -= 1
+            column += 1
+
+    def word_column_of(self, column):
+        """
+        The word column (see ``to_excel.align_to_words``) holding ``column``. The
+        space columns between two word columns count with the first.
+        """
+        return int(np.searchsorted(self.word_boundaries, column, side="left"))
+
+    def word_columns(self, word):
+        """The columns ``[start, end)`` of word column ``word``"""
+        start = int(self.word_boundaries[word - 1]) + 1 if word > 0 else 0
+        end = (
+            int(self.word_boundaries[word])
+            if word < len(self.word_boundaries)
+            else self.num_columns
+        )
+        return start, end
+
+    def column_of_word(self, tid, word):
+        """
+        The column of the first character of word ``word`` of witness ``tid``,
+        counting the words of its own text
+
+        Raises:
+            IndexError: for a word past the end of the text
+        """
+        if tid not in self._word_starts:
+            text = self._rows[tid].replace(self.gap_char, "")
+            spaces = np.flatnonzero(_codes(text) == ord(" "))
+            self._word_starts[tid] = np.concatenate([[0], spaces + 1]) if text else []
+        starts = self._word_starts[tid]
+        if not 0 <= word < len(starts):
+            raise IndexError(f"{tid} has no word {word}")
+        return self.column_of(tid, int(starts[word]))
+
+    def project(self, tid, position, other):
+        """
+        The character of witness ``other`` aligned to character ``position`` of
+        witness ``tid``
+
+        Returns:
+            int : its position in the text of ``other``, or None where ``other``
+            has a gap
+        """
+        return self.position_at(other, self.column_of(tid, position))
+
+    def reading(self, tid, position, other):
+        """
+        What witness ``other`` reads in the word column of character ``position``
+        of witness ``tid``
+
+        Returns:
+            str : the word of ``other`` in that column, empty where it has none
+        """
+        start, end = self.word_columns(
+            self.word_column_of(self.column_of(tid, position))
+        )
+        return self._rows[other][start:end].replace(self.gap_char, "")
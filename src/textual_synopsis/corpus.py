@@ -0,0 +1,227 @@
+"""
+Loading the witness files of a collection.
+
+A collection is a directory, or a manifest file listing its files one per
+line (relative to the manifest, blank lines and ``#`` comments ignored),
+optionally filtered by extension. The files are first scanned for their
+sizes, without reading them, so callers can plan before paying for the
+reads. Loading then reads, hashes and normalizes every file: files of
+``MMAP_MIN_BYTES`` or more are memory-mapped, hashed and decoded straight
+from the map, and a corpus of ``PARALLEL_MIN_BYTES`` or more is loaded in a
+process pool, largest files first. Binary files (a NUL byte near the start)
+and files that are not UTF-8 are skipped with a warning. Texts that are
+already normalized skip the split and rejoin of every word.
+
+The sha256 of every file's bytes is recorded, so that results can be keyed
+by content (see ``jobs.digest_key``) without reading the files twice.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from .genalog_preprocess import join_tokens, tokenize
+from .instrument import record_span, span
+
+# Files from this size on are read through a memory map
+MMAP_MIN_BYTES = 1 << 20
+# Corpora from this total size on are decoded in a process pool
+PARALLEL_MIN_BYTES = 16 << 20
+# Bytes checked for a NUL byte to tell binaries from text
+BINARY_CHECK_BYTES = 8192
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CorpusFile:
+    """One witness file, with its text once loaded"""
+
+    name: str  # file name, identifies the witness
+    path: str
+    size: int  # bytes on disk
+    sha256: str = None  # hex digest of the bytes
+    text: str = None  # the normalized text
+    error: str = None  # why the file was skipped
+
+
+def _matches(name, extensions):
+    return extensions is None or name.lower().endswith(tuple(extensions))
+
+
+def scan_corpus(source, extensions=None, exclude=()):
+    """
+    List the files of a collection with their sizes, without reading them
+
+    Arguments:
+        source (str) : a directory, or a manifest file listing one file per line
+        extensions (iterable, optional) : only keep names ending with one of these,
+            e.g. ``[".txt"]``. Defaults to all files.
+        exclude (iterable, optional) : file names to leave out, e.g. files written
+            next to the texts. Defaults to none.
+
+    Raises:
+        FileNotFoundError: for a manifest entry that is not a file
+        ValueError: for manifest entries with the same file name
+
+    Returns:
+        list : ``CorpusFile`` in name (directory) or listed (manifest) order
+    """
+    if extensions is not None:
+        extensions = [
+            e.lower() if e.startswith(".") else f".{e.lower()}" for e in extensions
+        ]
+    files = []
+    if os.path.isdir(source):
+        with os.scandir(source) as entries:
+            for entry in entries:
+                if (
+                    entry.is_file()
+                    and not entry.name.startswith(".")
+                    and entry.name not in exclude
+                    and _matches(entry.name, extensions)
+                ):
+                    files.append(
+                        CorpusFile(entry.name, entry.path, entry.stat().st_size)
+                    )
+        files.sort(key=lambda f: f.name)
+        return files
+
+    base = os.path.dirname(source)
+    with open(source, "r", encoding="utf-8") as f:
+        names = [line.split("#", 1)[0].strip() for line in f]
+    for name in names:
+        if name and _matches(name, extensions):
+            path = os.path.normpath(os.path.join(base, name))
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"{path} listed in {source} is not a file")
+            if os.path.basename(path) in exclude:
+                continue
+            files.append(
+                CorpusFile(os.path.basename(path), path, os.path.getsize(path))
+            )
+    names = [f.name for f in files]
+    if len(set(names)) < len(names):
+        raise ValueError(f"{source} lists files with the same name")
+    return files
+
+
+@contextmanager
+def _file_bytes(path, size=None):
+    """The bytes of a file, memory-mapped when it is large"""
+    size = os.path.getsize(path) if size is None else size
+    with open(path, "rb") as f:
+        if size < MMAP_MIN_BYTES:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            yield view
+
+
+def hash_file(path, size=None):
+    """The sha256 hex digest of a file's bytes"""
+    with _file_bytes(path, size) as data:
+        return hashlib.sha256(data).hexdigest()
+
+
+def read_file(path, size=None):
+    """
+    Hash and decode a text file, memory-mapped when it is large
+
+    Arguments:
+        path (str) : the file
+        size (int, optional) : its size, if known. Defaults to a stat.
+
+    Raises:
+        ValueError: for a binary file
+        UnicodeDecodeError: for a file that is not UTF-8
+
+    Returns:
+        tuple : ``(sha256, text)``, the hex digest of the bytes and the decoded text
+    """
+    with _file_bytes(path, size) as data:
+        if data.find(b"\0", 0, BINARY_CHECK_BYTES) != -1:
+            raise ValueError("binary file")
+        return hashlib.sha256(data).hexdigest(), str(data, "utf-8")
+
+
+def normalize(text):
+    """Single spaces between words, like ``multi_align.normalize_text``"""
+    core = text.strip()
+    # Already normalized, as saved texts usually are: no tabs, newlines or other
+    # whitespace (none of them is printable) and no double spaces
+    if core.isprintable() and "  " not in core:
+        return core
+    return join_tokens(tokenize(text))
+
+
+def _load_file(path, size):
+    """Runs in the pool: ``(sha256, normalized text, error, seconds)`` of one file,
+    ``seconds`` being the ``(read, normalize)`` timings, for tracing"""
+    start = time.perf_counter()
+    try:
+        sha256, text = read_file(path, size)
+    except (OSError, ValueError) as e:  # UnicodeDecodeError is a ValueError
+        return None, None, str(e), (time.perf_counter() - start, 0.0)
+    read = time.perf_counter()
+    text = normalize(text)
+    return sha256, text, None, (read - start, time.perf_counter() - read)
+
+
+def load_corpus(source, extensions=None, max_workers=None, exclude=()):
+    """
+    Read, hash and normalize the files of a collection, see ``scan_corpus``
+
+    Arguments:
+        source (str) : a directory, or a manifest file listing one file per line
+        extensions (iterable, optional) : only load names ending with one of these.
+            Defaults to all files.
+        max_workers (int, optional) : processes decoding a large corpus. Defaults
+            to the CPU count, 1 decodes in this process.
+        exclude (iterable, optional) : file names to leave out. Defaults to none.
+
+    Returns:
+        list : the ``CorpusFile`` that were loaded, in ``scan_corpus`` order. Files
+        that could not be, binaries or files that are not UTF-8, are logged and
+        left out.
+    """
+    with span("load", directory=source) as fields:
+        files = scan_corpus(source, extensions=extensions, exclude=exclude)
+        total = sum(f.size for f in files)
+        max_workers = min(max_workers or os.cpu_count() or 1, len(files))
+
+        if max_workers > 1 and total >= PARALLEL_MIN_BYTES:
+            # Largest first, so that no big file is left for the end
+            order = sorted(files, key=lambda f: f.size, reverse=True)
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                results = dict(
+                    zip(
+                        (f.path for f in order),
+                        pool.map(
+                            _load_file,
+                            [f.path for f in order],
+                            [f.size for f in order],
+                        ),
+                    )
+                )
+            loaded = [results[f.path] for f in files]
+        else:
+            loaded = [_load_file(f.path, f.size) for f in files]
+
+        texts = []
+        for f, (sha256, text, error, seconds) in zip(files, loaded):
+            f.sha256, f.text, f.error = sha256, text, error
+            record_span("read", seconds[0], file=f.name, bytes=f.size)
+            if error is not None:
+                logger.warning(f"Skipping {f.path} due to error: {f.error}")
+            else:
+                record_span("normalize", seconds[1], file=f.name, chars=len(text))
+                texts.append(f)
+        fields["files"] = len(texts)
+        fields["bytes"] = total
+    return texts
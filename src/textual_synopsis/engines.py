@@ -0,0 +1,225 @@
+"""
+Pairwise alignment engines.
+
+Every engine shares the contract of `genalog_alignment.align()`: it takes a
+ground truth (pivot) string and a noisy string and returns a tuple
+``(aligned_gt, aligned_noise)`` of equal length, where removing the gap char
+restores the input strings.
+
+    global    - full Needleman-Wunsch over both texts, O(n*m) memory
+    anchored  - split at unique anchor words, align the pieces (genalog_anchor)
+    segmented - cut both texts into proportional chunks at word boundaries,
+                align chunk by chunk. Needs no anchors, so it degrades
+                gracefully on dissimilar texts, at the cost of quality.
+    fragment  - for a noise text much shorter than the pivot: find its locus
+                in the pivot by voting with shared word k-mers, then align it
+                semi-globally (free end gaps) within a window around the locus
+
+Every engine takes an optional ``cancel`` token (see ``progress``). The
+anchored and segmented engines check it between segments; a global
+alignment runs in one native call and can only be stopped by terminating
+the worker process it runs in.
+"""
+
+import re
+from collections import Counter, defaultdict
+
+from . import genalog_alignment
+from . import genalog_preprocess as preprocess
+from .genalog_alignment import GAP_CHAR
+from .genalog_anchor import MAX_ALIGN_SEGMENT_LENGTH, align_w_anchor, stitch_segments
+from .progress import check_cancelled
+
+
+def align_global(gt, noise, gap_char=GAP_CHAR, cancel=None):
+    """Full global alignment, see `genalog_alignment.align()`"""
+    check_cancelled(cancel)
+    return genalog_alignment.align(gt, noise, gap_char=gap_char)
+
+
+def align_anchored(
+    gt, noise, gap_char=GAP_CHAR, max_seg_length=MAX_ALIGN_SEGMENT_LENGTH, cancel=None
+):
+    """Anchored alignment, see `genalog_anchor.align_w_anchor()`"""
+    return align_w_anchor(
+        gt, noise, gap_char=gap_char, max_seg_length=max_seg_length, cancel=cancel
+    )
+
+
+def split_proportionally(tokens, num_segments):
+    """Split a list of tokens into ``num_segments`` chunks of roughly equal character length
+
+    Arguments:
+        tokens (list) : a list of tokens
+        num_segments (int) : number of chunks
+
+    Returns:
+        list : ``num_segments`` lists of tokens (some may be empty)
+    """
+    total = sum(len(tk) + 1 for tk in tokens)
+    segments = [[] for _ in range(num_segments)]
+    offset = 0
+    for tk in tokens:
+        seg_idx = min(offset * num_segments // max(total, 1), num_segments - 1)
+        segments[seg_idx].append(tk)
+        offset += len(tk) + 1
+    return segments
+
+
+def align_segmented(gt, noise, gap_char=GAP_CHAR, num_segments=2, cancel=None):
+    """Align two texts by cutting both into ``num_segments`` proportional chunks.
+
+    Chunk ``k`` of the ground truth is aligned against chunk ``k`` of the noise,
+    which bounds the DP of each call to roughly ``(n / k) * (m / k)`` cells.
+    Text that drifts across a chunk boundary is aligned against gaps, so this
+    is only meant for pairs that are too large or too dissimilar for the other engines.
+
+    Arguments:
+        gt (str) : ground truth text
+        noise (str) : text with ocr noise
+        gap_char (str, optional) : gap char used in alignment algorithm . Defaults to GAP_CHAR.
+        num_segments (int, optional) : number of chunks. Defaults to 2.
+        cancel (CancelToken, optional) : checked before every chunk. Defaults to None.
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+
+    Returns:
+        a tuple (str, str) of aligned ground truth and noise:
+            (aligned_gt, aligned_noise)
+    """
+    gt_segments = split_proportionally(preprocess.tokenize(gt), num_segments)
+    noise_segments = split_proportionally(preprocess.tokenize(noise), num_segments)
+
+    aligned_segments = []
+    for gt_segment, noise_segment in zip(gt_segments, noise_segments):
+        check_cancelled(cancel)
+        aligned_gt, aligned_noise = genalog_alignment.align(
+            preprocess.join_tokens(gt_segment),
+            preprocess.join_tokens(noise_segment),
+            gap_char=gap_char,
+        )
+        aligned_segments.append(
+            (aligned_gt, aligned_noise, bool(gt_segment), bool(noise_segment))
+        )
+    return stitch_segments(aligned_segments, gap_char=gap_char)
+
+
+# Words per k-mer when locating a fragment
+FRAGMENT_KMER = 3
+# Share of the fragment's k-mer hits that must fall near one locus
+MIN_LOCUS_SHARE = 0.5
+_WORD = re.compile(r"\S+")
+
+
+def locate_fragment(gt, noise, k=FRAGMENT_KMER):
+    """Find where a short text lies within a long one
+
+    Every word k-mer of ``noise`` found in ``gt`` votes for the offset between
+    the two. The densest band of offsets, about an eighth of the fragment wide
+    to allow for indels, is the locus.
+
+    Arguments:
+        gt (str) : the long text
+        noise (str) : the fragment
+        k (int, optional) : words per k-mer. Defaults to ``FRAGMENT_KMER``.
+
+    Returns:
+        tuple : ``(start, end)`` character offsets of the locus in ``gt``, or None
+        when too few k-mers agree on one locus
+    """
+    noise_words = noise.split()
+    kmers = defaultdict(list)
+    for j in range(len(noise_words) - k + 1):
+        kmers[tuple(noise_words[j : j + k])].append(j)
+    if not kmers:
+        return None
+
+    gt_matches = list(_WORD.finditer(gt))
+    gt_words = [m.group() for m in gt_matches]
+    first_words = {kmer[0] for kmer in kmers}
+    hits = []  # (offset in words, gt word index)
+    for i in range(len(gt_words) - k + 1):
+        if gt_words[i] in first_words:
+            for j in kmers.get(tuple(gt_words[i : i + k]), ()):
+                hits.append((i - j, i))
+    if not hits:
+        return None
+
+    band = max(len(noise_words) // 8, 1)
+    votes = Counter(offset // band for offset, _ in hits)
+    best = max(votes, key=lambda b: votes[b - 1] + votes[b] + votes[b + 1])
+    near = [(offset, i) for offset, i in hits if abs(offset // band - best) <= 1]
+    if len(near) < MIN_LOCUS_SHARE * len(hits):
+        return None
+
+    first = max(min(offset for offset, _ in near), 0)
+    last = min(max(offset for offset, _ in near) + len(noise_words), len(gt_words))
+    return gt_matches[first].start(), gt_matches[last - 1].end()
+
+
+def align_fragment(gt, noise, gap_char=GAP_CHAR, margin=None, cancel=None):
+    """Align a fragment within a much longer ground truth
+
+    The fragment is aligned semi-globally (see
+    ``genalog_alignment.align_semiglobal()``) within its locus in ``gt`` (see
+    ``locate_fragment()``) widened by ``margin`` characters on both sides, and
+    faces gaps in the rest of ``gt``. A fragment without a clear locus is
+    aligned semi-globally against all of ``gt``.
+
+    Arguments:
+        gt (str) : ground truth text
+        noise (str) : the fragment
+        gap_char (str, optional) : gap char used in alignment algorithm . Defaults to GAP_CHAR.
+        margin (int, optional) : characters added on both sides of the locus.
+            Defaults to a quarter of the fragment length.
+        cancel (CancelToken, optional) : checked before aligning. Defaults to None.
+
+    Returns:
+        a tuple (str, str) of aligned ground truth and noise
+    """
+    check_cancelled(cancel)
+    locus = locate_fragment(gt, noise)
+    if locus is None:
+        return genalog_alignment.align_semiglobal(gt, noise, gap_char=gap_char)
+
+    margin = len(noise) // 4 if margin is None else margin
+    start = max(locus[0] - margin, 0)
+    end = min(locus[1] + margin, len(gt))
+    check_cancelled(cancel)
+    aligned_gt, aligned_noise = genalog_alignment.align_semiglobal(
+        gt[start:end], noise, gap_char=gap_char
+    )
+    return (
+        gt[:start] + aligned_gt + gt[end:],
+        gap_char * start + aligned_noise + gap_char * (len(gt) - end),
+    )
+
+
+ENGINES = {
+    "global": align_global,
+    "anchored": align_anchored,
+    "segmented": align_segmented,
+    "fragment": align_fragment,
+}
+
+
+def run_engine(name, gt, noise, gap_char=GAP_CHAR, **params):
+    """Align ``gt`` and ``noise`` with the engine registered under ``name``
+
+    Arguments:
+        name (str) : a key of ``ENGINES``
+        gt (str) : ground truth text
+        noise (str) : text with ocr noise
+        gap_char (str, optional) : gap char used in alignment algorithm . Defaults to GAP_CHAR.
+        **params : engine specific keyword arguments
+
+    Raises:
+        ValueError: when no engine is registered under ``name``
+
+    Returns:
+        a tuple (str, str) of aligned ground truth and noise
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown alignment engine '{name}'")
+    return ENGINES[name](gt, noise, gap_char=gap_char, **params)
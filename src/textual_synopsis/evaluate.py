@@ -0,0 +1,374 @@
+"""
+Speed versus quality of the pairwise alignment engines.
+
+Every engine of ``engines.ENGINES`` aligns the same pairs of witnesses: the
+pivot (the longest witness) against every other one, for synthetic witness
+families (see ``synthetic``) and for real texts from a directory. Each run
+is compared with the exact global alignment of the pair:
+
+    seconds     fastest of ``repeat`` runs
+    peak_mb     peak traced Python memory of one more run, under tracemalloc
+    score       the genalog score of the alignment (see ``alignment_score``)
+    score_gap   how far below the optimal global score it falls
+    agreement   share of the characters aligned to the same partner (or to a
+                gap) as in the exact alignment
+    word_diffs  word columns of the pair's word table that differ from the
+                word table of the exact alignment
+
+    python -m textual_synopsis.evaluate --sizes 2000 10000 --output eval.json
+    python -m textual_synopsis.evaluate --input-dir texts/ --engines anchored segmented
+"""
+
+import argparse
+import difflib
+import json
+import logging
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+from .engines import ENGINES, run_engine
+from .genalog_alignment import (
+    GAP_CHAR,
+    GAP_EXT_PENALTY,
+    GAP_PENALTY,
+    MATCH_REWARD,
+    MISMATCH_PENALTY,
+)
+from .genalog_alignment import score as optimal_score
+from .multi_align import load_texts_from_directory
+from .synthetic import generate_witness_family
+from .to_excel import iter_word_columns
+
+DEFAULT_SIZES = [2000, 10000]
+REFERENCE_ENGINE = "global"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class EngineResult:
+    """One engine on one pair of witnesses"""
+
+    dataset: str
+    pair: str  # "pivot_id~other_id"
+    engine: str
+    chars: int  # characters of both texts
+    seconds: float = None
+    peak_mb: float = None
+    score: float = None
+    score_gap: float = None
+    agreement: float = None  # share of characters with the reference partner
+    word_diffs: int = None  # word columns differing from the reference table
+    error: str = None
+
+
+def alignment_score(aligned_gt, aligned_noise, gap_char=GAP_CHAR):
+    """
+    Score a pairwise alignment with the genalog scoring of ``genalog_alignment.align()``
+
+    A gap of length ``k`` costs ``GAP_PENALTY + (k - 1) * GAP_EXT_PENALTY``, as in
+    ``Bio.Align.PairwiseAligner``, so the exact global alignment scores
+    ``genalog_alignment.score()``.
+
+    Arguments:
+        aligned_gt (str) : the aligned ground truth
+        aligned_noise (str) : the aligned noise, of the same length
+        gap_char (str, optional) : gap char of the alignment. Defaults to GAP_CHAR.
+
+    Returns:
+        float : the score
+    """
+    total = 0.0
+    gap = None  # which row the current gap run is in
+    for a, b in zip(aligned_gt, aligned_noise):
+        if a == gap_char and b == gap_char:
+            continue
+        if a == gap_char or b == gap_char:
+            row = 0 if a == gap_char else 1
+            total += GAP_EXT_PENALTY if gap == row else GAP_PENALTY
+            gap = row
+            continue
+        gap = None
+        total += MATCH_REWARD if a == b else MISMATCH_PENALTY
+    return total
+
+
+def aligned_partners(aligned_gt, aligned_noise, gap_char=GAP_CHAR):
+    """
+    The partner of every character of a pairwise alignment
+
+    Returns:
+        tuple : two lists, the index of the noise character aligned to every
+        ground truth character (-1 for a gap), and the other way round
+    """
+    gt_partners, noise_partners = [], []
+    for a, b in zip(aligned_gt, aligned_noise):
+        if a != gap_char:
+            gt_partners.append(len(noise_partners) if b != gap_char else -1)
+        if b != gap_char:
+            noise_partners.append(len(gt_partners) - 1 if a != gap_char else -1)
+    return gt_partners, noise_partners
+
+
+def column_agreement(reference, candidate, gap_char=GAP_CHAR):
+    """
+    Share of the characters that have the same partner in two alignments of one pair
+
+    Arguments:
+        reference (tuple) : ``(aligned_gt, aligned_noise)`` of the exact alignment
+        candidate (tuple) : ``(aligned_gt, aligned_noise)`` of the same two texts
+
+    Returns:
+        float : 1.0 when both alignments pair up the same characters
+    """
+    ref_gt, ref_noise = aligned_partners(*reference, gap_char=gap_char)
+    cand_gt, cand_noise = aligned_partners(*candidate, gap_char=gap_char)
+    total = len(ref_gt) + len(ref_noise)
+    if not total:
+        return 1.0
+    same = sum(a == b for a, b in zip(ref_gt, cand_gt))
+    same += sum(a == b for a, b in zip(ref_noise, cand_noise))
+    return same / total
+
+
+def word_table_diff(reference, candidate, gap_char=GAP_CHAR):
+    """
+    Count the word columns in which two alignments of one pair differ
+
+    Arguments:
+        reference (tuple) : ``(aligned_gt, aligned_noise)`` of the exact alignment
+        candidate (tuple) : ``(aligned_gt, aligned_noise)`` of the same two texts
+
+    Returns:
+        int : word columns of either word table without an identical
+        counterpart in the other, counted once per differing stretch
+    """
+    ref_columns = list(iter_word_columns(list(reference), gap_char=gap_char))
+    cand_columns = list(iter_word_columns(list(candidate), gap_char=gap_char))
+    matcher = difflib.SequenceMatcher(None, ref_columns, cand_columns, autojunk=False)
+    return sum(
+        max(i2 - i1, j2 - j1)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    )
+
+
+def _run(engine, gt, noise, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        aligned = run_engine(engine, gt, noise)
+        timings.append(time.perf_counter() - start)
+    return aligned, min(timings)
+
+
+def _peak_mb(engine, gt, noise):
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        run_engine(engine, gt, noise)
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 3)
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def evaluate_pair(dataset, pivot, other, engines=None, repeat=1, memory=True):
+    """
+    Run every engine on one pair and compare it with the exact global alignment
+
+    Arguments:
+        dataset (str) : name of the witness set, for the report
+        pivot (tuple) : ``(id, text)`` of the ground truth
+        other (tuple) : ``(id, text)`` to align against it
+        engines (list, optional) : engine names. Defaults to all of ``ENGINES``.
+        repeat (int, optional) : timed runs per engine, the fastest counts. Defaults to 1.
+        memory (bool, optional) : also measure peak memory, in one more run. Defaults to True.
+
+    Returns:
+        list : an ``EngineResult`` per engine
+    """
+    (pivot_id, gt), (other_id, noise) = pivot, other
+    engines = list(engines or ENGINES)
+    names = [REFERENCE_ENGINE] + [e for e in engines if e != REFERENCE_ENGINE]
+
+    reference = None
+    best = optimal_score(gt, noise)
+    results = []
+    for engine in names:
+        result = EngineResult(
+            dataset=dataset,
+            pair=f"{pivot_id}~{other_id}",
+            engine=engine,
+            chars=len(gt) + len(noise),
+        )
+        try:
+            aligned, result.seconds = _run(engine, gt, noise, repeat)
+            if memory and engine in engines:
+                result.peak_mb = _peak_mb(engine, gt, noise)
+        except Exception as e:  # Reported, so that one engine can't stop the run
+            result.error = f"{type(e).__name__}: {e}"
+            logger.warning(f"{engine} failed on {result.pair}: {result.error}")
+            if engine in engines:
+                results.append(result)
+            continue
+
+        result.score = alignment_score(*aligned)
+        result.score_gap = best - result.score
+        if engine == REFERENCE_ENGINE:
+            reference = aligned
+        if reference is not None:
+            result.agreement = column_agreement(reference, aligned)
+            result.word_diffs = word_table_diff(reference, aligned)
+        if engine in engines:
+            results.append(result)
+    return results
+
+
+def evaluate_texts(dataset, texts_with_ids, engines=None, repeat=1, memory=True):
+    """Evaluate the engines on the pivot (longest text) against every other text"""
+    pivot = max(texts_with_ids, key=lambda text: len(text[1]))
+    results = []
+    for other in texts_with_ids:
+        if other is not pivot:
+            results.extend(
+                evaluate_pair(
+                    dataset, pivot, other, engines=engines, repeat=repeat, memory=memory
+                )
+            )
+    return results
+
+
+def summarize(results):
+    """Mean metrics of every engine over all pairs it aligned"""
+    summary = {}
+    for engine in dict.fromkeys(r.engine for r in results):
+        runs = [r for r in results if r.engine == engine]
+        ok = [r for r in runs if r.error is None]
+        compared = [r for r in ok if r.agreement is not None]
+        summary[engine] = {
+            "pairs": len(runs),
+            "errors": len(runs) - len(ok),
+            "seconds": sum(r.seconds for r in ok),
+            "chars_per_second": (
+                sum(r.chars for r in ok) / sum(r.seconds for r in ok)
+                if ok and sum(r.seconds for r in ok)
+                else None
+            ),
+            "peak_mb": max((r.peak_mb or 0 for r in ok), default=None),
+            "mean_score_gap": (sum(r.score_gap for r in ok) / len(ok) if ok else None),
+            "mean_agreement": (
+                sum(r.agreement for r in compared) / len(compared) if compared else None
+            ),
+            "word_diffs": sum(r.word_diffs for r in compared),
+        }
+    return summary
+
+
+def format_table(results):
+    """The results as a plain text table, one line per engine and pair"""
+
+    def number(value, spec):
+        return "-" if value is None else format(value, spec)
+
+    lines = [
+        f"{'dataset':<16}{'pair':<28}{'engine':<11}{'chars':>9}{'seconds':>10}"
+        f"{'peak MB':>9}{'score gap':>11}{'agree':>8}{'word diffs':>11}"
+    ]
+    for r in results:
+        if r.error is not None:
+            lines.append(
+                f"{r.dataset:<16}{r.pair:<28}{r.engine:<11}{r.chars:>9}  {r.error}"
+            )
+            continue
+        lines.append(
+            f"{r.dataset:<16}{r.pair:<28}{r.engine:<11}{r.chars:>9}"
+            f"{number(r.seconds, '.4f'):>10}{number(r.peak_mb, '.1f'):>9}"
+            f"{number(r.score_gap, '.1f'):>11}{number(r.agreement, '.2%'):>8}"
+            f"{number(r.word_diffs, 'd'):>11}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compare the speed and quality of the alignment engines."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="*",
+        default=DEFAULT_SIZES,
+        help="Characters per synthetic witness, one witness family per size.",
+    )
+    parser.add_argument("--witnesses", type=int, default=3)
+    parser.add_argument("--mutation-rate", type=float, default=0.02)
+    parser.add_argument(
+        "--input-dir",
+        action="append",
+        default=[],
+        help="A directory of real witnesses to evaluate too. Can be repeated.",
+    )
+    parser.add_argument(
+        "--engines", nargs="+", choices=sorted(ENGINES), default=list(ENGINES)
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="Skip the extra run that measures peak memory.",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    datasets = [
+        (
+            f"synthetic_{size}",
+            generate_witness_family(
+                size, args.witnesses, args.mutation_rate, seed=size
+            ),
+        )
+        for size in args.sizes
+    ]
+    datasets += [(path, load_texts_from_directory(path)) for path in args.input_dir]
+
+    results = []
+    for name, texts in datasets:
+        if len(texts) < 2:
+            logger.warning(f"Skipping {name}: fewer than two texts")
+            continue
+        results.extend(
+            evaluate_texts(
+                name,
+                texts,
+                engines=args.engines,
+                repeat=args.repeat,
+                memory=not args.no_memory,
+            )
+        )
+
+    print(format_table(results))
+    summary = summarize(results)
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "reference": REFERENCE_ENGINE,
+                "witnesses": args.witnesses,
+                "mutation_rate": args.mutation_rate,
+                "repeat": args.repeat,
+            },
+            "summary": summary,
+            "results": [asdict(r) for r in results],
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        logger.info(f"Written results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
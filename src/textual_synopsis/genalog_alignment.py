@@ -1,7 +1,5 @@
 import re
 
-from Bio import Align
-
 from .genalog_preprocess import _is_spacing, tokenize
 
 MATCH_REWARD = 1
@@ -13,6 +11,36 @@ ONE_ALIGNMENT_ONLY = False
 SPACE_MISMATCH_PENALTY = 0.1  # Not fully supported in PairwiseAligner approximation
 
 
+def _make_aligner(
+    match_reward=MATCH_REWARD,
+    mismatch_pen=MISMATCH_PENALTY,
+    gap_pen=GAP_PENALTY,
+    gap_ext_pen=GAP_EXT_PENALTY,
+):
+    """Build a global Bio.Align.PairwiseAligner configured with the genalog scoring
+
+    Arguments:
+        match_reward (int, optional) : reward for matching characters. Defaults to ``MATCH_REWARD``.
+        mismatch_pen (int, optional) : penalty for mistmatching characters. Defaults to ``MISMATCH_PENALTY``.
+        gap_pen      (int, optional) : penalty for creating a gap. Defaults to ``GAP_PENALTY``.
+        gap_ext_pen  (int, optional) : penalty for extending a gap. Defaults to ``GAP_EXT_PENALTY``.
+
+    Returns:
+        Bio.Align.PairwiseAligner : an aligner in global mode
+    """
+    from Bio import Align
+
+    aligner = Align.PairwiseAligner()
+    aligner.mode = "global"  # Global alignment
+    aligner.match_score = match_reward
+    aligner.mismatch_score = mismatch_pen
+    # Bio.Align uses negative scores for penalties, but calls them scores.
+    # Genalog defaults are negative (-0.5).
+    aligner.open_gap_score = gap_pen
+    aligner.extend_gap_score = gap_ext_pen
+    return aligner
+
+
 def _align_seg(
     gt,
     noise,
@@ -43,53 +71,24 @@ def _align_seg(
             (aligned_gt, aligned_noise, alignment_score, alignment_start, alignment_end)
     """
 
-    aligner = Align.PairwiseAligner()
-    aligner.mode = "global"  # Global alignment
-    aligner.match_score = match_reward
-    aligner.mismatch_score = mismatch_pen
-    # Bio.Align uses negative scores for penalties, but calls them scores.
-    # Genalog defaults are negative (-0.5).
-    aligner.open_gap_score = gap_pen
-    aligner.extend_gap_score = gap_ext_pen
-
-    # Helper to replace gap char
-    def fix_gaps(s):
-        return s.replace("-", gap_char)
+    aligner = _make_aligner(match_reward, mismatch_pen, gap_pen, gap_ext_pen)
 
     # print(f"DEBUG: Calling Bio.Align on {len(gt)} x {len(noise)} chars")
 
-    # alignments = aligner.align(gt, noise)
-    # Using format() might be safer/fast than coordinate reconstruction
-    # But wait, format() produces huge strings for huge sequences?
-    # Segments are small (100 chars).
-
     # Let's try to just get the first alignment
     try:
         aln = next(iter(aligner.align(gt, noise)))
     except StopIteration:
         return []
 
-    # Extract strings using format() which gives:
-    # TargetSeq
-    # | | | |
-    # QuerySeq
-    # We take line 0 and line 2.
-    # Note: Query/Target might depend on order.
+    # Rebuild the gapped strings from the alignment coordinates.
+    # format(aln) is not usable here: recent Bio.Align versions print a
+    # wrapped "target 0 ... 11" block, and the '-' gaps of aln[0] / aln[1]
+    # are indistinguishable from hyphens in the text itself.
     # align(target, query) -> gt is target, noise is query.
-
-    lines = format(aln).split("\n")
-    # format(aln) usually returns 3 lines.
-    # But if there are gaps?
-    # Bio.Align 1.80+ format:
-    # "A-B\n|||\nACB"
-
-    if len(lines) >= 3:
-        aligned_gt = fix_gaps(lines[0])
-        aligned_noise = fix_gaps(lines[2])
-    else:
-        # Fallback
-        aligned_gt = fix_gaps(aln[0])
-        aligned_noise = fix_gaps(aln[1])
+    aligned_gt, aligned_noise = _gapped_from_coordinates(
+        gt, noise, aln.coordinates, gap_char
+    )
 
     score = aln.score
     start = 0
@@ -101,6 +100,36 @@ def _align_seg(
     return results
 
 
+def _gapped_from_coordinates(gt, noise, coordinates, gap_char=GAP_CHAR):
+    """Build the aligned strings described by a Bio.Align coordinates array
+
+    Arguments:
+        gt (str) : the target string of the alignment
+        noise (str) : the query string of the alignment
+        coordinates (array) : a ``2 x k`` array of the alignment path, as in ``Alignment.coordinates``
+        gap_char (char, optional) : gap char used in the aligned strings. Defaults to ``GAP_CHAR``.
+
+    Returns:
+        tuple(str, str) : a tuple of aligned ground truth and noise
+    """
+    aligned_gt = []
+    aligned_noise = []
+    gt_path, noise_path = coordinates
+    for k in range(1, len(gt_path)):
+        gt_start, gt_end = int(gt_path[k - 1]), int(gt_path[k])
+        noise_start, noise_end = int(noise_path[k - 1]), int(noise_path[k])
+        if gt_end > gt_start and noise_end > noise_start:
+            aligned_gt.append(gt[gt_start:gt_end])
+            aligned_noise.append(noise[noise_start:noise_end])
+        elif gt_end > gt_start:
+            aligned_gt.append(gt[gt_start:gt_end])
+            aligned_noise.append(gap_char * (gt_end - gt_start))
+        elif noise_end > noise_start:
+            aligned_gt.append(gap_char * (noise_end - noise_start))
+            aligned_noise.append(noise[noise_start:noise_end])
+    return "".join(aligned_gt), "".join(aligned_noise)
+
+
 def _select_alignment_candidates(alignments, target_num_gt_tokens):
     """Return an alignment that contains the desired number
     of ground truth tokens from a list of possible alignments
@@ -163,3 +192,50 @@ def align(gt, noise, gap_char=GAP_CHAR):
                 f"Error with input strings '{gt}' and '{noise}': \n{str(e)}"
             )
         return aligned_gt, aligned_noise
+
+
+def align_semiglobal(gt, noise, gap_char=GAP_CHAR):
+    """Align noise within gt: like ``align()``, except that the text of gt before
+    and after the aligned part costs nothing, so a short noise string is
+    aligned in one piece to wherever it matches best instead of being spread
+    over gt with gaps
+
+    Arguments:
+        gt (str) : the longer text (should not contain GAP_CHAR)
+        noise (str) : the text to place within it (should not contain GAP_CHAR)
+        gap_char (char, optional) : gap char used in alignment algorithm (default: GAP_CHAR)
+
+    Returns:
+        tuple(str, str) : a tuple of aligned ground truth and noise
+    """
+    if not gt or not noise:
+        return align(gt, noise, gap_char=gap_char)
+    aligner = _make_aligner()
+    # Gaps in noise at either end are free. Renamed in Biopython 1.86
+    try:
+        aligner.end_deletion_score = 0.0
+    except AttributeError:
+        aligner.query_end_gap_score = 0.0
+    aln = next(iter(aligner.align(gt, noise)))
+    return _gapped_from_coordinates(gt, noise, aln.coordinates, gap_char)
+
+
+def score(gt, noise):
+    """Compute the global alignment score of two text segments without
+    building the alignment itself. No traceback is kept, so this runs in
+    linear memory and is considerably faster than ``align()``.
+
+    Arguments:
+        gt (str) : ground true text
+        noise (str) : str with ocr noise
+
+    Returns:
+        float : the score of the optimal global alignment under the genalog scoring
+    """
+    if not gt and not noise:
+        return 0.0
+    elif not gt or not noise:
+        # A single gap spanning the non-empty string
+        length = len(gt) or len(noise)
+        return GAP_PENALTY + GAP_EXT_PENALTY * (length - 1)
+    return _make_aligner().score(gt, noise)
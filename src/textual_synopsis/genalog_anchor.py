@@ -13,10 +13,10 @@ This is an re-implementation of the algorithm in this paper
 We rely on `genalog.text.alignment` to align the subsequences.
 """
 
+import bisect
 import itertools
 from collections import Counter
 
-from . import genalog_alignment as alignment
 from . import genalog_preprocess as preprocess
 from .genalog_alignment import GAP_CHAR
 from .genalog_lcs import LCS
@@ -148,6 +148,111 @@ def get_anchor_map(gt_tokens, ocr_tokens, min_anchor_len=2):
     return anchor_map_gt, anchor_map_ocr
 
 
+def _longest_increasing_subsequence(values):
+    """Find a longest strictly increasing subsequence (patience sorting, O(n log n))
+
+    Arguments:
+        values (list) : a list of comparable values
+
+    Returns:
+        list : positions in ``values`` of the elements of the subsequence, in order
+    """
+    # tails[k] is the position of the smallest tail of an increasing run of length k+1
+    tails = []
+    tail_values = []
+    previous = [None] * len(values)
+    for pos, value in enumerate(values):
+        k = bisect.bisect_left(tail_values, value)
+        previous[pos] = tails[k - 1] if k > 0 else None
+        if k == len(tails):
+            tails.append(pos)
+            tail_values.append(value)
+        else:
+            tails[k] = pos
+            tail_values[k] = value
+
+    subsequence = []
+    pos = tails[-1] if tails else None
+    while pos is not None:
+        subsequence.append(pos)
+        pos = previous[pos]
+    return subsequence[::-1]
+
+
+def get_common_anchors(token_lists, min_anchor_len=2):
+    """Find anchor words common to any number of texts.
+
+    An anchor is a word that is unique (case insensitive) in every text and
+    appears in the same relative order in all of them, so every text can be
+    cut at the anchors in lockstep. The order is made consistent one text at
+    a time, keeping the longest increasing subsequence of the anchor positions.
+
+    Arguments:
+        token_lists (list) : a list of token lists, one per text
+        min_anchor_len (int, optional) : minimum len of the anchor word.
+                                         Defaults to 2.
+
+    Returns:
+        list : for each text, the token indices of the anchor words. All lists have the
+        same length, and the ``k``-th index of every list points to the same word.
+    """
+    if not token_lists:
+        return []
+
+    word_indices = []
+    for tokens in token_lists:
+        unique_words = get_unique_words(tokens)
+        indices = {}
+        for idx, tk in enumerate(tokens):
+            if tk in unique_words and len(tk) >= min_anchor_len:
+                indices[tk.lower()] = idx
+        word_indices.append(indices)
+
+    common_words = set(word_indices[0]).intersection(*word_indices[1:])
+    # Start from the order in the first text, and drop words out of order in any other
+    anchor_words = sorted(common_words, key=word_indices[0].get)
+    for indices in word_indices[1:]:
+        positions = [indices[word] for word in anchor_words]
+        keep = _longest_increasing_subsequence(positions)
+        anchor_words = [anchor_words[pos] for pos in keep]
+
+    return [[indices[word] for word in anchor_words] for indices in word_indices]
+
+
+def split_at_common_anchors(token_lists, anchors, min_block_length=0):
+    """Cut all texts in lockstep at common anchors into blocks
+
+    Arguments:
+        token_lists (list) : a list of token lists, one per text
+        anchors (list) : the anchor token indices of each text, see ``get_common_anchors()``
+        min_block_length (int, optional) : anchors are skipped until the block reaches this
+            many characters in its longest text. Defaults to 0 (cut at every anchor).
+
+    Returns:
+        list : a list of blocks, each a list of token lists (one per text). Every block
+        but the first starts with the same anchor word in all texts.
+    """
+    cuts = []
+    last = [0] * len(token_lists)
+    for anchor in zip(*anchors):
+        block_length = max(
+            segment_len(tokens[start:end])
+            for tokens, start, end in zip(token_lists, last, anchor)
+        )
+        if block_length >= min_block_length and any(
+            end > start for start, end in zip(last, anchor)
+        ):
+            cuts.append(anchor)
+            last = list(anchor)
+
+    starts = [[0] * len(token_lists)] + cuts
+    ends = cuts + [[None] * len(token_lists)]
+    return [
+        [tokens[s:e] for tokens, s, e in zip(token_lists, start, end)]
+        for start, end in zip(starts, ends)
+    ]
+
+
 def find_anchor_recur(
     gt_tokens,
     ocr_tokens,
@@ -223,7 +328,9 @@ def find_anchor_recur(
     return sorted(output_gt_anchors), sorted(output_ocr_anchors)
 
 
-def align_w_anchor(gt, ocr, gap_char=GAP_CHAR, max_seg_length=MAX_ALIGN_SEGMENT_LENGTH):
+def align_w_anchor(
+    gt, ocr, gap_char=GAP_CHAR, max_seg_length=MAX_ALIGN_SEGMENT_LENGTH, cancel=None
+):
     """A faster alignment scheme of two text segments. This method first
     breaks the strings into smaller segments with anchor words.
     Then these smaller segments are aligned.
@@ -259,6 +366,10 @@ def align_w_anchor(gt, ocr, gap_char=GAP_CHAR, max_seg_length=MAX_ALIGN_SEGMENT_
         gap_char (str, optional) : gap char used in alignment algorithm . Defaults to GAP_CHAR.
         max_seg_length (int, optional) : maximum segment length. Segments longer than this threshold
             will continued be split recursively into smaller segment. Defaults to ``MAX_ALIGN_SEGMENT_LENGTH``.
+        cancel (CancelToken, optional) : checked before every batch of segments. Defaults to None.
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
 
     Returns:
         a tuple (str, str) of aligned ground truth and noise:
@@ -285,30 +396,57 @@ def align_w_anchor(gt, ocr, gap_char=GAP_CHAR, max_seg_length=MAX_ALIGN_SEGMENT_
     gt_segments = [gt_tokens[start:end] for start, end in start_n_end_gt]
     ocr_segments = [ocr_tokens[start:end] for start, end in start_n_end_ocr]
 
-    # 3. Run alignment on each segment
-    aligned_segments_gt = []
-    aligned_segments_ocr = []
+    # 3. Align all the segment pairs at once, in vectorized batches
+    from .gotoh import align_batch
 
-    # Bug fix: zip stops at shortest, ensure equal length?
     # find_anchor_recur guarantees same number of anchors, so same number of segments.
-
-    for i, (gt_segment, noisy_segment) in enumerate(zip(gt_segments, ocr_segments)):
-        gt_segment_str = preprocess.join_tokens(gt_segment)
-        noisy_segment_str = preprocess.join_tokens(noisy_segment)
-
-        # Run alignment algorithm
-        aligned_seg_gt, aligned_seg_ocr = alignment.align(
-            gt_segment_str, noisy_segment_str, gap_char=gap_char
+    segment_pairs = [
+        (preprocess.join_tokens(gt_segment), preprocess.join_tokens(noisy_segment))
+        for gt_segment, noisy_segment in zip(gt_segments, ocr_segments)
+    ]
+    aligned_pairs = align_batch(segment_pairs, gap_char=gap_char, cancel=cancel)
+    aligned_segments = [
+        (aligned_seg_gt, aligned_seg_ocr, bool(gt_segment), bool(noisy_segment))
+        for (aligned_seg_gt, aligned_seg_ocr), gt_segment, noisy_segment in zip(
+            aligned_pairs, gt_segments, ocr_segments
         )
-        if (
-            aligned_seg_gt or aligned_seg_ocr
-        ):  # if not both empty (logic match original)
-            aligned_segments_gt.append(aligned_seg_gt)
-            aligned_segments_ocr.append(aligned_seg_ocr)
+    ]
 
     # Stitch all segments together
-    # Check if joined with space or empty string? Genalog says " ".join
-    aligned_gt = " ".join(aligned_segments_gt)
-    aligned_noise = " ".join(aligned_segments_ocr)
+    return stitch_segments(aligned_segments, gap_char=gap_char)
 
-    return aligned_gt, aligned_noise
+
+def stitch_segments(aligned_segments, gap_char=GAP_CHAR):
+    """Join aligned segments back into one alignment of the full texts.
+
+    The source texts are the non-empty segments joined with a single space,
+    so the separator column is a space on a side only where that side has
+    text on both sides of it, and a gap otherwise. A separator that would
+    be a gap on both sides is dropped.
+
+    Arguments:
+        aligned_segments (list) : a list of ``(aligned_gt, aligned_noise, has_gt, has_noise)``
+            tuples, where ``has_gt`` and ``has_noise`` tell whether the source segments were non-empty
+        gap_char (str, optional) : gap char used in alignment algorithm . Defaults to GAP_CHAR.
+
+    Returns:
+        a tuple (str, str) of aligned ground truth and noise:
+            (aligned_gt, aligned_noise)
+    """
+    aligned_gt = []
+    aligned_noise = []
+    seen_gt = seen_noise = False
+    for aligned_seg_gt, aligned_seg_noise, has_gt, has_noise in aligned_segments:
+        if not (aligned_seg_gt or aligned_seg_noise):
+            continue  # both empty
+        sep_gt = " " if (seen_gt and has_gt) else gap_char
+        sep_noise = " " if (seen_noise and has_noise) else gap_char
+        if aligned_gt and not (sep_gt == sep_noise == gap_char):
+            aligned_gt.append(sep_gt)
+            aligned_noise.append(sep_noise)
+        aligned_gt.append(aligned_seg_gt)
+        aligned_noise.append(aligned_seg_noise)
+        seen_gt = seen_gt or has_gt
+        seen_noise = seen_noise or has_noise
+
+    return "".join(aligned_gt), "".join(aligned_noise)
@@ -3,7 +3,9 @@
 # Licensed under the MIT License.
 # ---------------------------------------------------------
 
-from Bio import Align
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class LCS:
@@ -21,6 +23,8 @@ class LCS:
         if not str_m or not str_n:
             return ""
 
+        from Bio import Align
+
         aligner = Align.PairwiseAligner()
         aligner.mode = "global"
 
@@ -63,7 +67,7 @@ class LCS:
             return ""
         except Exception as e:
             # Fallback or error logging
-            print(f"Error in LCS computation: {e}")
+            logger.warning(f"Error in LCS computation: {e}")
             return ""
 
     def get_len(self):
@@ -0,0 +1,368 @@
+"""
+Batched global alignment of many short pairs, vectorized with numpy.
+
+Anchored alignment (``genalog_anchor.align_w_anchor``) cuts two texts into
+thousands of short segment pairs. Aligning them one by one with
+``genalog_alignment.align`` costs more in per-call overhead (a new
+``PairwiseAligner``, string formatting) than in the DP itself, so this
+module aligns them all at once instead.
+
+Pairs are grouped by size into padded batches of at most ``BATCH_CELLS``
+cells. A batch is filled one anti-diagonal at a time: every cell of an
+anti-diagonal only depends on the two before it, so a step is a handful of
+array operations over all the pairs of the batch and all the cells of the
+diagonal. The DP is Gotoh's affine gap recurrence with the genalog scoring,
+the same as ``Bio.Align.PairwiseAligner`` in ``genalog_alignment``: a gap
+of length ``k`` scores ``GAP_PENALTY + (k - 1) * GAP_EXT_PENALTY``, end gaps
+included, and a gap may follow a gap in the other text. Scores are scaled
+to integers, and only the last three anti-diagonals of them are kept, plus
+one byte of traceback pointers per cell; the tracebacks of a batch also run
+in lockstep.
+
+Pairs longer than ``MAX_BATCH_LENGTH`` characters gain nothing from
+batching and are aligned by ``genalog_alignment.align``.
+"""
+
+import numpy as np
+
+from . import genalog_alignment
+from .genalog_alignment import (
+    GAP_CHAR,
+    GAP_EXT_PENALTY,
+    GAP_PENALTY,
+    MATCH_REWARD,
+    MISMATCH_PENALTY,
+)
+from .progress import check_cancelled
+
+# Padded cells (pairs x anti-diagonals x rows) per batch, one pointer byte each
+BATCH_CELLS = 1 << 22
+# Pairs with more characters than this are aligned one by one
+MAX_BATCH_LENGTH = 2000
+
+# Moves of a path, also the DP states: a match or mismatch, a ground truth
+# character against a gap, a noise character against a gap
+DIAGONAL, GT_ONLY, NOISE_ONLY = 0, 1, 2
+
+
+def _codes(texts, length):
+    """The code points of texts, zero padded to ``length``"""
+    codes = np.zeros((len(texts), length), dtype=np.uint32)
+    for row, text in zip(codes, texts):
+        row[: len(text)] = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return codes
+
+
+def _scale():
+    """The smallest power of ten making the genalog scores integers"""
+    scores = (MATCH_REWARD, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXT_PENALTY)
+    for scale in (1, 10, 100, 1000):
+        if all(round(s * scale) == s * scale for s in scores):
+            return scale
+    raise ValueError(f"Scores {scores} are not multiples of 1/1000")
+
+
+# Scores are integers scaled by SCALE: exact ties, and faster than floats
+SCALE = _scale()
+MATCH, MISMATCH, OPEN, EXTEND = (
+    int(round(s * SCALE))
+    for s in (MATCH_REWARD, MISMATCH_PENALTY, GAP_PENALTY, GAP_EXT_PENALTY)
+)
+# Score of the unreachable cells, far below any alignment but safe from overflow
+UNREACHABLE = -(1 << 28)
+
+
+def _best(first, second, third):
+    """
+    Elementwise maximum of three arrays, and which one is the first maximum:
+    0, 1, or 2 and 3 for the third
+    """
+    best = np.maximum(first, second)
+    source = (second > first).view(np.uint8)
+    source |= (third > best).view(np.uint8) << 1
+    np.maximum(best, third, out=best)
+    return best, source
+
+
+def _forward(gt, noise_reversed, gt_lengths, noise_lengths):
+    """
+    Fill the DP of a batch anti-diagonal by anti-diagonal
+
+    Cell ``(i, j)`` of pair ``k`` is stored at ``[d, i, k]`` with ``d = i + j``:
+    the cells of an anti-diagonal, of all the pairs, are contiguous.
+
+    Arguments:
+        gt (np.ndarray) : gt positions x pairs of code points
+        noise_reversed (np.ndarray) : noise positions x pairs of code points,
+            reversed, ``noise[j - 1]`` at ``[m - j]``
+
+    Returns:
+        tuple : the traceback pointers (diagonals x gt positions x pairs, the
+        source state of each state in two bits), and the scaled scores of the
+        three states at the end cell of every pair
+    """
+    n, batch = gt.shape
+    m = len(noise_reversed)
+    pointers = np.zeros((n + m + 1, n + 1, batch), dtype=np.uint8)
+    final = np.full((batch, 3), UNREACHABLE, dtype=np.int32)
+    ends = {}
+    for k, d in enumerate(gt_lengths + noise_lengths):
+        ends.setdefault(int(d), []).append(k)
+
+    # Scores of the states on the current and previous two anti-diagonals
+    current, previous, before = (
+        np.full((3, n + 1, batch), UNREACHABLE, dtype=np.int32) for _ in range(3)
+    )
+    previous[DIAGONAL, 0] = 0
+    substitution = np.array([MISMATCH, MATCH], dtype=np.int32)
+    for d in range(1, n + m + 1):
+        current.fill(UNREACHABLE)
+        low, high = max(0, d - m), min(n, d)
+
+        # Match or mismatch, from (i - 1, j - 1)
+        a, b = max(low, 1), min(high, d - 1)
+        if a <= b:
+            score, source = _best(*before[:, a - 1 : b])
+            same = gt[a - 1 : b] == noise_reversed[m - d + a : m - d + b + 1]
+            score += substitution[same.view(np.uint8)]
+            current[DIAGONAL, a : b + 1] = score
+            pointers[d, a : b + 1] = source
+
+        # A ground truth character against a gap, from (i - 1, j)
+        a = max(low, 1)
+        if a <= high:
+            score, source = _best(
+                previous[DIAGONAL, a - 1 : high] + OPEN,
+                previous[GT_ONLY, a - 1 : high] + EXTEND,
+                previous[NOISE_ONLY, a - 1 : high] + OPEN,
+            )
+            current[GT_ONLY, a : high + 1] = score
+            source <<= 2
+            pointers[d, a : high + 1] |= source
+
+        # A noise character against a gap, from (i, j - 1)
+        b = min(high, d - 1)
+        if low <= b:
+            score, source = _best(
+                previous[DIAGONAL, low : b + 1] + OPEN,
+                previous[GT_ONLY, low : b + 1] + OPEN,
+                previous[NOISE_ONLY, low : b + 1] + EXTEND,
+            )
+            current[NOISE_ONLY, low : b + 1] = score
+            source <<= 4
+            pointers[d, low : b + 1] |= source
+
+        for k in ends.get(d, ()):
+            final[k] = current[:, gt_lengths[k], k]
+        current, previous, before = before, current, previous
+    return pointers, final
+
+
+def _traceback(pointers, final, gt_lengths, noise_lengths):
+    """
+    Follow the pointers of all the pairs of a batch back from their end cells
+
+    Returns:
+        np.ndarray : pairs x steps of moves, in path order and padded with -1
+    """
+    batch = len(final)
+    rows = np.arange(batch)
+    i, j = gt_lengths.copy(), noise_lengths.copy()
+    state = final.argmax(axis=1)
+    moves = np.full((batch, len(pointers)), -1, dtype=np.int8)
+    steps = np.zeros(batch, dtype=np.int64)
+    active = (i > 0) | (j > 0)
+    while active.any():
+        moves[rows[active], steps[active]] = state[active]
+        source = (pointers[i + j, i, rows] >> (2 * state).astype(np.uint8)) & 3
+        source = np.minimum(source, NOISE_ONLY)
+        i = i - (active & (state != NOISE_ONLY))
+        j = j - (active & (state != GT_ONLY))
+        steps += active
+        state = np.where(active, source, state)
+        active = (i > 0) | (j > 0)
+
+    # The moves were recorded from the end, reverse every path
+    index = steps[:, None] - 1 - np.arange(moves.shape[1])[None]
+    ordered = np.take_along_axis(moves, np.maximum(index, 0), axis=1)
+    ordered[index < 0] = -1
+    return ordered
+
+
+def _gapped(codes, moves, take, gap):
+    """The aligned rows of one side, from the moves that consume its characters"""
+    consumed = np.isin(moves, take)
+    position = np.maximum(np.cumsum(consumed, axis=1) - 1, 0)
+    chars = np.take_along_axis(codes, np.minimum(position, codes.shape[1] - 1), axis=1)
+    return np.where(consumed, chars, gap).astype(np.uint32)
+
+
+def _batches(sizes):
+    """
+    Group pair indices, by increasing size, into batches of at most
+    ``BATCH_CELLS`` padded cells
+
+    Every batch costs a few array operations per anti-diagonal, whatever its
+    number of pairs, so few large batches beat many tightly padded ones.
+    """
+    order = sorted(range(len(sizes)), key=lambda k: max(sizes[k]))
+    batches, current, n, m = [], [], 0, 0
+    for k in order:
+        new_n, new_m = max(n, sizes[k][0]), max(m, sizes[k][1])
+        if (
+            current
+            and (len(current) + 1) * (new_n + new_m + 1) * (new_n + 1) > BATCH_CELLS
+        ):
+            batches.append(current)
+            current, new_n, new_m = [], sizes[k][0], sizes[k][1]
+        current.append(k)
+        n, m = new_n, new_m
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _align_batch(gts, noises):
+    """
+    Align one batch of non-empty pairs
+
+    Returns:
+        tuple : the padded code points of the ground truth and noise texts, the
+        moves of every pair (see ``_traceback``) and their scores
+    """
+    gt_lengths = np.array([len(gt) for gt in gts])
+    noise_lengths = np.array([len(noise) for noise in noises])
+    gt = _codes(gts, int(gt_lengths.max()))
+    noise = _codes(noises, int(noise_lengths.max()))
+    # Reversed, noise[j - 1] is at [m - j]: the noise characters of an
+    # anti-diagonal are a slice, like the ground truth ones
+    noise_reversed = noise[:, ::-1]
+    pointers, final = _forward(
+        np.ascontiguousarray(gt.T),
+        np.ascontiguousarray(noise_reversed.T),
+        gt_lengths,
+        noise_lengths,
+    )
+    moves = _traceback(pointers, final, gt_lengths, noise_lengths)
+    return gt, noise, moves, final.max(axis=1) / SCALE
+
+
+def _coordinates(moves):
+    """A Bio.Align style ``2 x k`` coordinates array of a path of moves"""
+    moves = moves[moves >= 0]
+    gt_path = np.concatenate([[0], np.cumsum(moves != NOISE_ONLY)])
+    noise_path = np.concatenate([[0], np.cumsum(moves != GT_ONLY)])
+    breaks = np.flatnonzero(moves[1:] != moves[:-1]) + 1
+    points = np.concatenate([[0], breaks, [len(moves)]]) if len(moves) else [0]
+    return np.array([gt_path[points], noise_path[points]])
+
+
+def _run(pairs, cancel, on_batch, on_single):
+    """
+    Align every pair, batched, and hand the results over batch by batch
+
+    Arguments:
+        pairs (list) : ``(gt, noise)`` string tuples
+        cancel (CancelToken) : checked before every batch
+        on_batch (callable) : ``on_batch(indices, gt, noise, moves, scores)``, for
+            every batch of the pairs at ``indices``, see ``_align_batch``
+        on_single (callable) : ``on_single(k)``, for the empty and long pairs
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+    """
+    batched = []
+    for k, (gt, noise) in enumerate(pairs):
+        if gt and noise and len(gt) + len(noise) <= MAX_BATCH_LENGTH:
+            batched.append(k)
+        else:
+            check_cancelled(cancel)
+            on_single(k)
+    sizes = [(len(pairs[k][0]), len(pairs[k][1])) for k in batched]
+    for batch in _batches(sizes):
+        check_cancelled(cancel)
+        indices = [batched[b] for b in batch]
+        gt, noise, moves, scores = _align_batch(
+            [pairs[k][0] for k in indices], [pairs[k][1] for k in indices]
+        )
+        on_batch(indices, gt, noise, moves, scores)
+
+
+def align_batch_coordinates(pairs, cancel=None):
+    """
+    Globally align many pairs of strings at once, with the genalog scoring
+
+    Arguments:
+        pairs (list) : ``(gt, noise)`` string tuples
+        cancel (CancelToken, optional) : checked before every batch. Defaults to None.
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+
+    Returns:
+        list : a ``(score, coordinates)`` tuple per pair, in order, where
+        coordinates is a ``2 x k`` array of the alignment path as in Bio.Align's
+        ``Alignment.coordinates`` (gt is the target, noise the query)
+    """
+    results = [None] * len(pairs)
+    aligner = None
+
+    def on_single(k):
+        nonlocal aligner
+        gt, noise = pairs[k]
+        if not gt and not noise:
+            results[k] = (0.0, np.zeros((2, 1), dtype=np.int64))
+            return
+        if not gt or not noise:
+            coordinates = np.array([[0, len(gt)], [0, len(noise)]])
+            results[k] = (genalog_alignment.score(gt, noise), coordinates)
+            return
+        if aligner is None:
+            aligner = genalog_alignment._make_aligner()
+        aln = next(iter(aligner.align(gt, noise)))
+        results[k] = (aln.score, np.asarray(aln.coordinates))
+
+    def on_batch(indices, gt, noise, moves, scores):
+        for k, row_moves, score in zip(indices, moves, scores):
+            results[k] = (float(score), _coordinates(row_moves))
+
+    _run(pairs, cancel, on_batch, on_single)
+    return results
+
+
+def align_batch(pairs, gap_char=GAP_CHAR, cancel=None):
+    """
+    Align many pairs of text segments at once, like ``genalog_alignment.align()``
+    on each of them
+
+    Arguments:
+        pairs (list) : ``(gt, noise)`` string tuples (should not contain gap_char)
+        gap_char (char, optional) : gap char used in the aligned strings. Defaults to GAP_CHAR.
+        cancel (CancelToken, optional) : checked before every batch. Defaults to None.
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+
+    Returns:
+        list : a ``(aligned_gt, aligned_noise)`` tuple per pair, in order
+    """
+    results = [None] * len(pairs)
+    gap = ord(gap_char)
+
+    def on_single(k):
+        results[k] = genalog_alignment.align(*pairs[k], gap_char=gap_char)
+
+    def on_batch(indices, gt, noise, moves, scores):
+        aligned_gt = _gapped(gt, moves, (DIAGONAL, GT_ONLY), gap)
+        aligned_noise = _gapped(noise, moves, (DIAGONAL, NOISE_ONLY), gap)
+        lengths = (moves >= 0).sum(axis=1)
+        for k, row_gt, row_noise, length in zip(
+            indices, aligned_gt, aligned_noise, lengths
+        ):
+            results[k] = (
+                row_gt[:length].tobytes().decode("utf-32-le"),
+                row_noise[:length].tobytes().decode("utf-32-le"),
+            )
+
+    _run(pairs, cancel, on_batch, on_single)
+    return results
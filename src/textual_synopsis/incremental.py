@@ -0,0 +1,227 @@
+"""
+Incremental re-alignment of edited witnesses.
+
+A stored multiple alignment keeps every witness's normalized text: its row
+without gaps. When a witness is edited, the old and new texts are diffed,
+and only a window of words around every edit is realigned. The columns of
+the window are cut out of the alignment, the other witnesses keep their
+alignment within it (projected against the pivot), the edited witness is
+realigned against the pivot's part of the window, and the window is
+re-collated and spliced back between the untouched columns.
+
+The cost of an edit is a linear diff plus the alignment of a window of a
+few hundred characters, instead of realigning the whole witness.
+"""
+
+import difflib
+import logging
+import re
+
+from .engines import run_engine
+from .genalog_alignment import GAP_CHAR
+from .instrument import span
+from .multi_align import StarAligner
+
+# Characters of context realigned on each side of an edit, extended to word breaks
+WINDOW_MARGIN = 200
+# Above this share of changed characters, realigning the witness in full is cheaper
+MAX_CHANGED_SHARE = 0.2
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\S+\s*|\s+")
+
+
+def diff_windows(old, new, margin=WINDOW_MARGIN):
+    """
+    Find the windows of a text that changed between two versions
+
+    Arguments:
+        old (str) : the stored text
+        new (str) : the edited text
+        margin (int, optional) : context characters around every edit, extended
+            to word breaks. Edits closer than that share a window. Defaults to
+            ``WINDOW_MARGIN``.
+
+    Returns:
+        list : ``(old_start, old_end, new_start, new_end)`` of every window, in text
+        order. Outside the windows both texts are identical.
+    """
+    if old == new:
+        return []
+
+    # Trim the common prefix and suffix first, so that the word diff only
+    # runs between the first and the last edit
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_prefix_length(old[prefix:][::-1], new[prefix:][::-1])
+    old_words = _WORD.findall(old[prefix : len(old) - suffix])
+    new_words = _WORD.findall(new[prefix : len(new) - suffix])
+    old_offsets = _offsets(old_words, prefix)
+    new_offsets = _offsets(new_words, prefix)
+
+    windows = []
+    matcher = difflib.SequenceMatcher(None, old_words, new_words, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        # Between edits the texts only differ by a shift
+        shift_before = new_offsets[j1] - old_offsets[i1]
+        shift_after = new_offsets[j2] - old_offsets[i2]
+        start = old.rfind(" ", 0, max(old_offsets[i1] - margin, 0)) + 1
+        end = old.find(" ", min(old_offsets[i2] + margin, len(old)))
+        if end == -1:
+            end = len(old)
+        if windows and start <= windows[-1][1]:
+            start, _, new_start, _ = windows.pop()
+        else:
+            new_start = start + shift_before
+        windows.append((start, end, new_start, end + shift_after))
+    return windows
+
+
+def _common_prefix_length(a, b, chunk=1024):
+    """Length of the common prefix of two strings, compared a chunk at a time"""
+    limit = min(len(a), len(b))
+    i = 0
+    while i < limit and a[i : i + chunk] == b[i : i + chunk]:
+        i += chunk
+    i = min(i, limit)
+    while i < limit and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def _offsets(words, start):
+    offsets = [start]
+    for word in words:
+        offsets.append(offsets[-1] + len(word))
+    return offsets
+
+
+def _column(row, k, gap_char=GAP_CHAR):
+    """Column of the k-th non-gap character of an aligned row, len(row) past the end"""
+    lo, hi = k, len(row)
+    # Smallest column whose prefix holds k + 1 characters
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if mid + 1 - row.count(gap_char, 0, mid + 1) >= k + 1:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+def _project(aligned_pivot, aligned_other, gap_char=GAP_CHAR):
+    """The pairwise alignment of two rows of a multiple alignment"""
+    pairs = [
+        (p, o)
+        for p, o in zip(aligned_pivot, aligned_other)
+        if p != gap_char or o != gap_char
+    ]
+    return "".join(p for p, _ in pairs), "".join(o for _, o in pairs)
+
+
+def realign_witness(rows, pivot_id, witness_id, new_text, margin=WINDOW_MARGIN):
+    """
+    Realign the windows of one witness that changed, see ``diff_windows``
+
+    Arguments:
+        rows (list) : ``(id, aligned_row)`` tuples of the stored alignment
+        pivot_id (str) : the row to realign the windows against
+        witness_id (str) : the edited witness
+        new_text (str) : its new normalized text
+        margin (int, optional) : see ``diff_windows``. Defaults to ``WINDOW_MARGIN``.
+
+    Returns:
+        tuple : the updated ``(id, aligned_row)`` tuples, and the number of windows
+        that were realigned
+    """
+    ids = [tid for tid, _ in rows]
+    aligned = dict(rows)
+    old_text = aligned[witness_id].replace(GAP_CHAR, "")
+    windows = diff_windows(old_text, new_text, margin=margin)
+
+    # From the last window back, so the columns of the earlier ones stay put
+    for old_start, old_end, new_start, new_end in reversed(windows):
+        with span("incremental_window", witness=witness_id) as fields:
+            witness_row = aligned[witness_id]
+            first = _column(witness_row, old_start)
+            last = _column(witness_row, old_end)
+            cut = {tid: aligned[tid][first:last] for tid in ids}
+            window_texts = [
+                (
+                    tid,
+                    (
+                        new_text[new_start:new_end]
+                        if tid == witness_id
+                        else cut[tid].replace(GAP_CHAR, "")
+                    ),
+                )
+                for tid in ids
+            ]
+
+            aligner = StarAligner(window_texts, pivot=pivot_id)
+            pairwise = {}
+            for job in aligner.pair_jobs():
+                if witness_id in (job.other_id, pivot_id):
+                    engine, params = job.engines[0]
+                    pairwise[job.key] = run_engine(engine, job.gt, job.noise, **params)
+                else:
+                    pairwise[job.key] = _project(cut[pivot_id], cut[job.other_id])
+            for tid, window_row in aligner.collate(pairwise):
+                aligned[tid] = aligned[tid][:first] + window_row + aligned[tid][last:]
+            fields["columns"] = last - first
+
+    return [(tid, aligned[tid]) for tid in ids], len(windows)
+
+
+def update_alignment(
+    rows,
+    texts_with_ids,
+    pivot_id=None,
+    margin=WINDOW_MARGIN,
+    max_changed_share=MAX_CHANGED_SHARE,
+):
+    """
+    Bring a stored multiple alignment up to date with edited texts
+
+    Arguments:
+        rows (list) : ``(id, aligned_row)`` tuples of the stored alignment
+        texts_with_ids (list) : the current ``(id, text_content)`` tuples
+        pivot_id (str, optional) : the pivot of the stored alignment. Defaults to the
+            row with the fewest gaps.
+        margin (int, optional) : see ``diff_windows``. Defaults to ``WINDOW_MARGIN``.
+        max_changed_share (float, optional) : the share of a witness's characters
+            that may lie in changed windows. Defaults to ``MAX_CHANGED_SHARE``.
+
+    Returns:
+        tuple : the updated ``(id, aligned_row)`` tuples and the ids of the edited
+        witnesses, or None when the texts have to be aligned in full: witnesses
+        were added or removed, or too much of one changed.
+    """
+    if sorted(tid for tid, _ in rows) != sorted(tid for tid, _ in texts_with_ids):
+        logger.info("The texts differ from the stored alignment, aligning in full")
+        return None
+    if pivot_id is None:
+        pivot_id = max(rows, key=lambda row: len(row[1]) - row[1].count(GAP_CHAR))[0]
+
+    stored = dict(rows)
+    edited = [
+        (tid, content)
+        for tid, content in texts_with_ids
+        if stored[tid].replace(GAP_CHAR, "") != content
+    ]
+    for tid, content in edited:
+        old_text = stored[tid].replace(GAP_CHAR, "")
+        changed = sum(
+            old_end - old_start
+            for old_start, old_end, _, _ in diff_windows(old_text, content, margin)
+        )
+        if changed > max_changed_share * max(len(old_text), 1):
+            logger.info(f"{tid} changed too much ({changed} chars), aligning in full")
+            return None
+
+    for tid, content in edited:
+        rows, num_windows = realign_witness(rows, pivot_id, tid, content, margin)
+        logger.info(f"Realigned {num_windows} edited window(s) of {tid}")
+    return rows, [tid for tid, _ in edited]
@@ -0,0 +1,152 @@
+"""
+Stage-level instrumentation: timing spans, DP cell counts and peak memory.
+
+Every span is logged at DEBUG level on the ``textual_synopsis`` logger. While
+a trace is active (``start_trace()``), spans are also collected, with their
+fields and the peak memory seen during the span, and can be written as a
+JSON trace in the Chrome trace event format (viewable in Perfetto or
+chrome://tracing).
+
+Peak memory is the process peak RSS, plus the peak traced Python memory
+of the span itself when ``tracemalloc`` is tracing.
+
+    with span("merge", witnesses=3) as fields:
+        ...
+        fields["columns"] = len(row)
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger("textual_synopsis")
+
+_state = threading.local()
+_trace_lock = threading.Lock()
+_trace = None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+class Trace:
+    """Spans collected between ``start_trace()`` and ``stop_trace()``"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def add(self, name, start, duration, fields):
+        with _trace_lock:
+            self.spans.append(
+                {
+                    "name": name,
+                    "start": start - self.start,
+                    "duration": duration,
+                    "thread": threading.get_ident(),
+                    "fields": fields,
+                }
+            )
+
+    def summary(self):
+        """Total duration and count of the spans of each name"""
+        totals = {}
+        for s in self.spans:
+            total = totals.setdefault(s["name"], {"count": 0, "seconds": 0.0})
+            total["count"] += 1
+            total["seconds"] += s["duration"]
+        return totals
+
+    def to_chrome_trace(self):
+        events = [
+            {
+                "name": s["name"],
+                "ph": "X",
+                "ts": s["start"] * 1e6,
+                "dur": s["duration"] * 1e6,
+                "pid": os.getpid(),
+                "tid": s["thread"],
+                "args": s["fields"],
+            }
+            for s in self.spans
+        ]
+        return {
+            "traceEvents": events,
+            "summary": self.summary(),
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome_trace(), f, indent=1, default=str)
+
+
+def start_trace():
+    """Start collecting spans, returns the new ``Trace``"""
+    global _trace
+    _trace = Trace()
+    return _trace
+
+
+def stop_trace():
+    """Stop collecting spans, returns the finished ``Trace`` (or None)"""
+    global _trace
+    trace, _trace = _trace, None
+    return trace
+
+
+def _stack():
+    if not hasattr(_state, "stack"):
+        _state.stack = []
+    return _state.stack
+
+
+@contextmanager
+def span(name, **fields):
+    """Time a stage. Yields its ``fields`` dict, so the stage can add counts to it."""
+    tracing_memory = tracemalloc.is_tracing()
+    stack = _stack()
+    if tracing_memory:
+        tracemalloc.reset_peak()
+    frame = {"traced_peak": 0}
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        duration = time.perf_counter() - start
+        stack.pop()
+        if tracing_memory:
+            # The peak counter is reset by every nested span, so take the
+            # larger of what was seen since then and the children's peaks
+            peak = max(tracemalloc.get_traced_memory()[1], frame["traced_peak"])
+            fields["traced_peak_mb"] = round(peak / 2**20, 3)
+            if stack:
+                stack[-1]["traced_peak"] = max(stack[-1]["traced_peak"], peak)
+            tracemalloc.reset_peak()
+        fields["peak_rss_mb"] = _peak_rss_mb()
+        logger.debug("%s: %.3fs %s", name, duration, fields)
+        if _trace is not None:
+            _trace.add(name, start, duration, fields)
+
+
+def record_span(name, duration, **fields):
+    """Record a stage that was timed elsewhere, e.g. in a worker process"""
+    logger.debug("%s: %.3fs %s", name, duration, fields)
+    if _trace is not None:
+        _trace.add(name, time.perf_counter() - duration, duration, fields)
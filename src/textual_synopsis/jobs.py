@@ -0,0 +1,208 @@
+"""
+Background alignment jobs with a result cache, for interactive front ends.
+
+A ``JobManager`` runs alignments on a small pool of background threads, so
+that concurrent requests queue up instead of blocking each other, and keeps
+the finished Excel tables in an LRU cache keyed by a hash of the uploaded
+contents and the alignment settings. Submitting the same files with the
+same settings again returns the running or cached job instead of a new one.
+
+Everything stays in memory: uploads are aligned as ``(name, bytes)`` and the
+Excel table is returned as bytes, without temporary files. Pairs run in
+isolated worker processes (see ``workers``), so cancelling a job stops its
+running pairwise alignments right away.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from .multi_align import StarAligner, normalize_text
+from .progress import AlignmentCancelled, CancelToken
+from .to_excel import create_excel_from_texts
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_JOBS = 2  # alignments running at once, the rest are queued
+DEFAULT_CACHE_SIZE = 32  # finished results kept in memory
+
+
+@dataclass
+class AlignmentResult:
+    """A finished alignment of uploaded files"""
+
+    rows: list  # (name, aligned_row) tuples, as returned by StarAligner.align()
+    excel: bytes  # the xlsx alignment table
+    failures: list = field(default_factory=list)  # workers.PairFailure
+    seconds: float = 0.0
+
+
+def job_key(files, options):
+    """Hash of the uploaded files and alignment settings, identifying a result
+
+    Arguments:
+        files (list) : ``(name, bytes)`` tuples
+        options (dict) : keyword arguments for ``StarAligner``
+
+    Returns:
+        str : a sha256 hex digest
+    """
+    return digest_key(
+        [(name, hashlib.sha256(data).hexdigest()) for name, data in files], options
+    )
+
+
+def digest_key(digests, options):
+    """``job_key`` of files whose sha256 is known, see ``corpus.CorpusFile``
+
+    Arguments:
+        digests (list) : ``(name, sha256 hex digest)`` tuples
+        options (dict) : keyword arguments for ``StarAligner``
+
+    Returns:
+        str : a sha256 hex digest, equal to the ``job_key`` of the same files
+    """
+    digest = hashlib.sha256()
+    for name, sha256 in sorted(digests):
+        digest.update(name.encode("utf-8") + b"\0")
+        digest.update(bytes.fromhex(sha256))
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def align_files(files, progress=None, cancel=None, **options):
+    """Align uploaded files in memory
+
+    Arguments:
+        files (list) : ``(name, bytes)`` tuples of UTF-8 text files
+        progress (callable, optional) : see ``StarAligner``
+        cancel (CancelToken, optional) : see ``StarAligner``
+        **options : keyword arguments for ``StarAligner``
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+
+    Returns:
+        AlignmentResult : the aligned rows and the Excel table
+    """
+    started = time.monotonic()
+    texts = [
+        (name, normalize_text(data.decode("utf-8"))) for name, data in sorted(files)
+    ]
+    aligner = StarAligner(texts, progress=progress, cancel=cancel, **options)
+    rows = aligner.align()
+
+    excel = io.BytesIO()
+    create_excel_from_texts(
+        [{"name": name.replace(".txt", ""), "content": row} for name, row in rows],
+        excel,
+    )
+    return AlignmentResult(
+        rows=rows,
+        excel=excel.getvalue(),
+        failures=aligner.failures,
+        seconds=time.monotonic() - started,
+    )
+
+
+class Job:
+    """One submitted alignment. Its ``progress`` is updated while it runs."""
+
+    def __init__(self, key, num_files):
+        self.key = key
+        self.num_files = num_files
+        self.cancel_token = CancelToken()
+        self.progress = None
+        self.future = None
+
+    def _on_progress(self, progress):
+        self.progress = progress
+
+    @property
+    def status(self):
+        """One of queued, running, done, cancelled or error"""
+        if self.future.cancelled():
+            return "cancelled"
+        if not self.future.done():
+            return "running" if self.future.running() else "queued"
+        error = self.future.exception()
+        if error is None:
+            return "done"
+        return "cancelled" if isinstance(error, AlignmentCancelled) else "error"
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        """The ``AlignmentResult``, raises the job's exception if it failed"""
+        return self.future.result(timeout)
+
+    def cancel(self):
+        """Drop the job if it is queued, or stop it if it is running"""
+        self.cancel_token.cancel()
+        self.future.cancel()
+
+
+class JobManager:
+    """Runs alignment jobs on background threads and caches their results
+
+    One manager is meant to be shared by all users of a process, so that
+    their jobs queue on the same pool and share the cache.
+    """
+
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, cache_size=DEFAULT_CACHE_SIZE):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="alignment"
+        )
+        self.cache_size = cache_size
+        self._jobs = OrderedDict()  # key -> Job, least recently used first
+        self._lock = threading.Lock()
+
+    def submit(self, files, **options):
+        """Start aligning ``files`` (``(name, bytes)`` tuples), returns a ``Job``
+
+        A job already running or finished for the same files and options is
+        returned instead of starting a new one.
+        """
+        key = job_key(files, options)
+        with self._lock:
+            job = self._jobs.get(key)
+            reusable = job is not None and not job.cancel_token.cancelled
+            if reusable and job.status != "error":
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key, len(files))
+            job.future = self.executor.submit(
+                align_files,
+                files,
+                progress=job._on_progress,
+                cancel=job.cancel_token,
+                isolate=True,
+                **options,
+            )
+            self._jobs[key] = job
+            self._evict()
+        return job
+
+    def get(self, key):
+        """The job submitted under ``key``, or None"""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def _evict(self):
+        # Only finished jobs are evicted, running ones are still needed
+        finished = [key for key, job in self._jobs.items() if job.done()]
+        for key in finished[: max(0, len(self._jobs) - self.cache_size)]:
+            del self._jobs[key]
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,265 @@
+"""
+Compact binary on-disk format for multiple alignments (``.tsmsa``).
+
+Instead of one full gapped string per witness, a collation is stored as the
+pivot text plus, for every other witness, the runs of columns where it
+reads differently from the pivot. Most columns of a collation agree with
+the pivot, so this is a fraction of the size of the ``aligned_*.txt`` files.
+
+Layout (little endian):
+
+    magic       8 bytes, ``TSMSA\\x01`` padded with zeros
+    header_len  uint32, length of the JSON header that follows
+    header      JSON: witness ids, pivot row, column count, gap char,
+                char dtype and the offset/length of every section
+    sections    8-byte aligned arrays:
+        pivot       the pivot characters without gaps (code points)
+        insertions  uint32, sorted columns where the pivot has a gap
+        boundaries  uint32, sorted word-break columns (a space in any row)
+        runs_<i>    uint32 ``(start, length, offset)`` triples, sorted by start:
+                    columns where row ``i`` differs from the gapped pivot row
+        chars_<i>   the characters of those runs (gaps as the gap char)
+
+Sections are read straight from a memory map, so opening a file is
+instant and any column range can be read without loading the rest.
+"""
+
+import json
+import mmap
+import struct
+
+import numpy as np
+
+from .genalog_alignment import GAP_CHAR
+
+MAGIC = b"TSMSA\x01\x00\x00"
+VERSION = 1
+RUN_FIELDS = 3  # start column, length, offset into the chars section
+
+
+def _encode(s):
+    return np.frombuffer(s.encode("utf-32-le"), dtype="<u4")
+
+
+def _decode(codes):
+    return codes.astype("<u4").tobytes().decode("utf-32-le")
+
+
+def _diff_runs(row, base):
+    """Runs ``(start, length)`` of positions where the code arrays differ"""
+    diff = np.concatenate(([False], row != base, [False])).astype(np.int8)
+    edges = np.flatnonzero(np.diff(diff))
+    starts, ends = edges[0::2], edges[1::2]
+    return starts, ends - starts
+
+
+def save_msa(path, rows, pivot_id=None, gap_char=GAP_CHAR):
+    """Write a multiple alignment to a ``.tsmsa`` file
+
+    Arguments:
+        path (str) : output file path
+        rows (list) : ``(id, aligned_row)`` tuples, all rows of equal length,
+            as returned by ``StarAligner.align()``
+        pivot_id (str, optional) : the row to store the others against. Defaults to
+            the row with the fewest gaps.
+        gap_char (char, optional) : gap char used in the rows. Defaults to ``GAP_CHAR``.
+
+    Raises:
+        ValueError: for no rows, or rows of different lengths
+    """
+    if not rows:
+        raise ValueError("Cannot save an alignment without rows")
+    ids = [tid for tid, _ in rows]
+    codes = [_encode(row) for _, row in rows]
+    num_columns = len(codes[0])
+    if any(len(c) != num_columns for c in codes):
+        raise ValueError("Aligned rows are not equal in length")
+
+    gap = ord(gap_char)
+    if pivot_id is None:
+        pivot_idx = max(range(len(codes)), key=lambda i: int(np.sum(codes[i] != gap)))
+    else:
+        pivot_idx = ids.index(pivot_id)
+    pivot_row = codes[pivot_idx]
+
+    max_code = max((int(c.max()) for c in codes if len(c)), default=0)
+    char_dtype = "<u2" if max_code < 0x10000 else "<u4"
+
+    sections = {
+        "pivot": pivot_row[pivot_row != gap].astype(char_dtype),
+        "insertions": np.flatnonzero(pivot_row == gap).astype("<u4"),
+        "boundaries": np.flatnonzero(
+            np.logical_or.reduce([c == ord(" ") for c in codes])
+        ).astype("<u4"),
+    }
+    for i, row in enumerate(codes):
+        if i == pivot_idx:
+            continue
+        starts, lengths = _diff_runs(row, pivot_row)
+        offsets = np.cumsum(lengths) - lengths
+        runs = np.stack([starts, lengths, offsets], axis=1).astype("<u4")
+        sections[f"runs_{i}"] = runs.reshape(-1)
+        sections[f"chars_{i}"] = row[row != pivot_row].astype(char_dtype)
+
+    # Lay out the sections after the header, each on an 8-byte boundary
+    layout = {}
+    header = {
+        "version": VERSION,
+        "ids": ids,
+        "pivot": pivot_idx,
+        "columns": num_columns,
+        "gap_char": gap_char,
+        "char_dtype": char_dtype,
+        "sections": layout,
+    }
+    # The header size depends on the offsets, so reserve room for them first
+    for name, array in sections.items():
+        layout[name] = [0, len(array), array.dtype.str]
+    header_len = len(json.dumps(header).encode("utf-8")) + 16 * len(sections)
+    offset = _align8(len(MAGIC) + 4 + header_len)
+    for name, array in sections.items():
+        layout[name][0] = offset
+        offset = _align8(offset + array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", header_len))
+        f.write(header_bytes)
+        for name, array in sections.items():
+            f.seek(layout[name][0])
+            f.write(array.tobytes())
+        f.truncate(offset)
+
+
+def _align8(n):
+    return (n + 7) & ~7
+
+
+class MSAFile:
+    """A memory-mapped ``.tsmsa`` multiple alignment
+
+    Column ranges follow Python slice conventions: ``start`` inclusive, ``end`` exclusive.
+    """
+
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str) : the ``.tsmsa`` file, or its contents as bytes (e.g. an
+                upload), read in place of a memory map
+        """
+        if isinstance(path, (bytes, bytearray)):
+            self.path = None
+            self._mmap = bytes(path)
+        else:
+            self.path = path
+            with open(path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._read_header()
+        except Exception:
+            self.close()
+            raise
+
+    def _read_header(self):
+        """Reads the header and maps the sections it lists"""
+        source = self.path or "Data"
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{source} is not a textual synopsis MSA file")
+        try:
+            (header_len,) = struct.unpack_from("<I", self._mmap, len(MAGIC))
+            start = len(MAGIC) + 4
+            header = json.loads(bytes(self._mmap[start : start + header_len]))
+        except (struct.error, ValueError) as e:  # JSON errors are ValueErrors
+            raise ValueError(f"{source} has a corrupt header: {e}") from e
+        if header["version"] != VERSION:
+            raise ValueError(f"Unsupported MSA file version {header['version']}")
+
+        self.ids = header["ids"]
+        self.pivot_idx = header["pivot"]
+        self.num_columns = header["columns"]
+        self.gap_char = header["gap_char"]
+        self._sections = {
+            name: np.frombuffer(self._mmap, dtype=dtype, count=count, offset=offset)
+            for name, (offset, count, dtype) in header["sections"].items()
+        }
+        self._pivot = self._sections["pivot"]
+        self._insertions = self._sections["insertions"]
+
+    @property
+    def pivot_id(self):
+        return self.ids[self.pivot_idx]
+
+    @property
+    def word_boundaries(self):
+        """Sorted columns at which ``to_excel.align_to_words`` starts a new word"""
+        return self._sections["boundaries"]
+
+    def close(self):
+        self._sections = self._pivot = self._insertions = None
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _range(self, start, end):
+        end = self.num_columns if end is None else min(end, self.num_columns)
+        return min(max(0, start), end), end
+
+    def _pivot_codes(self, start, end):
+        columns = np.arange(start, end, dtype=np.int64)
+        before = np.searchsorted(self._insertions, columns)
+        is_insertion = np.zeros(len(columns), dtype=bool)
+        in_bounds = before < len(self._insertions)
+        is_insertion[in_bounds] = (
+            self._insertions[before[in_bounds]] == columns[in_bounds]
+        )
+        codes = np.full(len(columns), ord(self.gap_char), dtype="<u4")
+        pivot_pos = (columns - before)[~is_insertion]
+        codes[~is_insertion] = self._pivot[pivot_pos]
+        return codes
+
+    def _row_codes(self, row_idx, start, end):
+        codes = self._pivot_codes(start, end)
+        if row_idx == self.pivot_idx:
+            return codes
+        runs = self._sections[f"runs_{row_idx}"].reshape(-1, RUN_FIELDS)
+        chars = self._sections[f"chars_{row_idx}"]
+        # First run ending after start, then every run starting before end
+        first = np.searchsorted(runs[:, 0] + runs[:, 1], start, side="right")
+        last = np.searchsorted(runs[:, 0], end, side="left")
+        for run_start, length, offset in runs[first:last].astype(np.int64):
+            lo, hi = max(run_start, start), min(run_start + length, end)
+            codes[lo - start : hi - start] = chars[
+                offset + lo - run_start : offset + hi - run_start
+            ]
+        return codes
+
+    def row(self, tid, start=0, end=None):
+        """The aligned row of witness ``tid`` over columns ``[start, end)``"""
+        start, end = self._range(start, end)
+        return _decode(self._row_codes(self.ids.index(tid), start, end))
+
+    def rows(self, start=0, end=None):
+        """``(id, aligned_row)`` of every witness over columns ``[start, end)``"""
+        start, end = self._range(start, end)
+        return [
+            (tid, _decode(self._row_codes(i, start, end)))
+            for i, tid in enumerate(self.ids)
+        ]
+
+    def texts(self):
+        """All rows as ``{"name", "content"}`` dicts, like ``to_excel.load_aligned_texts()``"""
+        return [
+            {"name": tid.replace(".txt", ""), "content": row}
+            for tid, row in self.rows()
+        ]
+
+
+def load_msa(path):
+    """Open a ``.tsmsa`` file, or read one from bytes, see ``MSAFile``"""
+    return MSAFile(path)
@@ -1,41 +1,200 @@
+import hashlib
+import itertools
+import logging
+import dataclasses
 import os
-import glob
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
 from . import genalog_alignment
-from .genalog_anchor import align_w_anchor
+from .corpus import load_corpus
+from .engines import run_engine
+from .instrument import span
+from .planner import engine_cells, fallback_chain, is_fragment, plan_alignment
+from .progress import ProgressTracker, check_cancelled
+from .workers import CANCEL_POLL_SECONDS, PairJob, run_pairs
+from .genalog_anchor import (
+    align_w_anchor,
+    get_common_anchors,
+    segment_len,
+    split_at_common_anchors,
+)
 from .genalog_preprocess import tokenize, join_tokens
 
+logger = logging.getLogger(__name__)
 
-def load_texts_from_directory(directory_path):
+
+def normalize_text(raw_content):
+    """
+    Normalizes text by tokenizing and rejoining it, to ensure consistency with genalog alignment.
+    This removes newlines and extra spaces, preventing length mismatches in Star Alignment.
+    """
+    return join_tokens(tokenize(raw_content))
+
+
+def load_texts_from_directory(directory_path, extensions=None):
     """
-    Loads all text files from the directory.
-    Returns a list of tuples: (filename, content), sorted by filename.
+    Loads the text files of a directory, or of a manifest file listing them
+    (see corpus.load_corpus), in parallel for large corpora. Binary and
+    non UTF-8 files are skipped. extensions: only load files ending with one
+    of these, e.g. [".txt"].
+    Returns a list of tuples: (filename, content), sorted by filename (in
+    listed order for a manifest).
     """
-    files = sorted(glob.glob(os.path.join(directory_path, "*")))
-    texts = []
-    # Filter for text files if needed, or just try to read all
-    for f in files:
-        if os.path.isfile(f):
-            try:
-                with open(f, "r", encoding="utf-8") as f_obj:
-                    # Normalize text: tokenize and rejoin to ensure consistency with genalog alignment
-                    # This removes newlines and extra spaces, preventing length mismatches in Star Alignment
-                    raw_content = f_obj.read()
-                    normalized_content = join_tokens(tokenize(raw_content))
-                    texts.append((os.path.basename(f), normalized_content))
-            except Exception as e:
-                print(f"Skipping {f} due to error: {e}")
-    return texts
+    return [
+        (f.name, f.text) for f in load_corpus(directory_path, extensions=extensions)
+    ]
+
+
+# Minimum characters per block when cutting texts in lockstep at common anchors
+MIN_BLOCK_LENGTH = 2000
+# Blocks submitted per worker process ahead of the one being yielded
+BLOCKS_PER_WORKER = 2
+
+# Texts at least this long are checked for being near-duplicates of an aligned
+# text, when at most NEAR_DUPLICATE_SHARE of their words differ from it
+MIN_NEAR_DUPLICATE_LENGTH = 2000
+NEAR_DUPLICATE_SHARE = 0.01
+
+
+def _score_pair(pair):
+    gt, noise = pair
+    return genalog_alignment.score(gt, noise)
+
+
+def pairwise_scores(texts, max_workers=None, normalize=False):
+    """
+    Computes the global alignment score of every pair of texts, without traceback.
+    texts: list of (id, text_content)
+    max_workers: number of worker processes. None uses all CPUs, 1 scores in-process.
+    normalize: divide each score by the best possible score of the pair
+               (an identical copy of the longer text), so identical texts score 1.0.
+    Returns a symmetric pandas DataFrame indexed by text id on both axes.
+    """
+    import pandas as pd
+
+    ids = [tid for tid, _ in texts]
+    contents = [content for _, content in texts]
+    n = len(texts)
+    pairs = list(itertools.combinations(range(n), 2))
+    jobs = [(contents[i], contents[j]) for i, j in pairs]
+
+    if max_workers == 1 or len(jobs) < 2:
+        scores = list(map(_score_pair, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            scores = list(executor.map(_score_pair, jobs))
+
+    # Scoring a text against itself only ever matches
+    matrix = [[0.0] * n for _ in range(n)]
+    for i, content in enumerate(contents):
+        matrix[i][i] = genalog_alignment.MATCH_REWARD * len(content)
+    for (i, j), score in zip(pairs, scores):
+        matrix[i][j] = matrix[j][i] = score
+
+    if normalize:
+        self_scores = [matrix[i][i] for i in range(n)]
+        for i, j in itertools.product(range(n), repeat=2):
+            best = max(self_scores[i], self_scores[j])
+            matrix[i][j] = matrix[i][j] / best if best else 1.0
+
+    return pd.DataFrame(matrix, index=ids, columns=ids)
 
 
 class StarAligner:
-    def __init__(self, texts_with_ids):
+    def __init__(
+        self,
+        texts_with_ids,
+        pivot="longest",
+        max_workers=None,
+        memory_budget=None,
+        time_budget=None,
+        timeout=None,
+        memory_limit=None,
+        isolate=False,
+        progress=None,
+        cancel=None,
+        deduplicate=True,
+        index=False,
+        quiet=False,
+    ):
         """
         texts_with_ids: list of (id, text_content)
+        pivot: how to select the pivot text:
+            "longest"  - the longest text (default)
+            "centroid" - the text most similar to all others, by pairwise_scores
+            or the id of the text to use as pivot
+        max_workers: worker processes used when scoring for pivot selection
+        memory_budget: peak bytes allowed for one pairwise alignment
+        time_budget: estimated seconds allowed for all pairwise alignments
+            With either budget set, an engine is planned for each pair (see planner),
+            otherwise every pair uses full global alignment.
+        timeout: seconds allowed for one pairwise alignment attempt
+        memory_limit: bytes one pairwise alignment attempt may allocate
+            With either limit set, pairs run in isolated worker processes; a pair
+            that overruns is retried with cheaper engines, and dropped from the
+            collation with its reason in self.failures if all of them fail.
+        isolate: run pairs in isolated worker processes even without limits, so that
+            cancelling stops a running pairwise alignment right away
+        progress: callable receiving a progress.Progress after every pair
+        cancel: a progress.CancelToken, checked between pairs and inside the
+            anchored and segmented engines. align() raises AlignmentCancelled.
+        deduplicate: align texts that are identical to another one once, and clone
+            their rows; patch texts that differ from an aligned one by a few edits
+            into a copy of its row (see incremental.realign_witness) instead of
+            aligning them.
+        index: build a coords.AlignmentIndex of the result, in self.index, for
+            lookups between witness characters or words and alignment columns
+        quiet: log progress messages at debug level, for callers that report
+            their own (see align_in_blocks)
         """
         self.texts = texts_with_ids
         self.gap_char = genalog_alignment.GAP_CHAR
+        self.pivot = pivot
+        self.max_workers = max_workers
+        self.memory_budget = memory_budget
+        self.time_budget = time_budget
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.isolate = isolate
+        self.progress = progress
+        self.cancel = cancel
+        self.deduplicate = deduplicate
+        self.build_index = index
+        self.index = None
+        self._info = logger.debug if quiet else logger.info
+        self.duplicates = {}
+        self.near_duplicates = {}
+        self.plan = None
+        self.pivot_idx = None
+        self.pivot_id = None
+        self.failures = []
 
     def _select_pivot(self):
+        """
+        Selects the pivot according to self.pivot.
+        Returns index of pivot in self.texts.
+        """
+        if self.pivot == "centroid":
+            return self._select_centroid_pivot()
+        if self.pivot != "longest":
+            for i, (tid, _) in enumerate(self.texts):
+                if tid == self.pivot:
+                    return i
+            raise ValueError(f"Pivot '{self.pivot}' is not one of the texts")
+        return self._select_longest_pivot()
+
+    def _select_centroid_pivot(self):
+        """
+        Selects the text with the highest total normalized score against all others.
+        Returns index of pivot in self.texts.
+        """
+        scores = pairwise_scores(
+            self.texts, max_workers=self.max_workers, normalize=True
+        )
+        totals = scores.sum(axis=1).tolist()
+        return totals.index(max(totals))
+
+    def _select_longest_pivot(self):
         """
         Selects the text with the maximum length as the pivot.
         Returns index of pivot in self.texts.
@@ -52,19 +211,292 @@ class StarAligner:
         if not self.texts:
             return []
 
-        pivot_idx = self._select_pivot()
+        jobs = self.pair_jobs()
+        tracker = ProgressTracker(
+            self.progress,
+            pairs_total=len(jobs),
+            cells_total=sum(len(job.gt) * len(job.noise) for job in jobs),
+        )
+        if self.isolate or self.timeout is not None or self.memory_limit is not None:
+            pairwise = self._align_pairs_isolated(jobs, tracker)
+        else:
+            pairwise = self._align_pairs(jobs, tracker)
+        check_cancelled(self.cancel)
+
+        return self.collate(pairwise)
+
+    def pair_jobs(self):
+        """
+        Selects the pivot and plans the pairwise alignments against it.
+        Returns a workers.PairJob for every other text, keyed by its index in
+        self.texts, with the planned engine first in its fallback chain.
+        Duplicates and near-duplicates of other texts get no job, collate()
+        adds their rows. Running the jobs elsewhere and passing the results to
+        collate() is equivalent to align().
+        """
+        check_cancelled(self.cancel)
+        with span("pivot_selection", strategy=self.pivot, texts=len(self.texts)):
+            pivot_idx = self._select_pivot()
         pivot_id, pivot_content = self.texts[pivot_idx]
+        self.pivot_idx = pivot_idx
+        self.pivot_id = pivot_id
+        self.failures = []
+        self.duplicates, self.near_duplicates = {}, {}
+        if self.deduplicate:
+            with span("deduplicate", texts=len(self.texts)):
+                self._find_duplicates()
+
+        other_indices = [
+            i
+            for i in range(len(self.texts))
+            if i != pivot_idx
+            and i not in self.duplicates
+            and i not in self.near_duplicates
+        ]
+
+        self._info(f"Selected pivot: {pivot_id} (Length: {len(pivot_content)})")
+
+        if self.memory_budget is not None or self.time_budget is not None:
+            with span("planning"):
+                self.plan = plan_alignment(
+                    self.texts[pivot_idx],
+                    [self.texts[i] for i in other_indices],
+                    memory_budget=self.memory_budget,
+                    time_budget=self.time_budget,
+                )
+            self._info(self.plan.describe())
+
+        jobs = []
+        for other_i in other_indices:
+            other_id, other_content = self.texts[other_i]
+            engine, params = self._pair_engine(
+                other_id, len(pivot_content), len(other_content)
+            )
+            engines = fallback_chain(
+                len(pivot_content),
+                len(other_content),
+                engine=engine,
+                params=params,
+                memory_budget=self.memory_limit,
+                time_budget=self.timeout,
+            )
+            jobs.append(
+                PairJob(other_i, other_id, pivot_content, other_content, engines)
+            )
+        return jobs
+
+    def collate(self, pairwise, failures=None):
+        """
+        Merges pairwise alignments against the pivot selected by pair_jobs().
+        pairwise: dict mapping the index of each aligned text to (aligned_pivot, aligned_other)
+        failures: workers.PairFailure of texts that could not be aligned, added to self.failures
+        Returns the multiple alignment as (id, aligned_row) tuples in text order.
+        """
+        self.failures = self.failures + list(failures or [])
+        # Witnesses that could not be aligned are left out of the collation
+        for failure in self.failures:
+            logger.warning(f"Failed to align {failure.other_id}: {failure.describe()}")
+
+        pivot_idx = self.pivot_idx
+        with span("merge", texts=len(pairwise) + 1) as fields:
+            final_strings = self._merge(pivot_idx, pairwise)
+            fields["columns"] = len(final_strings[pivot_idx])
+        if self.near_duplicates:
+            with span("patch_near_duplicates", texts=len(self.near_duplicates)):
+                final_strings = self._patch_near_duplicates(final_strings)
+        for i, original_i in sorted(self.duplicates.items()):
+            self._copy_row(final_strings, i, original_i)
+
+        # Pack results
+        results = []
+        for i, (tid, _) in enumerate(self.texts):
+            if i in final_strings:
+                results.append((tid, final_strings[i]))
 
+        if self.build_index:
+            from .coords import AlignmentIndex
+
+            with span("index", texts=len(results)):
+                self.index = AlignmentIndex(results, gap_char=self.gap_char)
+        return results
+
+    def _find_duplicates(self):
+        """
+        Fills self.duplicates and self.near_duplicates, mapping the index of
+        each such text to the index of the text it copies. The pivot and texts
+        before others are the ones kept.
+        """
+        order = [self.pivot_idx] + [
+            i for i in range(len(self.texts)) if i != self.pivot_idx
+        ]
+        seen = {}  # content hash -> index of the first text with it
+        originals = []  # texts that are aligned
+        word_counts = {}
+        for i in order:
+            tid, content = self.texts[i]
+            digest = hashlib.sha1(content.encode("utf-8")).digest()
+            if digest in seen:
+                self.duplicates[i] = seen[digest]
+                self._info(f"{tid} is a duplicate of {self.texts[seen[digest]][0]}")
+                continue
+            seen[digest] = i
+            if len(content) >= MIN_NEAR_DUPLICATE_LENGTH:
+                word_counts[i] = Counter(content.split())
+                original_i = self._near_duplicate_of(i, originals, word_counts)
+                if original_i is not None:
+                    self.near_duplicates[i] = original_i
+                    self._info(
+                        f"{tid} is a near-duplicate of {self.texts[original_i][0]}"
+                    )
+                    continue
+            originals.append(i)
+
+    def _near_duplicate_of(self, i, originals, word_counts):
+        """
+        Returns the index of the first of originals that text i only differs
+        from by a few edits (see incremental.MAX_CHANGED_SHARE), or None.
+        """
+        from .incremental import MAX_CHANGED_SHARE, diff_windows
+
+        content = self.texts[i][1]
+        words = word_counts[i]
+        max_words = NEAR_DUPLICATE_SHARE * sum(words.values())
+        for original_i in originals:
+            original = self.texts[original_i][1]
+            if original_i not in word_counts:
+                continue
+            if abs(len(original) - len(content)) > NEAR_DUPLICATE_SHARE * len(content):
+                continue
+            # Words in one text and not the other bound the edits from below
+            original_words = word_counts[original_i]
+            differing = sum((words - original_words).values()) + sum(
+                (original_words - words).values()
+            )
+            if differing > max_words:
+                continue
+            windows = diff_windows(original, content)
+            changed = sum(end - start for start, end, _, _ in windows)
+            if changed <= MAX_CHANGED_SHARE * len(original):
+                return original_i
+        return None
+
+    def _patch_near_duplicates(self, final_strings):
+        """
+        Adds the rows of the near-duplicates to final_strings (index -> aligned row),
+        each patched from a copy of the row of its original.
+        """
+        from .incremental import realign_witness
+
+        for i, original_i in sorted(self.near_duplicates.items()):
+            if not self._copy_row(final_strings, i, original_i):
+                continue
+            tid, content = self.texts[i]
+            rows = [(self.texts[k][0], row) for k, row in sorted(final_strings.items())]
+            rows, _ = realign_witness(rows, self.pivot_id, tid, content)
+            final_strings = dict(zip(sorted(final_strings), (row for _, row in rows)))
+        return final_strings
+
+    def _copy_row(self, final_strings, i, original_i):
+        """
+        Gives text i the row of original_i, or the failure of original_i if it
+        could not be aligned. Returns whether there was a row to copy.
+        """
+        if original_i in final_strings:
+            final_strings[i] = final_strings[original_i]
+            return True
+        original_id = self.texts[original_i][0]
+        for failure in self.failures:
+            if failure.other_id == original_id:
+                self.failures.append(
+                    dataclasses.replace(failure, other_id=self.texts[i][0])
+                )
+                logger.warning(
+                    f"Failed to align {self.texts[i][0]}, a copy of {original_id}"
+                )
+                break
+        return False
+
+    def _pair_engine(self, other_id, pivot_length, other_length):
+        """
+        Returns the (engine, params) planned for a pair. By default, full global
+        alignment, or fragment alignment for a witness much shorter than the
+        pivot (see planner.is_fragment).
+        """
+        if self.plan is not None:
+            pair_plan = self.plan.get(other_id)
+            return pair_plan.engine, pair_plan.params
+        if is_fragment(pivot_length, other_length):
+            return "fragment", {}
+        return "global", {}
+
+    def _align_pairs(self, jobs, tracker):
+        """
+        Aligns every other text against the pivot, in this process, with the
+        first engine of each job. Progress is reported to tracker, self.cancel
+        is checked between pairs.
+        Returns a dict mapping the index of each other text to (aligned_pivot, aligned_other).
+        """
+        pairwise = {}
+        for job in jobs:
+            check_cancelled(self.cancel)
+            self._info(f"Aligning {job.other_id} against pivot...")
+            tracker.report(current=job.other_id)
+
+            # aligned_gt corresponds to Pivot (P) with gaps
+            # aligned_noise corresponds to Other (T) with gaps
+            # Use direct global alignment instead of anchored alignment, unless planned otherwise.
+            # Anchored alignment can cause block shifts if it latches onto false positive anchors (common words).
+            # Since we optimized genalog_alignment to use Bio.Align (C-based), it can handle 10k+ chars efficiently.
+            engine, params = job.engines[0]
+            cells = engine_cells(engine, len(job.gt), len(job.noise), params)
+            with span(
+                "pairwise_alignment",
+                other=job.other_id,
+                engine=engine,
+                cells=int(cells),
+            ):
+                pairwise[job.key] = run_engine(
+                    engine, job.gt, job.noise, cancel=self.cancel, **params
+                )
+            tracker.pair_done(len(job.gt) * len(job.noise))
+        return pairwise
+
+    def _align_pairs_isolated(self, jobs, tracker):
+        """
+        Aligns every other text against the pivot in worker processes, enforcing
+        self.timeout and self.memory_limit on every attempt. A pair that overruns
+        is retried with cheaper engines; pairs that fail for good go to self.failures.
+        Cancelling self.cancel terminates the running workers.
+        Returns a dict mapping the index of each aligned text to (aligned_pivot, aligned_other).
+        """
+        self._info(f"Aligning {len(jobs)} texts against pivot in worker processes...")
+        tracker.report()
+        pairwise, self.failures = run_pairs(
+            jobs,
+            timeout=self.timeout,
+            memory_limit=self.memory_limit,
+            max_workers=self.max_workers,
+            cancel=self.cancel,
+            on_done=lambda job: tracker.pair_done(len(job.gt) * len(job.noise)),
+        )
+        return pairwise
+
+    def _merge(self, pivot_idx, pairwise):
+        """
+        Merges the pairwise alignments against the pivot into one multiple alignment.
+        pairwise: dict mapping the index of each other text to (aligned_pivot, aligned_other)
+        Returns a dict mapping the index of the pivot and of each other text to its aligned row.
+        """
         # P: The actual characters of the pivot (without gaps)
         # We will iterate through P to anchor our MSA
-        P = pivot_content
+        P = self.texts[pivot_idx][1]
 
         # Data structures to hold alignment info relative to P
         # slots[k] holds insertions (strings) from other texts appearing BEFORE P[k]
         # slots[len(P)] holds insertions AFTER the last char of P
         # Each element of slots is a list of strings, one for each "other" text.
 
-        other_indices = [i for i in range(len(self.texts)) if i != pivot_idx]
+        other_indices = sorted(pairwise)
         # Map from original index to 'other' index (0..N-2) for storage in lists
         text_idx_map = {
             original_i: list_i for list_i, original_i in enumerate(other_indices)
@@ -76,20 +508,8 @@ class StarAligner:
         # matches[k] holds the character aligned to P[k] for each other text
         matches = [["" for _ in range(num_others)] for _ in range(len(P))]
 
-        print(f"Selected pivot: {pivot_id} (Length: {len(P)})")
-
         for other_i in other_indices:
-            other_id, other_content = self.texts[other_i]
-            print(f"Aligning {other_id} against pivot...")
-
-            # aligned_gt corresponds to Pivot (P) with gaps
-            # aligned_noise corresponds to Other (T) with gaps
-            # Use direct global alignment instead of anchored alignment.
-            # Anchored alignment can cause block shifts if it latches onto false positive anchors (common words).
-            # Since we optimized genalog_alignment to use Bio.Align (C-based), it can handle 10k+ chars efficiently.
-            aligned_pivot, aligned_other = genalog_alignment.align(
-                pivot_content, other_content
-            )
+            aligned_pivot, aligned_other = pairwise[other_i]
 
             # Parse the alignment to fill slots and matches
             p_idx = 0  # Index in original P
@@ -129,7 +549,7 @@ class StarAligner:
         # Row 0 is Pivot
         # Rows 1..N-1 are Others (in order of other_indices)
 
-        final_rows = [[] for _ in range(len(self.texts))]
+        final_rows = {i: [] for i in [pivot_idx] + other_indices}
         pivot_row_idx = pivot_idx
         other_row_indices = other_indices
 
@@ -163,11 +583,157 @@ class StarAligner:
                     final_rows[original_i].append(match_char)
 
         # Join lists
-        final_strings = ["".join(row) for row in final_rows]
+        return {i: "".join(row) for i, row in final_rows.items()}
 
-        # Pack results
-        results = []
-        for i, (tid, _) in enumerate(self.texts):
-            results.append((tid, final_strings[i]))
 
-        return results
+def _quiet_worker():
+    # Per-block progress messages from the pool would drown the block-level ones
+    package_logger = logging.getLogger(__name__.rpartition(".")[0])
+    package_logger.setLevel(max(logging.WARNING, package_logger.getEffectiveLevel()))
+
+
+def _align_block(job):
+    """
+    Star-aligns one block. Texts whose alignment failed in the block are kept
+    as unaligned insertions at its end, so that every text has a row.
+    Returns the rows, in text order, and the block's workers.PairFailure.
+    """
+    block_texts, aligner_options = job
+    # Per-block progress messages would drown the block-level ones
+    aligner = StarAligner(block_texts, quiet=True, **aligner_options)
+    with span("block", chars=sum(len(content) for _, content in block_texts)):
+        aligned = dict(aligner.align())
+    gap_char = aligner.gap_char
+    for failure in aligner.failures:
+        content = dict(block_texts)[failure.other_id]
+        for tid in aligned:
+            aligned[tid] += gap_char * len(content)
+        aligned[failure.other_id] = (
+            gap_char * (len(next(iter(aligned.values()))) - len(content)) + content
+        )
+    return [aligned[tid] for tid, _ in block_texts], aligner.failures
+
+
+def align_in_blocks(
+    texts_with_ids,
+    min_block_length=MIN_BLOCK_LENGTH,
+    max_workers=None,
+    progress=None,
+    cancel=None,
+    failures=None,
+    **aligner_options,
+):
+    """
+    Cuts all texts in lockstep at anchor words common to all of them, and
+    star-aligns the blocks independently, in parallel worker processes.
+    Memory then scales with the block size instead of the text size.
+
+    texts_with_ids: list of (id, text_content)
+    min_block_length: minimum characters per block (in its longest text)
+    max_workers: number of worker processes, 1 aligns the blocks in-process
+    progress: callable receiving a progress.Progress after every block
+    cancel: a progress.CancelToken, checked while waiting for blocks. Blocks not
+        yet started are dropped, then AlignmentCancelled is raised.
+    failures: a list, extended with the workers.PairFailure of every block, their
+        detail prefixed with the block number. A text that failed in a block is
+        left unaligned at the end of that block.
+    aligner_options: passed on to the StarAligner of each block
+
+    Yields, block by block in text order, a list with the next piece of the
+    aligned row of every text (in the order of texts_with_ids). Concatenating
+    all pieces of a text gives its full aligned row.
+    """
+    ids = [tid for tid, _ in texts_with_ids]
+    token_lists = [tokenize(content) for _, content in texts_with_ids]
+    anchors = get_common_anchors(token_lists)
+    blocks = split_at_common_anchors(token_lists, anchors, min_block_length)
+    logger.info(f"Split {len(ids)} texts into {len(blocks)} blocks at common anchors")
+
+    # Cells of each block, as if star-aligned against its longest text
+    block_cells = []
+    for block in blocks:
+        lengths = [segment_len(tokens) + len(tokens) for tokens in block]
+        block_cells.append(max(lengths) * (sum(lengths) - max(lengths)))
+    pairs_per_block = len(ids) - 1
+    tracker = ProgressTracker(
+        progress,
+        pairs_total=len(blocks) * pairs_per_block,
+        cells_total=sum(block_cells),
+    )
+
+    jobs = (
+        (
+            [(tid, join_tokens(tokens)) for tid, tokens in zip(ids, block)],
+            aligner_options,
+        )
+        for block in blocks
+    )
+
+    # Blocks are joined with a space where a text has words on both sides
+    gap_char = genalog_alignment.GAP_CHAR
+    seen = [False] * len(ids)
+
+    def stitch(block, rows):
+        has_text = [bool(tokens) for tokens in block]
+        separators = [
+            " " if (was_seen and has) else gap_char
+            for was_seen, has in zip(seen, has_text)
+        ]
+        if not any(seen) or all(sep == gap_char for sep in separators):
+            separators = [""] * len(ids)
+        for row_i, has in enumerate(has_text):
+            seen[row_i] = seen[row_i] or has
+        return [sep + row for sep, row in zip(separators, rows)]
+
+    def record(k, block_failures):
+        for failure in block_failures:
+            failure.detail = f"block {k + 1}/{len(blocks)}: {failure.detail}"
+            logger.warning(f"Failed to align {failure.other_id} in block {k + 1}")
+        if failures is not None:
+            failures.extend(block_failures)
+
+    tracker.report()
+    if max_workers == 1:
+        for k, (block, cells, job) in enumerate(zip(blocks, block_cells, jobs)):
+            check_cancelled(cancel)
+            rows, block_failures = _align_block(job)
+            record(k, block_failures)
+            tracker.pair_done(cells, pairs=pairs_per_block)
+            yield stitch(block, rows)
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_quiet_worker
+        )
+        # Blocks are submitted as earlier ones are yielded, so that only the
+        # blocks in flight are held in memory, however slow the consumer
+        in_flight = deque()
+
+        def submit_next():
+            job = next(jobs, None)
+            if job is not None:
+                in_flight.append(executor.submit(_align_block, job))
+
+        try:
+            for _ in range(BLOCKS_PER_WORKER * max_workers):
+                submit_next()
+            for k, (block, cells) in enumerate(zip(blocks, block_cells)):
+                rows, block_failures = _block_result(in_flight.popleft(), cancel)
+                submit_next()
+                record(k, block_failures)
+                tracker.pair_done(cells, pairs=pairs_per_block)
+                yield stitch(block, rows)
+        finally:
+            # Blocks already running finish in the background when cancelled
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _block_result(future, cancel):
+    """Waits for a block, checking cancel while waiting"""
+    if cancel is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_SECONDS)
+        except TimeoutError:
+            cancel.check()
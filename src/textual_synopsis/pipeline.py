@@ -1,67 +1,608 @@
+"""
+Command line entry point: align the texts of a directory and write the results.
+
+Importing the CLI stays light (see test_startup.py). numpy, Bio, pandas and
+openpyxl dominate its start up time, so the package imports them inside the
+functions that need them rather than at module level.
+"""
+
 import argparse
+import cProfile
+import json
+import logging
 import os
 import sys
-from .multi_align import load_texts_from_directory, StarAligner
-from .to_excel import create_excel_from_aligned
+import tracemalloc
+from dataclasses import asdict
+from .instrument import span, start_trace, stop_trace
+from .multi_align import (
+    MIN_BLOCK_LENGTH,
+    align_in_blocks,
+    load_texts_from_directory,
+    pairwise_scores,
+    StarAligner,
+)
+from .preview import PREVIEW_WORDS, align_preview
+from .progress import AlignmentCancelled, check_cancelled
+from .to_excel import (
+    create_excel_from_aligned,
+    create_excel_from_msa,
+    create_excel_from_texts,
+)
+
+MSA_FILENAME = "alignment.tsmsa"
+PREVIEW_FILENAME = "preview_table.xlsx"
+
+logger = logging.getLogger(__name__)
 
 
-def run_alignment_pipeline(input_dir, output_dir):
-    print(f"Loading texts from {input_dir}...")
-    texts = load_texts_from_directory(input_dir)
+def run_scores_pipeline(input_dir, output_dir, extensions=None):
+    logger.info(f"Loading texts from {input_dir}...")
+    texts = load_texts_from_directory(input_dir, extensions=extensions)
 
     if len(texts) < 2:
-        print("Error: Need at least 2 text files to align.")
+        logger.error("Error: Need at least 2 text files to score.")
         return False
 
-    print(f"Found {len(texts)} files. Starting alignment...")
+    logger.info(f"Found {len(texts)} files. Scoring all pairs...")
+    scores = pairwise_scores(texts, normalize=True)
 
-    aligner = StarAligner(texts)
-    results = aligner.align()
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    scores_path = os.path.join(output_dir, "pairwise_scores.csv")
+    scores.to_csv(scores_path)
+    print(scores.round(3).to_string())
+    logger.info(f"Written pairwise scores to {scores_path}")
+    return True
+
+
+def run_preview_pipeline(
+    input_dir,
+    output_dir,
+    words=PREVIEW_WORDS,
+    windows=1,
+    excel=True,
+    extensions=None,
+    **aligner_options,
+):
+    """
+    Aligns a sample of the texts in input_dir (see preview.align_preview) and
+    writes its word table to output_dir/preview_table.xlsx.
+    """
+    logger.info(f"Loading texts from {input_dir}...")
+    texts = load_texts_from_directory(input_dir, extensions=extensions)
+
+    if len(texts) < 2:
+        logger.error("Error: Need at least 2 text files to align.")
+        return False
+
+    with span("preview", texts=len(texts), words=words, windows=windows):
+        preview = align_preview(texts, words=words, windows=windows, **aligner_options)
+    logger.info(preview.describe())
+
+    if excel:
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        create_excel_from_texts(
+            [
+                {"name": tid.replace(".txt", ""), "content": row}
+                for tid, row in preview.rows
+            ],
+            os.path.join(output_dir, PREVIEW_FILENAME),
+        )
+    return True
+
+
+def run_alignment_pipeline(
+    input_dir,
+    output_dir,
+    blocks=False,
+    min_block_length=MIN_BLOCK_LENGTH,
+    output_format="text",
+    excel=True,
+    apparatus=None,
+    tei=False,
+    incremental=False,
+    extensions=None,
+    progressive=False,
+    **aligner_options,
+):
+    """
+    Aligns all texts in input_dir and writes the aligned files and Excel table to output_dir.
+    input_dir: a directory, or a manifest file listing the texts one per line
+               (see corpus.scan_corpus)
+    extensions: only align the files ending with one of these, e.g. [".txt"]
+    progressive: align along a guide tree instead of against one pivot (see
+                 progressive.ProgressiveAligner). Of aligner_options, only
+                 memory_budget and cancel apply.
+    excel: write the Excel table. Without it, pandas and openpyxl are never imported.
+    apparatus: also write the consensus text and variant apparatus in this
+               format, "jsonl" or "csv" (see apparatus.write_apparatus)
+    tei: also write the alignment as TEI XML (see tei.write_tei)
+    incremental: update the alignment already in output_dir, realigning only
+                 the windows of the texts that were edited since (see
+                 incremental.update_alignment). Aligns in full when there is
+                 none, texts were added or removed, or too much changed.
+    blocks: cut the texts in lockstep at common anchors and align the blocks in
+            parallel, streaming them to the aligned files (see align_in_blocks)
+    aligner_options are passed on to StarAligner (pivot, budgets, limits, ...),
+    including its progress callback and cancel token. A cancelled alignment
+    raises AlignmentCancelled without writing any aligned files.
+    """
+    cancel = aligner_options.get("cancel")
+    logger.info(f"Loading texts from {input_dir}...")
+    texts = load_texts_from_directory(input_dir, extensions=extensions)
+
+    if len(texts) < 2:
+        logger.error("Error: Need at least 2 text files to align.")
+        return False
+
+    logger.info(f"Found {len(texts)} files. Starting alignment...")
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    print(f"Saving aligned files to {output_dir}...")
-    for filename, content in results:
-        base, ext = os.path.splitext(filename)
-        out_filename = f"aligned_{base}{ext}"
-        out_path = os.path.join(output_dir, out_filename)
+    if incremental:
+        stored = _load_stored_alignment(output_dir, texts, output_format)
+        if stored is not None:
+            from .incremental import update_alignment
 
-        with open(out_path, "w", encoding="utf-8") as f:
-            f.write(content)
+            rows, pivot_id = stored
+            with span("align", texts=len(texts), incremental=True):
+                updated = update_alignment(rows, texts, pivot_id=pivot_id)
+            if updated is not None:
+                results, edited = updated
+                logger.info(
+                    f"Updated the stored alignment for {len(edited)} edited text(s)"
+                )
+                write_alignment(
+                    output_dir,
+                    texts,
+                    results,
+                    pivot_id=pivot_id,
+                    output_format=output_format,
+                    excel=excel,
+                    apparatus=apparatus,
+                    tei=tei,
+                )
+                return True
 
-    print("Alignment complete.")
+    if blocks:
+        with span("align", texts=len(texts), blocks=True):
+            failures = _align_blocks_to_files(
+                texts, output_dir, min_block_length, aligner_options
+            )
+        write_alignment(
+            output_dir,
+            texts,
+            None,
+            failures=failures,
+            output_format=output_format,
+            excel=excel,
+            apparatus=apparatus,
+            tei=tei,
+        )
+    else:
+        with span("align", texts=len(texts)):
+            if progressive:
+                # numpy is only needed for progressive alignment
+                from .progressive import ProgressiveAligner
 
-    # Generate Excel
-    excel_path = os.path.join(output_dir, "alignment_table.xlsx")
-    create_excel_from_aligned(output_dir, excel_path)
+                aligner = ProgressiveAligner(
+                    texts,
+                    memory_budget=aligner_options.get("memory_budget"),
+                    cancel=cancel,
+                )
+            else:
+                aligner = StarAligner(texts, **aligner_options)
+            results = aligner.align()
+        check_cancelled(cancel)
+        write_alignment(
+            output_dir,
+            texts,
+            results,
+            pivot_id=aligner.pivot_id,
+            failures=aligner.failures,
+            output_format=output_format,
+            excel=excel,
+            apparatus=apparatus,
+            tei=tei,
+        )
     return True
 
 
+def write_alignment(
+    output_dir,
+    texts,
+    results,
+    pivot_id=None,
+    failures=(),
+    output_format="text",
+    excel=True,
+    apparatus=None,
+    tei=False,
+):
+    """
+    Writes a multiple alignment to output_dir: the aligned files and/or the
+    binary alignment (see output_format), failures.json and the Excel table.
+    texts: the (id, text_content) that were aligned
+    results: (id, aligned_row) tuples, or None when the aligned files were
+             already written (block mode)
+    pivot_id: the pivot of the alignment, stored in the binary alignment
+    failures: workers.PairFailure of the texts left out, or in block mode, of the
+              texts left unaligned in a block
+    excel: write the Excel table too
+    apparatus: write the consensus text and variant apparatus in this format too
+    tei: write the alignment as TEI XML too
+    """
+    if results is not None and output_format != "msa":
+        logger.info(f"Saving aligned files to {output_dir}...")
+        with span("save", format="text"):
+            for filename, content in results:
+                out_path = os.path.join(output_dir, _aligned_filename(filename))
+
+                with open(out_path, "w", encoding="utf-8") as f:
+                    f.write(content)
+
+    # In block mode, the rows of failed texts are current: unaligned in their blocks
+    _write_failures(output_dir, failures, remove_rows=results is not None)
+
+    excel_path = os.path.join(output_dir, "alignment_table.xlsx")
+    if output_format in ("msa", "both"):
+        # numpy is only needed for the binary format
+        from .msa_format import save_msa
+
+        msa_path = os.path.join(output_dir, MSA_FILENAME)
+        from_files = results is None
+        if from_files:
+            # Block pivots differ, let save_msa pick the row with the fewest gaps
+            results = list(_read_aligned_files(output_dir, texts))
+            pivot_id = None
+        with span("save", format="msa"):
+            save_msa(msa_path, results, pivot_id=pivot_id)
+        logger.info(f"Written binary alignment to {msa_path}")
+        if output_format == "msa" and from_files:
+            _remove_aligned_files(output_dir, texts)
+
+    logger.info("Alignment complete.")
+
+    # The exports stream the alignment back from the saved files
+    saved = msa_path if output_format == "msa" else output_dir
+    if apparatus:
+        from .apparatus import export_apparatus
+
+        export_apparatus(saved, output_dir, apparatus_format=apparatus)
+    if tei:
+        from .tei import TEI_FILENAME, export_tei
+
+        export_tei(saved, os.path.join(output_dir, TEI_FILENAME))
+
+    if not excel:
+        return
+
+    # Generate Excel
+    with span("excel"):
+        if output_format == "msa":
+            create_excel_from_msa(msa_path, excel_path)
+        else:
+            create_excel_from_aligned(output_dir, excel_path)
+
+
+def _load_stored_alignment(output_dir, texts, output_format):
+    """
+    The (id, aligned_row) tuples and pivot id of the alignment saved in
+    output_dir, or None if it has no complete alignment of texts.
+    """
+    msa_path = os.path.join(output_dir, MSA_FILENAME)
+    if output_format != "text" and os.path.exists(msa_path):
+        from .msa_format import load_msa
+
+        with load_msa(msa_path) as msa:
+            return msa.rows(), msa.pivot_id
+    rows = list(_read_aligned_files(output_dir, texts))
+    if not rows or len(rows) < len(texts):
+        logger.info(f"No stored alignment of all texts in {output_dir}")
+        return None
+    return rows, None
+
+
+def _read_aligned_files(output_dir, texts):
+    for filename, _ in texts:
+        path = os.path.join(output_dir, _aligned_filename(filename))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                yield filename, f.read()
+
+
+def _remove_aligned_files(output_dir, texts):
+    for filename, _ in texts:
+        path = os.path.join(output_dir, _aligned_filename(filename))
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _align_blocks_to_files(texts, output_dir, min_block_length, aligner_options):
+    """
+    Streams block-wise alignments to the aligned files as blocks complete.
+    Returns the workers.PairFailure of every block.
+    """
+    aligner_options = dict(aligner_options)
+    max_workers = aligner_options.pop("max_workers", None)
+    out_files = [
+        open(
+            os.path.join(output_dir, _aligned_filename(filename)), "w", encoding="utf-8"
+        )
+        for filename, _ in texts
+    ]
+    cancelled = False
+    failures = []
+    try:
+        logger.info(f"Streaming aligned blocks to {output_dir}...")
+        for pieces in align_in_blocks(
+            texts,
+            min_block_length=min_block_length,
+            max_workers=max_workers,
+            failures=failures,
+            **aligner_options,
+        ):
+            for f, piece in zip(out_files, pieces):
+                f.write(piece)
+    except AlignmentCancelled:
+        cancelled = True
+        raise
+    finally:
+        for f in out_files:
+            f.close()
+        if cancelled:
+            # Don't leave partial alignments behind
+            _remove_aligned_files(output_dir, texts)
+    return failures
+
+
+def _write_failures(output_dir, failures, remove_rows=True):
+    failures_path = os.path.join(output_dir, "failures.json")
+    if failures:
+        # Don't let a stale result from an earlier run into the Excel table
+        for failure in failures if remove_rows else ():
+            stale_path = os.path.join(output_dir, _aligned_filename(failure.other_id))
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        with open(failures_path, "w", encoding="utf-8") as f:
+            json.dump([asdict(failure) for failure in failures], f, indent=2)
+        logger.warning(
+            f"{len(failures)} text(s) could not be aligned, see {failures_path}"
+        )
+    elif os.path.exists(failures_path):
+        os.remove(failures_path)
+
+
+def _aligned_filename(filename):
+    base, ext = os.path.splitext(filename)
+    return f"aligned_{base}{ext}"
+
+
+def _megabytes(value):
+    return None if value is None else int(value * 1024 * 1024)
+
+
+def _positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+
 def main():
+    if sys.argv[1:2] == ["batch"]:
+        from .batch import main as batch_main
+
+        sys.exit(batch_main(sys.argv[2:]))
+
     parser = argparse.ArgumentParser(
-        description="Align multiple text files from a directory."
+        description="Align multiple text files from a directory. "
+        "Run 'batch --help' to align many collections in one run."
+    )
+    parser.add_argument(
+        "input_dir",
+        help="Directory containing text files to align, or a manifest file listing them one per line.",
+    )
+    parser.add_argument(
+        "--extensions",
+        nargs="+",
+        default=None,
+        metavar="EXT",
+        help="Only load files with these extensions, e.g. .txt. Defaults to all text files.",
     )
-    parser.add_argument("input_dir", help="Directory containing text files to align.")
     parser.add_argument(
         "--output-dir",
         help="Directory to save aligned files. Defaults to input_dir/aligned.",
         default=None,
     )
+    parser.add_argument(
+        "--pivot",
+        help="Pivot selection: 'longest', 'centroid' or a file name. Defaults to longest.",
+        default="longest",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Peak memory (MB) allowed per pairwise alignment. Enables engine planning.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Estimated time (seconds) allowed for all pairwise alignments. Enables engine planning.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        help="Seconds allowed per pairwise alignment attempt. Runs pairs in isolated workers.",
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=float,
+        default=None,
+        help="Memory (MB) allowed per pairwise alignment attempt. Runs pairs in isolated workers.",
+    )
+    parser.add_argument(
+        "--progressive",
+        action="store_true",
+        help="Align along a guide tree, closest texts first, instead of against one pivot. "
+        "More compact for many diverse texts.",
+    )
+    parser.add_argument(
+        "--blocks",
+        action="store_true",
+        help="Cut texts in lockstep at anchors common to all of them and align the blocks in parallel.",
+    )
+    parser.add_argument(
+        "--block-length",
+        type=int,
+        default=MIN_BLOCK_LENGTH,
+        help=f"Minimum characters per block with --blocks. Defaults to {MIN_BLOCK_LENGTH}.",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=["text", "msa", "both"],
+        default="text",
+        help="Save aligned_*.txt files (text), a compact binary alignment.tsmsa (msa), or both.",
+    )
+    parser.add_argument(
+        "--no-excel",
+        action="store_true",
+        help="Skip the Excel table, for scripted text-only runs. Skips importing pandas and openpyxl.",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Update the alignment in the output directory, only realigning around the edits made to the texts since.",
+    )
+    parser.add_argument(
+        "--apparatus",
+        choices=["jsonl", "csv"],
+        default=None,
+        help="Also write the consensus text and the variant readings of every word with their witnesses.",
+    )
+    parser.add_argument(
+        "--tei",
+        action="store_true",
+        help="Also write the alignment as TEI XML in parallel segmentation (alignment.tei.xml).",
+    )
+    parser.add_argument(
+        "--preview",
+        type=_positive_int,
+        nargs="?",
+        const=PREVIEW_WORDS,
+        default=None,
+        metavar="WORDS",
+        help=f"Only align a sample of WORDS words per window (default {PREVIEW_WORDS}) to {PREVIEW_FILENAME}, "
+        "and report how well each text agrees with the others.",
+    )
+    parser.add_argument(
+        "--preview-windows",
+        type=_positive_int,
+        default=1,
+        help="Windows spread over the texts with --preview. Defaults to 1, the start of the texts.",
+    )
+    parser.add_argument(
+        "--scores-only",
+        action="store_true",
+        help="Only compute normalized pairwise alignment scores (pairwise_scores.csv).",
+    )
+    parser.add_argument(
+        "--log-level",
+        choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+        default="INFO",
+        help="Logging level. DEBUG logs the timing of every stage.",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="TRACE_JSON",
+        default=None,
+        help="Write stage timings, DP cell counts and peak memory as a Chrome trace JSON.",
+    )
+    parser.add_argument(
+        "--tracemalloc",
+        action="store_true",
+        help="Trace Python allocations, so the profile reports each stage's own peak memory.",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PSTATS",
+        default=None,
+        help="Run under cProfile and write the stats to this file.",
+    )
 
     args = parser.parse_args()
+    logging.basicConfig(level=args.log_level, format="%(message)s")
 
     input_dir = args.input_dir
     if not os.path.exists(input_dir):
-        print(f"Error: Input directory '{input_dir}' does not exist.")
+        logger.error(f"Error: Input directory '{input_dir}' does not exist.")
         sys.exit(1)
 
     if args.output_dir:
         output_dir = args.output_dir
-    else:
+    elif os.path.isdir(input_dir):
         output_dir = os.path.join(input_dir, "aligned")
+    else:
+        output_dir = os.path.join(os.path.dirname(input_dir), "aligned")
+
+    def run():
+        if args.scores_only:
+            return run_scores_pipeline(
+                input_dir, output_dir, extensions=args.extensions
+            )
+        if args.preview is not None:
+            return run_preview_pipeline(
+                input_dir,
+                output_dir,
+                words=args.preview,
+                windows=args.preview_windows,
+                excel=not args.no_excel,
+                extensions=args.extensions,
+                pivot=args.pivot,
+            )
+        return run_alignment_pipeline(
+            input_dir,
+            output_dir,
+            blocks=args.blocks,
+            output_format=args.output_format,
+            excel=not args.no_excel,
+            apparatus=args.apparatus,
+            tei=args.tei,
+            incremental=args.incremental,
+            extensions=args.extensions,
+            progressive=args.progressive,
+            min_block_length=args.block_length,
+            pivot=args.pivot,
+            memory_budget=_megabytes(args.memory_budget),
+            time_budget=args.time_budget,
+            timeout=args.timeout,
+            memory_limit=_megabytes(args.memory_limit),
+        )
 
-    success = run_alignment_pipeline(input_dir, output_dir)
+    if args.tracemalloc:
+        tracemalloc.start()
+    if args.profile:
+        start_trace()
+    profiler = cProfile.Profile() if args.cprofile else None
+    try:
+        success = profiler.runcall(run) if profiler else run()
+    finally:
+        if profiler:
+            profiler.dump_stats(args.cprofile)
+            logger.info(f"Written cProfile stats to {args.cprofile}")
+        trace = stop_trace()
+        if trace is not None:
+            trace.write_json(args.profile)
+            logger.info(f"Written profile trace to {args.profile}")
+        if args.tracemalloc:
+            tracemalloc.stop()
     if not success:
         sys.exit(1)
 
@@ -0,0 +1,314 @@
+"""
+Choose a pairwise alignment engine for every pivot/witness pair from a resource budget.
+
+The cost of each engine is estimated from the text lengths alone:
+
+    global    - the full DP matrix, ``n * m`` cells, all of it kept for the traceback
+    anchored  - an LCS over the unique words of both texts, plus ``max_seg_length``
+                cells per character for the segments between anchors
+    segmented - ``k`` chunks of ``(n / k) * (m / k)`` cells each
+    fragment  - a window of about ``1.5 * m`` pivot characters around the
+                locus of a short witness, ``1.5 * m * m`` cells
+
+A quick similarity probe (the share of unique words the texts have in common)
+tells whether anchored alignment will find anchors at all. The planner keeps
+the best engine that fits the memory budget for each pair, then downgrades
+the most expensive pairs until the estimated total time fits the time budget.
+Witnesses much shorter than the pivot are fragments, aligned around their
+locus in the pivot before any other engine is considered.
+"""
+
+import math
+from dataclasses import dataclass, field
+
+from .genalog_anchor import MAX_ALIGN_SEGMENT_LENGTH, get_unique_words
+from .genalog_preprocess import tokenize
+
+# Rough calibration of Bio.Align.PairwiseAligner (Gotoh, with traceback) on one core
+BYTES_PER_CELL = 2
+CELLS_PER_SECOND = 8e7
+# Below this share of common unique words, anchored alignment finds too few anchors
+MIN_ANCHOR_SIMILARITY = 0.1
+# A witness at most 1 / FRAGMENT_RATIO as long as a pivot of at least
+# MIN_FRAGMENT_PIVOT characters is aligned as a fragment
+FRAGMENT_RATIO = 4
+MIN_FRAGMENT_PIVOT = 5000
+
+
+@dataclass
+class PairPlan:
+    """The engine chosen for one pivot/witness pair and its estimated cost"""
+
+    other_id: str
+    engine: str
+    params: dict = field(default_factory=dict)
+    cells: int = 0
+    memory: int = 0
+    seconds: float = 0.0
+    similarity: float = 0.0
+
+
+@dataclass
+class AlignmentPlan:
+    """The engines chosen for all pairs of a star alignment"""
+
+    pivot_id: str
+    pairs: list
+    memory_budget: int = None
+    time_budget: float = None
+
+    @property
+    def total_seconds(self):
+        return sum(p.seconds for p in self.pairs)
+
+    @property
+    def peak_memory(self):
+        return max((p.memory for p in self.pairs), default=0)
+
+    @property
+    def fits(self):
+        """Whether the estimated cost is within both budgets"""
+        if self.memory_budget is not None and self.peak_memory > self.memory_budget:
+            return False
+        if self.time_budget is not None and self.total_seconds > self.time_budget:
+            return False
+        return True
+
+    def get(self, other_id):
+        for pair in self.pairs:
+            if pair.other_id == other_id:
+                return pair
+        raise KeyError(other_id)
+
+    def describe(self):
+        budget = []
+        if self.memory_budget is not None:
+            budget.append(f"memory budget {_format_bytes(self.memory_budget)}")
+        if self.time_budget is not None:
+            budget.append(f"time budget {self.time_budget:g}s")
+        lines = [f"Alignment plan for pivot {self.pivot_id} ({', '.join(budget)}):"]
+        for p in self.pairs:
+            params = "".join(f" {k}={v}" for k, v in p.params.items())
+            lines.append(
+                f"  {p.other_id}: {p.engine}{params}"
+                f" (cells {p.cells:.2e}, memory {_format_bytes(p.memory)},"
+                f" ~{p.seconds:.1f}s, similarity {p.similarity:.2f})"
+            )
+        lines.append(
+            f"Estimated total: ~{self.total_seconds:.1f}s,"
+            f" peak memory {_format_bytes(self.peak_memory)}"
+            + ("" if self.fits else " - DOES NOT FIT the budget")
+        )
+        return "\n".join(lines)
+
+
+def _format_bytes(n):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def is_fragment(n, m):
+    """Whether a witness of length m should be aligned as a fragment of a pivot of length n"""
+    return n >= MIN_FRAGMENT_PIVOT and m * FRAGMENT_RATIO <= n
+
+
+def probe_similarity(pivot_tokens, other_tokens):
+    """Share of unique words common to both texts, in [0, 1]
+
+    Returns:
+        tuple : ``(similarity, pivot_unique_chars, other_unique_chars)`` where the
+        last two are the lengths of the unique-word strings the anchor LCS runs on
+    """
+    unique_pivot = get_unique_words(pivot_tokens)
+    unique_other = get_unique_words(other_tokens)
+    if not unique_pivot or not unique_other:
+        return 0.0, 0, 0
+    common = {w.lower() for w in unique_pivot} & {w.lower() for w in unique_other}
+    similarity = len(common) / min(len(unique_pivot), len(unique_other))
+    return (
+        similarity,
+        sum(len(w) + 1 for w in unique_pivot),
+        sum(len(w) + 1 for w in unique_other),
+    )
+
+
+def engine_cells(engine, n, m, params=None, unique_n=0, unique_m=0):
+    """Estimated DP cells of aligning texts of lengths n and m with ``engine``
+
+    Arguments:
+        engine (str) : an engine of ``engines.ENGINES``
+        n (int) : length of the pivot text
+        m (int) : length of the other text
+        params (dict, optional) : parameters of the engine
+        unique_n, unique_m (int, optional) : lengths of the unique-word strings
+            the anchor LCS runs on (see ``probe_similarity``). Defaults to leaving
+            the LCS out of the anchored estimate.
+
+    Returns:
+        float : the cells
+    """
+    params = params or {}
+    if engine == "fragment":
+        return 1.5 * m * m
+    if engine == "anchored":
+        max_seg_length = params.get("max_seg_length", MAX_ALIGN_SEGMENT_LENGTH)
+        return unique_n * unique_m + (n + m) / 2 * max_seg_length
+    if engine == "segmented":
+        return n * m / params.get("num_segments", 2)
+    return n * m
+
+
+def _estimate(other_id, engine, params, cells, peak_cells, similarity):
+    return PairPlan(
+        other_id=other_id,
+        engine=engine,
+        params=params,
+        cells=int(cells),
+        memory=int(peak_cells * BYTES_PER_CELL),
+        seconds=cells / CELLS_PER_SECOND,
+        similarity=similarity,
+    )
+
+
+def _candidates(
+    other_id, n, m, similarity, unique_n, unique_m, memory_budget, time_share
+):
+    """Engines for one pair, from best quality to cheapest"""
+    candidates = []
+    if is_fragment(n, m):
+        window_cells = engine_cells("fragment", n, m)
+        candidates.append(
+            _estimate(other_id, "fragment", {}, window_cells, window_cells, similarity)
+        )
+    candidates.append(_estimate(other_id, "global", {}, n * m, n * m, similarity))
+
+    if similarity >= MIN_ANCHOR_SIMILARITY:
+        params = {"max_seg_length": MAX_ALIGN_SEGMENT_LENGTH}
+        candidates.append(
+            _estimate(
+                other_id,
+                "anchored",
+                params,
+                engine_cells("anchored", n, m, params, unique_n, unique_m),
+                max(unique_n * unique_m, MAX_ALIGN_SEGMENT_LENGTH**2),
+                similarity,
+            )
+        )
+
+    # Enough chunks for a single chunk to fit in memory and the pair to fit its time share
+    num_segments = 2
+    if memory_budget:
+        num_segments = max(
+            num_segments, math.ceil(math.sqrt(n * m * BYTES_PER_CELL / memory_budget))
+        )
+    if time_share:
+        num_segments = max(
+            num_segments, math.ceil(n * m / (CELLS_PER_SECOND * time_share))
+        )
+    params = {"num_segments": num_segments}
+    candidates.append(
+        _estimate(
+            other_id,
+            "segmented",
+            params,
+            engine_cells("segmented", n, m, params),
+            n * m / num_segments**2,
+            similarity,
+        )
+    )
+    return candidates
+
+
+def plan_alignment(pivot, others, memory_budget=None, time_budget=None):
+    """Plan the pairwise alignments of a star alignment
+
+    Arguments:
+        pivot (tuple) : ``(id, text)`` of the pivot
+        others (list) : ``(id, text)`` of every other witness
+        memory_budget (int, optional) : peak memory allowed for one pairwise alignment, in bytes
+        time_budget (float, optional) : estimated time allowed for all pairwise alignments, in seconds
+
+    Returns:
+        AlignmentPlan : the chosen engine for each witness, in the order of ``others``
+    """
+    pivot_id, pivot_text = pivot
+    pivot_tokens = tokenize(pivot_text)
+    time_share = time_budget / len(others) if (time_budget and others) else None
+
+    all_candidates = []
+    for other_id, other_text in others:
+        similarity, unique_n, unique_m = probe_similarity(
+            pivot_tokens, tokenize(other_text)
+        )
+        all_candidates.append(
+            _candidates(
+                other_id,
+                len(pivot_text),
+                len(other_text),
+                similarity,
+                unique_n,
+                unique_m,
+                memory_budget,
+                time_share,
+            )
+        )
+
+    # 1. Best engine within the memory budget, or the cheapest one if none fits
+    choice = []
+    for candidates in all_candidates:
+        fitting = [
+            i
+            for i, c in enumerate(candidates)
+            if memory_budget is None or c.memory <= memory_budget
+        ]
+        choice.append(fitting[0] if fitting else len(candidates) - 1)
+
+    # 2. Downgrade the slowest pairs until the total time fits
+    if time_budget is not None:
+        while (
+            sum(all_candidates[k][choice[k]].seconds for k in range(len(choice)))
+            > time_budget
+        ):
+            downgradable = [
+                k for k in range(len(choice)) if choice[k] < len(all_candidates[k]) - 1
+            ]
+            if not downgradable:
+                break
+            slowest = max(
+                downgradable, key=lambda k: all_candidates[k][choice[k]].seconds
+            )
+            choice[slowest] += 1
+
+    pairs = [candidates[i] for candidates, i in zip(all_candidates, choice)]
+    return AlignmentPlan(
+        pivot_id=pivot_id,
+        pairs=pairs,
+        memory_budget=memory_budget,
+        time_budget=time_budget,
+    )
+
+
+def fallback_chain(
+    n, m, engine="global", params=None, memory_budget=None, time_budget=None
+):
+    """The engines to try for one pair: ``engine`` first, then every cheaper one
+
+    Arguments:
+        n (int) : length of the pivot text
+        m (int) : length of the other text
+        engine (str, optional) : the engine to try first. Defaults to "global".
+        params (dict, optional) : parameters of the first engine
+        memory_budget (int, optional) : bytes allowed for one attempt, sizes the segmented engine
+        time_budget (float, optional) : seconds allowed for one attempt, sizes the segmented engine
+
+    Returns:
+        list : ``(engine, params)`` tuples, from best quality to cheapest
+    """
+    # Without a probe, assume anchors will be found; segmented is the last resort anyway
+    candidates = _candidates(None, n, m, 1.0, 0, 0, memory_budget, time_budget)
+    names = [c.engine for c in candidates]
+    chain = [(engine, params or {})]
+    chain.extend((c.engine, c.params) for c in candidates[names.index(engine) + 1 :])
+    return chain
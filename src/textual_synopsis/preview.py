@@ -0,0 +1,142 @@
+"""
+Quick partial alignments, to check whether witnesses line up at all.
+
+A preview star-aligns a bounded sample of every text instead of the full
+texts: the first ``words`` words, or ``windows`` windows of ``words`` words
+spread evenly over the texts. Windows start at anchor words common to all
+texts (see ``genalog_anchor.get_common_anchors``), so they cover the same
+passage in every witness; without common anchors they start at the same
+relative position in every text. The aligned windows are joined with a
+separator column, so a preview is a regular multiple alignment and fits
+the same word table, clearly labelled as partial.
+
+Each witness also gets an agreement score: the share of the sampled words
+where it reads like the majority. A witness that scores far below the
+others likely does not belong with them.
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .genalog_alignment import GAP_CHAR
+from .genalog_anchor import get_common_anchors
+from .genalog_preprocess import join_tokens, tokenize
+from .multi_align import StarAligner
+from .to_excel import align_to_words
+
+PREVIEW_WORDS = 200
+# Column joining the windows of a preview, a word of its own in the word table
+WINDOW_SEPARATOR = "…"
+
+
+@dataclass
+class Preview:
+    """A partial alignment of a sample of the texts"""
+
+    rows: list  # (id, aligned_row) of the windows joined by WINDOW_SEPARATOR
+    windows: list  # for each window, the token index it starts at in every text
+    words: int  # words per window
+    agreement: dict = field(default_factory=dict)  # id -> share of majority readings
+    partial: bool = True
+
+    def describe(self):
+        where = (
+            f"first {self.words} words"
+            if len(self.windows) == 1
+            else f"{len(self.windows)} windows of {self.words} words"
+        )
+        scores = ", ".join(
+            f"{tid}: {score:.0%}" for tid, score in self.agreement.items()
+        )
+        return f"Partial preview of the {where}. Agreement with the majority: {scores}"
+
+
+def sample_windows(texts_with_ids, words=PREVIEW_WORDS, windows=1):
+    """Cut the same windows out of every text
+
+    Arguments:
+        texts_with_ids (list) : ``(id, text_content)`` tuples
+        words (int, optional) : words per window. Defaults to ``PREVIEW_WORDS``.
+        windows (int, optional) : number of windows. One window is the start of the
+            texts, more are spread over common anchors. Defaults to 1.
+
+    Returns:
+        tuple : ``(starts, samples)``, for each window the start token index in every
+        text, and the ``(id, window_text)`` tuples of the window
+    """
+    token_lists = [tokenize(content) for _, content in texts_with_ids]
+    if windows <= 1:
+        starts = [[0] * len(token_lists)]
+    else:
+        anchors = get_common_anchors(token_lists)
+        num_anchors = len(anchors[0]) if anchors else 0
+        if num_anchors:
+            picks = sorted(
+                {round(i * (num_anchors - 1) / (windows - 1)) for i in range(windows)}
+            )
+            starts = [[indices[k] for indices in anchors] for k in picks]
+        else:
+            starts = [
+                [len(tokens) * i // windows for tokens in token_lists]
+                for i in range(windows)
+            ]
+
+    samples = []
+    for window_starts in starts:
+        samples.append(
+            [
+                (tid, join_tokens(tokens[start : start + words]))
+                for (tid, _), tokens, start in zip(
+                    texts_with_ids, token_lists, window_starts
+                )
+            ]
+        )
+    return starts, samples
+
+
+def align_preview(texts_with_ids, words=PREVIEW_WORDS, windows=1, **aligner_options):
+    """Star-align a sample of the texts
+
+    Arguments:
+        texts_with_ids (list) : ``(id, text_content)`` tuples
+        words (int, optional) : words per window. Defaults to ``PREVIEW_WORDS``.
+        windows (int, optional) : number of windows, see ``sample_windows()``. Defaults to 1.
+        **aligner_options : passed on to the ``StarAligner`` of every window
+
+    Returns:
+        Preview : the joined aligned windows and the agreement of every witness
+    """
+    ids = [tid for tid, _ in texts_with_ids]
+    starts, samples = sample_windows(texts_with_ids, words=words, windows=windows)
+
+    rows = {tid: [] for tid in ids}
+    for sample in samples:
+        aligned = dict(StarAligner(sample, **aligner_options).align())
+        length = len(next(iter(aligned.values()), ""))
+        for tid in ids:
+            # A witness that failed to align is left empty in this window
+            rows[tid].append(aligned.get(tid, GAP_CHAR * length))
+    separator = f" {WINDOW_SEPARATOR} "
+    joined = [(tid, separator.join(rows[tid])) for tid in ids]
+
+    return Preview(
+        rows=joined,
+        windows=starts,
+        words=words,
+        agreement=_agreement(joined),
+    )
+
+
+def _agreement(rows):
+    """Share of the word columns where each row reads like the majority"""
+    table = align_to_words([{"name": tid, "content": row} for tid, row in rows])
+    agree = [0] * len(rows)
+    counted = 0
+    for column in zip(*table):
+        if column[0] == WINDOW_SEPARATOR:
+            continue
+        majority, _ = Counter(column).most_common(1)[0]
+        counted += 1
+        for i, word in enumerate(column):
+            agree[i] += word == majority
+    return {tid: (a / counted if counted else 1.0) for (tid, _), a in zip(rows, agree)}
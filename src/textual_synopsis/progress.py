@@ -0,0 +1,120 @@
+"""
+Progress reporting and cancellation for long alignments.
+
+A ``CancelToken`` is shared between the caller (e.g. a UI thread) and the
+alignment. The alignment checks it between pairs, between the segments of
+the anchored and segmented engines, and while waiting on worker processes,
+which are terminated as soon as it is set. ``AlignmentCancelled`` is raised
+from the alignment once it has stopped.
+
+A progress callback receives a ``Progress`` after every pair, with the DP
+cells processed so far and an ETA extrapolated from the cell rate.
+
+    token = CancelToken()
+    aligner = StarAligner(texts, progress=print, cancel=token)
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+
+
+class AlignmentCancelled(Exception):
+    """Raised by an alignment whose ``CancelToken`` was cancelled"""
+
+
+class CancelToken:
+    """Thread-safe flag asking a running alignment to stop"""
+
+    def __init__(self, deadline=None):
+        """deadline: time.monotonic() at which the token cancels itself, if any"""
+        self._event = threading.Event()
+        self.deadline = deadline
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set() or (
+            self.deadline is not None and time.monotonic() >= self.deadline
+        )
+
+    def check(self):
+        """Raise ``AlignmentCancelled`` if the token was cancelled"""
+        if self._event.is_set():
+            raise AlignmentCancelled("Alignment was cancelled")
+        if self.cancelled:
+            raise AlignmentCancelled("Alignment ran past its deadline")
+
+
+def check_cancelled(cancel):
+    """``cancel.check()`` that accepts a missing token"""
+    if cancel is not None:
+        cancel.check()
+
+
+@dataclass
+class Progress:
+    """A snapshot of a running alignment"""
+
+    pairs_done: int
+    pairs_total: int
+    cells_done: int
+    cells_total: int
+    elapsed: float  # seconds since the alignment started
+    current: str = None  # id of the text being aligned, if any
+
+    @property
+    def fraction(self):
+        """Fraction of the work done, by DP cells"""
+        if not self.cells_total:
+            return self.pairs_done / self.pairs_total if self.pairs_total else 1.0
+        return min(1.0, self.cells_done / self.cells_total)
+
+    @property
+    def eta(self):
+        """Estimated seconds left, None until the first pair is done"""
+        if not self.cells_done:
+            return None
+        rate = self.cells_done / max(self.elapsed, 1e-9)
+        return max(0.0, (self.cells_total - self.cells_done) / rate)
+
+    def describe(self):
+        text = f"{self.pairs_done}/{self.pairs_total} pairs aligned"
+        if self.current:
+            text += f", aligning {self.current}"
+        if self.eta is not None:
+            text += f", about {self.eta:.0f}s left"
+        return text
+
+
+class ProgressTracker:
+    """Counts finished pairs and cells, and reports them to a progress callback"""
+
+    def __init__(self, callback, pairs_total, cells_total):
+        self.callback = callback
+        self.pairs_total = pairs_total
+        self.cells_total = cells_total
+        self.pairs_done = 0
+        self.cells_done = 0
+        self.started = time.monotonic()
+
+    def report(self, current=None):
+        if self.callback is None:
+            return
+        self.callback(
+            Progress(
+                pairs_done=self.pairs_done,
+                pairs_total=self.pairs_total,
+                cells_done=self.cells_done,
+                cells_total=self.cells_total,
+                elapsed=time.monotonic() - self.started,
+                current=current,
+            )
+        )
+
+    def pair_done(self, cells, pairs=1):
+        self.pairs_done += pairs
+        self.cells_done += cells
+        self.report()
@@ -0,0 +1,324 @@
+"""
+Progressive multiple alignment along a guide tree.
+
+``StarAligner`` aligns every witness to one pivot, so every insertion of
+any witness against the pivot becomes a column of its own. A progressive
+alignment aligns the closest witnesses first and merges the aligned groups
+(profiles) up a guide tree instead:
+
+    1. Similarity: every text is sketched by the smallest ``SKETCH_SIZE``
+       hashes of its word bigrams, and the Jaccard similarity of every pair is
+       estimated from the sketches, in linear time per text.
+    2. Guide tree: average linkage (UPGMA) over the sketch distances.
+    3. Merging: a profile is represented by its consensus, the characters of
+       the columns where at least half of its rows have one. The consensus
+       texts of the two profiles are aligned pairwise, with the engines of
+       ``engines``, and the columns of both profiles are laid out along that
+       alignment; the columns without consensus stay next to their neighbours.
+
+Merges of independent subtrees run in parallel in a process pool. Profiles
+are numpy arrays of code points, so laying out the columns of a merge is a
+single gather per profile.
+"""
+
+import heapq
+import logging
+import os
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .engines import run_engine
+from .genalog_alignment import GAP_CHAR
+from .instrument import span
+from .planner import fallback_chain, is_fragment
+from .progress import check_cancelled
+
+# Hashes kept per text to estimate similarities
+SKETCH_SIZE = 256
+
+logger = logging.getLogger(__name__)
+
+
+def sketch(text, size=SKETCH_SIZE):
+    """The ``size`` smallest hashes of the word bigrams of a text"""
+    words = text.split()
+    bigrams = [f"{a} {b}" for a, b in zip(words, words[1:])] or [text]
+    # crc32 rather than hash(), which changes between runs
+    return sorted(heapq.nsmallest(size, {zlib.crc32(b.encode()) for b in bigrams}))
+
+
+def estimate_similarity(a, b, size=SKETCH_SIZE):
+    """Estimate the Jaccard similarity of two texts from their ``sketch()``"""
+    union = heapq.nsmallest(size, set(a) | set(b))
+    if not union:
+        return 1.0
+    shared = set(a) & set(b)
+    return sum(h in shared for h in union) / len(union)
+
+
+def guide_tree(texts, size=SKETCH_SIZE):
+    """
+    Build a guide tree by average linkage over estimated text distances
+
+    Arguments:
+        texts (list) : the texts
+        size (int, optional) : hashes per sketch. Defaults to ``SKETCH_SIZE``.
+
+    Returns:
+        list : the merges, closest first, as ``(left, right)`` node pairs. Nodes
+        ``0..n-1`` are the texts, merge ``k`` creates node ``n + k``.
+    """
+    sketches = [sketch(text, size) for text in texts]
+    distance = {}
+    for i in range(len(texts)):
+        for j in range(i):
+            distance[j, i] = 1.0 - estimate_similarity(sketches[i], sketches[j], size)
+
+    sizes = {i: 1 for i in range(len(texts))}
+    merges = []
+    while len(sizes) > 1:
+        (left, right), _ = min(distance.items(), key=lambda item: item[1])
+        node = len(texts) + len(merges)
+        merges.append((left, right))
+        left_size, right_size = sizes.pop(left), sizes.pop(right)
+        for other in sizes:
+            d_left = distance.pop(tuple(sorted((left, other))))
+            d_right = distance.pop(tuple(sorted((right, other))))
+            distance[other, node] = (d_left * left_size + d_right * right_size) / (
+                left_size + right_size
+            )
+        del distance[left, right]
+        sizes[node] = left_size + right_size
+    return merges
+
+
+def _to_array(rows):
+    return np.array(
+        [np.frombuffer(row.encode("utf-32-le"), dtype=np.uint32) for row in rows]
+    ).reshape(len(rows), -1)
+
+
+def _to_rows(profile):
+    return [row.tobytes().decode("utf-32-le") for row in profile]
+
+
+def consensus(profile, gap_char=GAP_CHAR):
+    """
+    The consensus of a profile: the columns where at least half of the rows have
+    a character, and their character in the row with the most characters
+
+    Arguments:
+        profile (np.ndarray) : rows x columns of code points
+
+    Returns:
+        tuple : the consensus text, and the index of the column of each of its characters
+    """
+    filled = profile != ord(gap_char)
+    columns = np.flatnonzero(filled.sum(axis=0) * 2 >= len(profile))
+    by_length = np.argsort(-filled.sum(axis=1), kind="stable")
+    first = filled[by_length][:, columns].argmax(axis=0)
+    chars = profile[by_length[first], columns]
+    return chars.astype(np.uint32).tobytes().decode("utf-32-le"), columns
+
+
+def _layout(aligned_a, aligned_b, columns_a, columns_b, length_a, length_b, gap_char):
+    """
+    Lay out the columns of two profiles along the alignment of their consensuses
+
+    Between two matched consensus columns, the columns of each profile (those
+    without consensus, and consensus columns aligned to a gap) are overlaid
+    left-aligned, like the insertions of a slot in ``StarAligner._merge``, so
+    that a substitution takes one column and insertions share columns.
+
+    Returns:
+        tuple : for every merged column, the column of each profile it takes, or
+        the profile's length for a gap
+    """
+    index_a, index_b = [], []
+    run_a, run_b = [], []  # columns since the last matched consensus column
+
+    def flush():
+        width = max(len(run_a), len(run_b))
+        index_a.extend(run_a + [length_a] * (width - len(run_a)))
+        index_b.extend(run_b + [length_b] * (width - len(run_b)))
+        run_a.clear()
+        run_b.clear()
+
+    i = j = 0  # consensus characters consumed
+    next_a = next_b = 0  # profile columns laid out
+    for char_a, char_b in zip(aligned_a, aligned_b):
+        if char_a != gap_char:
+            column = int(columns_a[i]) + 1
+            run_a.extend(range(next_a, column))
+            next_a = column
+            i += 1
+        if char_b != gap_char:
+            column = int(columns_b[j]) + 1
+            run_b.extend(range(next_b, column))
+            next_b = column
+            j += 1
+        if char_a != gap_char and char_b != gap_char:
+            # The matched columns close the runs, and are aligned to each other
+            match_a, match_b = run_a.pop(), run_b.pop()
+            flush()
+            index_a.append(match_a)
+            index_b.append(match_b)
+    run_a.extend(range(next_a, length_a))
+    run_b.extend(range(next_b, length_b))
+    flush()
+    return index_a, index_b
+
+
+def _align_consensus(cons_a, cons_b, engine, memory_budget, gap_char):
+    """Align two consensus texts, the longer one as ground truth, trying cheaper
+    engines on MemoryError"""
+    if cons_a == cons_b:
+        return cons_a, cons_b
+    swap = len(cons_b) > len(cons_a)
+    gt, noise = (cons_b, cons_a) if swap else (cons_a, cons_b)
+    if engine == "global" and is_fragment(len(gt), len(noise)):
+        engine = "fragment"
+    chain = fallback_chain(
+        len(gt), len(noise), engine=engine, memory_budget=memory_budget
+    )
+    for k, (name, params) in enumerate(chain):
+        try:
+            aligned_gt, aligned_noise = run_engine(
+                name, gt, noise, gap_char=gap_char, **params
+            )
+            break
+        except MemoryError:
+            if k == len(chain) - 1:
+                raise
+            logger.warning(f"{name} ran out of memory, trying {chain[k + 1][0]}")
+    return (aligned_noise, aligned_gt) if swap else (aligned_gt, aligned_noise)
+
+
+def merge_profiles(a, b, engine="global", memory_budget=None, gap_char=GAP_CHAR):
+    """
+    Align two profiles by their consensus texts
+
+    Arguments:
+        a (np.ndarray) : rows x columns of code points
+        b (np.ndarray) : rows x columns of code points
+        engine (str, optional) : engine aligning the consensus texts, with the
+            cheaper ones of ``planner.fallback_chain`` as fallbacks. Defaults to "global".
+        memory_budget (int, optional) : bytes allowed for one consensus alignment
+        gap_char (str, optional) : gap char of the profiles. Defaults to GAP_CHAR.
+
+    Returns:
+        np.ndarray : the rows of ``a`` then the rows of ``b``, aligned
+    """
+    cons_a, columns_a = consensus(a, gap_char)
+    cons_b, columns_b = consensus(b, gap_char)
+    aligned_a, aligned_b = _align_consensus(
+        cons_a, cons_b, engine, memory_budget, gap_char
+    )
+    index_a, index_b = _layout(
+        aligned_a, aligned_b, columns_a, columns_b, a.shape[1], b.shape[1], gap_char
+    )
+    gap = ord(gap_char)
+    # The column past the end of each profile is all gaps
+    a = np.concatenate([a, np.full((len(a), 1), gap, dtype=np.uint32)], axis=1)
+    b = np.concatenate([b, np.full((len(b), 1), gap, dtype=np.uint32)], axis=1)
+    return np.concatenate([a[:, index_a], b[:, index_b]])
+
+
+class ProgressiveAligner:
+    def __init__(
+        self,
+        texts_with_ids,
+        engine="global",
+        max_workers=None,
+        memory_budget=None,
+        cancel=None,
+    ):
+        """
+        texts_with_ids: list of (id, text_content)
+        engine: the engine aligning the consensus texts of two profiles. Witnesses
+            much shorter than a profile are aligned as fragments, and cheaper
+            engines are tried when one runs out of memory (see planner.fallback_chain).
+        max_workers: worker processes merging independent subtrees. None uses all
+            CPUs, 1 merges in this process.
+        memory_budget: bytes allowed for one consensus alignment, sizes the fallbacks
+        cancel: a progress.CancelToken, checked between merges. align() raises
+            AlignmentCancelled.
+        """
+        self.texts = texts_with_ids
+        self.gap_char = GAP_CHAR
+        self.engine = engine
+        self.max_workers = max_workers
+        self.memory_budget = memory_budget
+        self.cancel = cancel
+        self.tree = None
+        # Interface of StarAligner: the tree has no pivot, and a failed merge raises
+        self.pivot_id = None
+        self.failures = []
+
+    def align(self):
+        """
+        Aligns the texts along a guide tree (see guide_tree).
+        Returns the multiple alignment as (id, aligned_row) tuples in text order.
+        """
+        if not self.texts:
+            return []
+        contents = [content for _, content in self.texts]
+        with span("guide_tree", texts=len(contents)):
+            self.tree = guide_tree(contents)
+
+        # node -> (text indices in row order, profile)
+        profiles = {
+            i: ([i], _to_array([content])) for i, content in enumerate(contents)
+        }
+        max_workers = self.max_workers or os.cpu_count() or 1
+        with span("progressive", texts=len(contents)) as fields:
+            if max_workers == 1 or len(self.tree) < 2:
+                for k, (left, right) in enumerate(self.tree):
+                    check_cancelled(self.cancel)
+                    profiles[len(contents) + k] = self._merge(
+                        profiles.pop(left), profiles.pop(right)
+                    )
+            else:
+                self._merge_in_pool(profiles, max_workers)
+            indices, profile = profiles[len(contents) + len(self.tree) - 1]
+            fields["columns"] = profile.shape[1]
+
+        rows = dict(zip(indices, _to_rows(profile)))
+        return [(tid, rows[i]) for i, (tid, _) in enumerate(self.texts)]
+
+    def _merge(self, left, right):
+        merged = merge_profiles(
+            left[1], right[1], self.engine, self.memory_budget, self.gap_char
+        )
+        return left[0] + right[0], merged
+
+    def _merge_in_pool(self, profiles, max_workers):
+        """Merges every node of self.tree as soon as both its children are done"""
+        first = len(self.texts)
+        waiting = dict(enumerate(self.tree))  # merge index -> children
+        running = {}  # future -> (merge index, text indices)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            while waiting or running:
+                check_cancelled(self.cancel)
+                for k, (left, right) in list(waiting.items()):
+                    if left in profiles and right in profiles:
+                        del waiting[k]
+                        (left_ids, a), (right_ids, b) = (
+                            profiles.pop(left),
+                            profiles.pop(right),
+                        )
+                        future = pool.submit(
+                            merge_profiles,
+                            a,
+                            b,
+                            self.engine,
+                            self.memory_budget,
+                            self.gap_char,
+                        )
+                        running[future] = (k, left_ids + right_ids)
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    k, indices = running.pop(future)
+                    profiles[first + k] = (indices, future.result())
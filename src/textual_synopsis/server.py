@@ -0,0 +1,424 @@
+"""
+Local HTTP alignment service, on the standard library only.
+
+Requests are aligned by a pool of warm worker processes, started once with
+the heavy imports done and the server's aligner settings in place, so a
+request pays neither interpreter startup nor imports. Admission control
+rejects requests with 503 once ``max_queue`` requests are queued or
+running, and a request that takes longer than ``timeout`` gets 504. The
+timeout is enforced in the worker too: its pairs run in isolated processes
+(see ``workers``) that are terminated at the deadline, so an abandoned
+request frees its worker instead of holding it until it ends.
+
+    python -m textual_synopsis.server --port 8000 --workers 4
+
+Endpoints:
+
+    POST /align     texts as JSON, ``{"texts": [{"name", "content"}, ...],
+                    "format": ..., "options": {...}}`` (``texts`` may also be a
+                    ``{name: content}`` object), or as multipart/form-data with
+                    one file field per text and optional ``format`` and option
+                    fields. Options are ``StarAligner`` arguments among
+                    ``REQUEST_OPTIONS``, with ``memory_budget`` in MB like
+                    on the command line. ``format`` is one of:
+                        rows  - JSON ``{"pivot", "rows": [{"name", "row"}], "failures"}``
+                        words - JSON ``{"names", "words"}``, the word table
+                        xlsx  - the Excel alignment table
+    GET  /metrics   JSON: queue depth, in-flight jobs, counters, latency percentiles
+    GET  /health    200 once the server is up
+
+The server binds to localhost by default and has no authentication; it is
+meant to serve tools on the same machine.
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from dataclasses import asdict
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .pipeline import _megabytes
+from .progress import AlignmentCancelled
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("rows", "words", "xlsx")
+# Aligner settings a request may override
+REQUEST_OPTIONS = ("pivot", "memory_budget", "time_budget")
+NUMERIC_OPTIONS = ("memory_budget", "time_budget")
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MAX_BODY_BYTES = 64 * 1024 * 1024
+LATENCY_WINDOW = 1000  # latencies kept for the percentiles
+# Seconds past the timeout allowed for a worker to stop a request and report it
+CANCEL_GRACE_SECONDS = 5.0
+
+# Aligner settings of a worker process, set by _init_worker
+_worker_options = {}
+
+
+def _init_worker(options):
+    global _worker_options
+    _worker_options = options
+    # Per-request progress messages from the workers would drown the access log
+    package_logger = logging.getLogger(__name__.rpartition(".")[0])
+    package_logger.setLevel(max(logging.WARNING, package_logger.getEffectiveLevel()))
+    # Warm the heavy imports so the first request doesn't pay for them
+    from . import multi_align, to_excel  # noqa: F401
+
+
+def _ready():
+    return True
+
+
+def _align_request(texts, options, output_format, timeout=None):
+    """
+    Runs in a worker: aligns ``(name, content)`` texts, returns the response payload.
+    Raises AlignmentCancelled once ``timeout`` seconds have passed.
+    """
+    from .multi_align import StarAligner, normalize_text
+    from .progress import CancelToken
+    from .to_excel import align_to_words, create_excel_from_texts
+
+    options = dict(_worker_options, **options, max_workers=1)
+    if timeout is not None:
+        # Pairs in isolated processes, which are terminated at the deadline
+        deadline = time.monotonic() + timeout
+        options.update(cancel=CancelToken(deadline), isolate=True)
+    texts = [(name, normalize_text(content)) for name, content in texts]
+    aligner = StarAligner(texts, **options)
+    rows = aligner.align()
+    if output_format == "rows":
+        return {
+            "pivot": aligner.pivot_id,
+            "rows": [{"name": name, "row": row} for name, row in rows],
+            "failures": [asdict(f) for f in aligner.failures],
+        }
+
+    named = [{"name": name, "content": row} for name, row in rows]
+    if output_format == "words":
+        return {"names": [name for name, _ in rows], "words": align_to_words(named)}
+    excel = io.BytesIO()
+    create_excel_from_texts(named, excel)
+    return excel.getvalue()
+
+
+class RequestError(Exception):
+    """A bad request, answered with ``status``"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_request(content_type, body):
+    """Parse an /align request body
+
+    Arguments:
+        content_type (str) : the Content-Type header
+        body (bytes) : the request body
+
+    Raises:
+        RequestError: when the body is malformed
+
+    Returns:
+        tuple : ``(texts, options, format)`` with texts as ``(name, content)`` tuples
+    """
+    content_type = content_type or ""
+    if content_type.startswith("multipart/form-data"):
+        texts, fields = _parse_multipart(content_type, body)
+    elif content_type.startswith("application/json") or not content_type:
+        try:
+            fields = json.loads(body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise RequestError(f"Invalid JSON: {e}")
+        if not isinstance(fields, dict):
+            raise RequestError("Expected a JSON object")
+        texts = fields.get("texts", [])
+        if isinstance(texts, dict):
+            texts = list(texts.items())
+        else:
+            try:
+                texts = [(t["name"], t["content"]) for t in texts]
+            except (KeyError, TypeError):
+                raise RequestError("Texts must have a name and a content")
+        fields = dict(fields.get("options", {}), format=fields.get("format"))
+    else:
+        raise RequestError(f"Unsupported content type '{content_type}'", status=415)
+
+    if len(texts) < 2:
+        raise RequestError("Need at least 2 texts to align")
+    if len({name for name, _ in texts}) != len(texts):
+        raise RequestError("Text names must be unique")
+    if not all(isinstance(content, str) for _, content in texts):
+        raise RequestError("Text contents must be strings")
+
+    output_format = fields.pop("format", None) or "rows"
+    if output_format not in FORMATS:
+        raise RequestError(f"Format must be one of {', '.join(FORMATS)}")
+    unknown = set(fields) - set(REQUEST_OPTIONS)
+    if unknown:
+        raise RequestError(f"Unknown options: {', '.join(sorted(unknown))}")
+    for name in NUMERIC_OPTIONS:
+        if fields.get(name) is not None:
+            try:
+                fields[name] = float(fields[name])
+            except (TypeError, ValueError):
+                raise RequestError(f"Option '{name}' must be a number")
+    if fields.get("memory_budget") is not None:
+        fields["memory_budget"] = _megabytes(fields["memory_budget"])
+    return texts, fields, output_format
+
+
+def _parse_multipart(content_type, body):
+    header = f"Content-Type: {content_type}\r\n\r\n".encode("latin-1")
+    message = BytesParser(policy=HTTP).parsebytes(header + body)
+    if not message.is_multipart():
+        raise RequestError("Malformed multipart body")
+    texts = []
+    fields = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b""
+        try:
+            value = payload.decode("utf-8")
+        except UnicodeDecodeError:
+            raise RequestError(f"Field '{filename or name}' is not UTF-8 text")
+        if filename:
+            texts.append((filename, value))
+        elif name:
+            fields[name] = value
+    return texts, fields
+
+
+class AlignmentService:
+    """The worker pool, admission control and metrics behind the HTTP handler"""
+
+    def __init__(self, workers=None, max_queue=None, timeout=60.0, **aligner_options):
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(aligner_options,),
+        )
+        # Start the workers now, from this thread, rather than from a request thread
+        self.executor.submit(_ready).result()
+        self.max_queue = max_queue or 4 * self.workers
+        self.timeout = timeout
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._in_flight = 0  # submitted, not yet finished
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {"completed": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    def align(self, texts, options, output_format):
+        """Align in a worker, returns the payload
+
+        Raises:
+            RequestError: 503 when the queue is full, 504 on timeout, 400 for
+                options the aligner rejects
+        """
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise RequestError("Too many requests, try again later", status=503)
+            self._in_flight += 1
+        started = time.monotonic()
+        future = self.executor.submit(
+            _align_request, texts, options, output_format, self.timeout
+        )
+        # A job counts as in flight until its worker has stopped it
+        future.add_done_callback(self._job_done)
+        try:
+            # The worker stops at the timeout, give it time to report it
+            wait_for = self.timeout and self.timeout + CANCEL_GRACE_SECONDS
+            result = future.result(timeout=wait_for)
+        except (TimeoutError, AlignmentCancelled):
+            future.cancel()
+            with self._lock:
+                self.counters["timeouts"] += 1
+            raise RequestError(
+                f"Alignment took longer than {self.timeout:g}s", status=504
+            )
+        except ValueError as e:
+            # Options the aligner rejects, e.g. a pivot that is not one of the texts
+            with self._lock:
+                self.counters["errors"] += 1
+            raise RequestError(str(e), 400)
+        except Exception as e:
+            with self._lock:
+                self.counters["errors"] += 1
+            raise RequestError(f"Alignment failed: {type(e).__name__}: {e}", 500)
+        with self._lock:
+            self.counters["completed"] += 1
+            self._latencies.append(time.monotonic() - started)
+        return result
+
+    def _job_done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            in_flight = self._in_flight
+            counters = dict(self.counters)
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "running": min(in_flight, self.workers),
+            "queue_depth": max(0, in_flight - self.workers),
+            "max_queue": self.max_queue,
+            **counters,
+            "latency_seconds": {
+                f"p{p}": _percentile(latencies, p) for p in (50, 90, 99)
+            },
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return round(values[k], 4)
+
+
+class AlignmentHandler(BaseHTTPRequestHandler):
+    server_version = "TextualSynopsis/0.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            self._send_json(200, self.service.metrics())
+        else:
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/align":
+            self._send_json(404, {"error": f"Not found: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if length > MAX_BODY_BYTES:
+                raise RequestError("Request body too large", status=413)
+            body = self.rfile.read(length)
+            texts, options, output_format = parse_request(
+                self.headers.get("Content-Type"), body
+            )
+            result = self.service.align(texts, options, output_format)
+        except RequestError as e:
+            self._send_json(e.status, {"error": str(e)})
+            return
+        if output_format == "xlsx":
+            self._send(200, XLSX_TYPE, result)
+        else:
+            self._send_json(200, result)
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self._send(status, "application/json; charset=utf-8", body)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+
+def make_server(host="127.0.0.1", port=8000, **service_options):
+    """Create the HTTP server, see ``AlignmentService`` for the options"""
+    server = ThreadingHTTPServer((host, port), AlignmentHandler)
+    server.daemon_threads = True
+    server.service = AlignmentService(**service_options)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve alignments over local HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Defaults to 127.0.0.1.")
+    parser.add_argument("--port", type=int, default=8000, help="Defaults to 8000.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--max-queue",
+        type=int,
+        default=None,
+        help="Requests queued or running before new ones get 503. Defaults to 4 per worker.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Seconds a request may take before it gets 504. Defaults to 60.",
+    )
+    parser.add_argument(
+        "--pivot",
+        default="longest",
+        help="Default pivot selection: 'longest' or 'centroid'. Defaults to longest.",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=float,
+        default=None,
+        help="Peak memory (MB) allowed per pairwise alignment. Enables engine planning.",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="Estimated time (seconds) allowed for the pairwise alignments of a request. Enables engine planning.",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    server = make_server(
+        args.host,
+        args.port,
+        workers=args.workers,
+        max_queue=args.max_queue,
+        timeout=args.timeout,
+        pivot=args.pivot,
+        memory_budget=_megabytes(args.memory_budget),
+        time_budget=args.time_budget,
+    )
+    logger.info(
+        f"Serving alignments on http://{args.host}:{server.server_address[1]} "
+        f"with {server.service.workers} workers"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
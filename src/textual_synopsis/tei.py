@@ -0,0 +1,193 @@
+"""
+TEI XML export of a multiple alignment, in parallel segmentation.
+
+The word columns of the alignment are streamed through an incremental XML
+writer one at a time: a column where all witnesses agree is plain text, a
+column where they differ becomes an ``<app>`` with one ``<rdg>`` per
+reading, pointing at the witnesses that read it (an empty ``<rdg/>`` is an
+omission). The witnesses are listed in the header with ``xml:id`` sigla.
+Nothing but the current column is held in memory.
+"""
+
+import argparse
+import logging
+import os
+import re
+from xml.sax.saxutils import XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
+
+from .apparatus import iter_apparatus, open_word_columns
+from .instrument import span
+
+TEI_NS = "http://www.tei-c.org/ns/1.0"
+TEI_FILENAME = "alignment.tei.xml"
+
+logger = logging.getLogger(__name__)
+
+
+def xml_ids(sigla):
+    """Unique, valid ``xml:id`` values for the witness sigla"""
+    ids = []
+    for siglum in sigla:
+        xml_id = re.sub(r"[^\w.-]", "_", siglum)
+        if not re.match(r"[^\W\d]", xml_id):
+            xml_id = f"w{xml_id}"
+        base, n = xml_id, 1
+        while xml_id in ids:
+            n += 1
+            xml_id = f"{base}_{n}"
+        ids.append(xml_id)
+    return ids
+
+
+class _TEIWriter:
+    """Thin wrapper over XMLGenerator for elements with attributes"""
+
+    def __init__(self, out):
+        self.xml = XMLGenerator(out, encoding="utf-8", short_empty_elements=True)
+
+    def start(self, name, **attrs):
+        self.xml.startElement(
+            name, AttributesImpl({k.replace("_", ":"): v for k, v in attrs.items()})
+        )
+
+    def end(self, name):
+        self.xml.endElement(name)
+
+    def element(self, name, text="", **attrs):
+        self.start(name, **attrs)
+        if text:
+            self.xml.characters(text)
+        self.end(name)
+
+    def text(self, text):
+        self.xml.characters(text)
+
+
+def write_tei(sigla, columns, out, title="Collation"):
+    """
+    Stream a multiple alignment as a TEI document
+
+    Arguments:
+        sigla (list) : the witness sigla, in row order
+        columns (iterable) : word tuples, one word per witness (see
+            ``to_excel.iter_word_columns``)
+        out (file) : a text file object to write to
+        title (str, optional) : the title in the TEI header. Defaults to "Collation".
+
+    Returns:
+        tuple : ``(columns, apps)``, the number of word columns and of ``<app>`` elements
+    """
+    ids = xml_ids(sigla)
+    wit = {siglum: f"#{xml_id}" for siglum, xml_id in zip(sigla, ids)}
+    w = _TEIWriter(out)
+
+    w.xml.startDocument()
+    w.start("TEI", xmlns=TEI_NS)
+    w.text("\n")
+    w.start("teiHeader")
+    w.start("fileDesc")
+    w.start("titleStmt")
+    w.element("title", title)
+    w.end("titleStmt")
+    w.start("publicationStmt")
+    w.element("p", "Generated by textual-synopsis")
+    w.end("publicationStmt")
+    w.start("sourceDesc")
+    w.start("listWit")
+    for siglum, xml_id in zip(sigla, ids):
+        w.text("\n")
+        w.element("witness", siglum, xml_id=xml_id)
+    w.text("\n")
+    w.end("listWit")
+    w.end("sourceDesc")
+    w.end("fileDesc")
+    w.start("encodingDesc")
+    w.element("variantEncoding", method="parallel-segmentation", location="internal")
+    w.end("encodingDesc")
+    w.end("teiHeader")
+    w.text("\n")
+    w.start("text")
+    w.start("body")
+    w.start("ab")
+
+    num_columns = num_apps = 0
+    separator = ""
+    for entry, _ in iter_apparatus(sigla, columns):
+        num_columns += 1
+        if not entry.is_variant:
+            if entry.consensus:
+                w.text(separator + entry.consensus)
+                separator = " "
+            continue
+        num_apps += 1
+        w.text("\n")
+        w.start("app")
+        for reading, witnesses in entry.readings.items():
+            w.element("rdg", reading, wit=" ".join(wit[s] for s in witnesses))
+        w.end("app")
+        separator = " "
+
+    w.end("ab")
+    w.end("body")
+    w.end("text")
+    w.text("\n")
+    w.end("TEI")
+    w.xml.endDocument()
+    out.write("\n")
+    return num_columns, num_apps
+
+
+def export_tei(source, output_path, title=None):
+    """
+    Write a saved alignment as TEI, see ``write_tei``
+
+    Arguments:
+        source (str) : a ``.tsmsa`` file, or a directory of ``aligned_*.txt`` files
+        output_path (str) : the XML file to write
+        title (str, optional) : the title in the TEI header. Defaults to the name of
+            the directory of the alignment.
+    """
+    if title is None:
+        directory = source if os.path.isdir(source) else os.path.dirname(source)
+        title = os.path.basename(os.path.abspath(directory))
+    with span("tei") as fields, open_word_columns(source) as (sigla, columns):
+        with open(output_path, "w", encoding="utf-8") as out:
+            num_columns, num_apps = write_tei(sigla, columns, out, title=title)
+        fields["columns"] = num_columns
+    logger.info(
+        f"Written TEI to {output_path}: {num_apps} apparatus entries in "
+        f"{num_columns} word columns"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export an alignment as TEI XML in parallel segmentation."
+    )
+    parser.add_argument(
+        "source", help="An alignment.tsmsa file or a directory of aligned_*.txt files."
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help=f"XML file to write. Defaults to {TEI_FILENAME} next to the alignment.",
+    )
+    parser.add_argument("--title", default=None, help="Title of the TEI document.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    directory = (
+        args.source
+        if os.path.isdir(args.source)
+        else os.path.dirname(args.source) or "."
+    )
+    export_tei(
+        args.source,
+        args.output or os.path.join(directory, TEI_FILENAME),
+        title=args.title,
+    )
+
+
+if __name__ == "__main__":
+    main()
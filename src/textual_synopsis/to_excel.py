@@ -1,8 +1,20 @@
 import glob
-import pandas as pd
+import logging
 import os
-import openpyxl
-from openpyxl.styles import Font
+
+from .genalog_alignment import GAP_CHAR
+from .instrument import span
+
+# pandas and openpyxl are imported where needed: they dominate the start up
+# time of the CLI, and text-only runs never need them
+
+# Word columns per chunk of the Printable sheet, fits A4 landscape
+PRINTABLE_CHUNK_SIZE = 20
+# Fill of the columns where the texts differ, and the style of the names
+VARIANT_COLOR = "FFF2CC"
+NAME_STYLE = "Witness"
+
+logger = logging.getLogger(__name__)
 
 
 def load_aligned_texts(directory="."):
@@ -19,11 +31,48 @@ def load_aligned_texts(directory="."):
     return texts
 
 
+def iter_word_columns(rows, gap_char=GAP_CHAR):
+    """
+    Yield the word columns of equal-length aligned rows, one tuple of words
+    (one per row, gaps removed) at a time.
+
+    A column with a space in any row ends the word of every row, so the
+    words of a column always cover the same aligned span. Words of rows
+    that only have gaps there are empty.
+
+    Args:
+        rows: the aligned row strings
+        gap_char: the gap character of the alignment
+    """
+    if not rows:
+        return
+
+    length = len(rows[0])
+    for i, row in enumerate(rows):
+        if len(row) != length:
+            raise ValueError(f"Length mismatch: row {i} has {len(row)} vs {length}")
+
+    start = 0
+    for i, chars in enumerate(zip(*rows)):
+        if " " in chars:
+            yield tuple(row[start:i].replace(gap_char, "") for row in rows)
+            start = i + 1
+    yield tuple(row[start:].replace(gap_char, "") for row in rows)
+
+
 def align_to_words(texts):
+    """
+    Split aligned texts into word columns (see iter_word_columns).
+
+    Args:
+        texts: list of {"name", "content"} dicts with equal-length aligned rows
+
+    Returns:
+        One list of words per text, all of the same length
+    """
     if not texts:
         return []
 
-    # Verify lengths
     length = len(texts[0]["content"])
     for t in texts:
         if len(t["content"]) != length:
@@ -31,86 +80,8 @@ def align_to_words(texts):
                 f"Length mismatch: {t['name']} has {len(t['content'])} vs {length}"
             )
 
-    # Matrix of words
-    rows = [[] for _ in texts]
-
-    # Current word buffer for each row
-    current_words = [[] for _ in texts]
-
-    gap_char = "@"  # Hardcoded based on lib/genalog_alignment.py
-
-    for i in range(length):
-        chars = [t["content"][i] for t in texts]
-
-        # Check if this column triggers a word break
-        # Break if ANY text has a space
-        is_break = any(c == " " for c in chars)
-
-        if is_break:
-            # Commit current words
-            for row_idx in range(len(texts)):
-                word = "".join(current_words[row_idx])
-                # Filter out gaps? or keep them?
-                # User wants "single word". Gaps are not words.
-                # If word is "abc@@", it should be "abc".
-                # If word is "@@@", it becomes "".
-                clean_word = word.replace(gap_char, "")
-                rows[row_idx].append(clean_word)
-                current_words[row_idx] = []
-        else:
-            # Append characters
-            for row_idx, char in enumerate(chars):
-                # We append everything, including gaps, and clean at commit time
-                # Or clean now? No, keep logic simple.
-                if char != " ":  # Don't append the space itself?
-                    # genalog alignment might align ' ' with ' '.
-                    # If we break on space, we consume the space.
-                    # What if ' ' aligns with '@'?
-                    # Then '@' is effectively a space holder.
-                    # We should NOT append '@' if it aligns to space.
-                    # But here we are in "else" (non-break).
-                    # Wait, if is_break is True, we commit.
-                    # What happens to the character at `i`?
-                    # It is a space (or aligned gap). It should be consumed as delimiter.
-                    pass
-
-            # Oh wait.
-            # If `chars` has ' ' at row 0, and 'X' at row 1.
-            # This is a conflict! space shouldn't align with char usually.
-            # But if it does?
-            # 'My cat'
-            # 'Mypcat'
-            # Aligned: 'My cat'
-            #          'Mypcat'
-            # At space: row 0 is ' ', row 1 is 'p'.
-            # If we break: row 0 commits "My", row 1 commits "My".
-            # Next word starts: row 0 starts "cat", row 1 starts "cat" (with 'p' lost?)
-            # NO. 'p' must belong to one of them.
-            # If ' ' aligns with 'p' (substitution), then 'p' is part of the word? Or start of next?
-            # Space usually treated as delimiter. 'p' becomes a delimiter? No.
-            #
-            # In our case, with Star Alignment and gaps:
-            # Space should align with Space or Gap.
-            # If Space aligns with Char, it's a Substitution. Genalog penalty for Space-Mismatch is high?
-            # "SPACE_MISMATCH_PENALTY = 0.1" in addition to mismatch.
-            # So likely space aligns with space or gap.
-            #
-            # Assumption: Space aligns only with Space or Gap.
-            # If so, the column `i` is a delimiter column.
-            # We discard `chars[i]` (spaces and gaps).
-            pass
-
-            if not is_break:
-                for row_idx, char in enumerate(chars):
-                    current_words[row_idx].append(char)
-
-    # Commit last word
-    for row_idx in range(len(texts)):
-        word = "".join(current_words[row_idx])
-        clean_word = word.replace(gap_char, "")
-        rows[row_idx].append(clean_word)
-
-    return rows
+    columns = iter_word_columns([t["content"] for t in texts])
+    return [list(words) for words in zip(*columns)]
 
 
 def create_printable_chunks(df, chunk_size=20):
@@ -124,6 +95,8 @@ def create_printable_chunks(df, chunk_size=20):
     Returns:
         DataFrame with chunks stacked vertically, separated by blank rows
     """
+    import pandas as pd
+
     num_cols = len(df.columns)
     max_cols = chunk_size  # Maximum columns in any chunk
     chunks = []
@@ -160,46 +133,144 @@ def create_printable_chunks(df, chunk_size=20):
 def create_excel_from_aligned(aligned_dir, output_file):
     texts = load_aligned_texts(aligned_dir)
     if not texts:
-        print(f"No aligned files found in {aligned_dir}")
+        logger.info(f"No aligned files found in {aligned_dir}")
         return
 
-    print(f"Generating Excel from {len(texts)} files...")
-    rows = align_to_words(texts)
+    create_excel_from_texts(texts, output_file)
+
+
+def create_excel_from_msa(msa_path, output_file):
+    """
+    Create the Excel alignment table from a binary .tsmsa alignment (see msa_format).
+    """
+    from .msa_format import load_msa
+
+    with load_msa(msa_path) as msa:
+        texts = msa.texts()
+    create_excel_from_texts(texts, output_file)
+
+
+def variant_columns(rows):
+    """
+    Indices of the word columns where the texts read differently.
+
+    Args:
+        rows: one list of words per text, as returned by align_to_words
+    """
+    return [j for j, column in enumerate(zip(*rows)) if len(set(column)) > 1]
+
+
+def _variant_ranges(variants, num_texts, chunk_size=None):
+    """
+    Cell ranges covering the variant columns of a sheet, consecutive columns
+    merged into one range. Word column j is in sheet column j + 2, after the
+    names. With chunk_size, the layout of create_printable_chunks: chunks of
+    chunk_size columns stacked with a blank row between them.
+    """
+    from openpyxl.utils import get_column_letter
+
+    ranges = []
+    run_start = previous = None
+    for j in variants + [None]:
+        # A run ends at a gap in the columns or at the end of a chunk
+        if run_start is not None and (
+            j is None
+            or j != previous + 1
+            or (chunk_size and j // chunk_size != run_start // chunk_size)
+        ):
+            chunk, offset = (
+                divmod(run_start, chunk_size) if chunk_size else (0, run_start)
+            )
+            first_row = chunk * (num_texts + 1) + 1
+            ranges.append(
+                f"{get_column_letter(offset + 2)}{first_row}:"
+                f"{get_column_letter(offset + 2 + previous - run_start)}"
+                f"{first_row + num_texts - 1}"
+            )
+            run_start = None
+        if run_start is None:
+            run_start = j
+        previous = j
+    return ranges
+
+
+def create_excel_from_texts(texts, output_file):
+    """
+    Create the Excel alignment table.
+
+    Variant columns (see variant_columns) are highlighted by one conditional
+    formatting rule per sheet over all their ranges, and the names by a shared
+    named style, so wide tables stay small and quick to open.
+
+    Args:
+        texts: list of {"name", "content"} dicts with equal-length aligned rows
+        output_file: path of the xlsx file to write, or a binary file object
+            such as io.BytesIO
+    """
+    logger.info(f"Generating Excel from {len(texts)} files...")
+    with span("word_segmentation", texts=len(texts)) as fields:
+        rows = align_to_words(texts)
+        variants = variant_columns(rows)
+        fields["words"] = len(rows[0]) if rows else 0
 
     data = {}
     for i, t in enumerate(texts):
         data[t["name"]] = rows[i]
 
+    import pandas as pd
+    from openpyxl.formatting.rule import FormulaRule
+    from openpyxl.styles import Font, NamedStyle, PatternFill
+
     df = pd.DataFrame.from_dict(data, orient="index")
 
     # Create Excel with two sheets: Original and Printable
     with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
         # Original sheet - full width
-        df.to_excel(writer, sheet_name="Original", header=False)
+        with span("excel_sheet", sheet="Original", columns=len(df.columns)):
+            df.to_excel(writer, sheet_name="Original", header=False)
 
         # Printable sheet - chunked for A4 landscape
-        chunked_df = create_printable_chunks(df, chunk_size=20)
-        chunked_df.to_excel(writer, sheet_name="Printable", header=False)
-
-    # Post-process with openpyxl for formatting
-    wb = openpyxl.load_workbook(output_file)
-
-    # Apply formatting to both sheets
-    for sheet_name in ["Original", "Printable"]:
-        ws = wb[sheet_name]
-
-        # Set Right-to-Left direction
-        ws.sheet_view.rightToLeft = True
-
-        # Bold the first column (Column A - source names)
-        bold_font = Font(bold=True)
-        for cell in ws["A"]:
-            cell.font = bold_font
-
-    wb.save(output_file)
-    print(f"Written Excel alignment to {output_file}")
-    print(f"  - 'Original' tab: Full alignment ({len(df.columns)} columns)")
-    print(f"  - 'Printable' tab: Chunked for A4 printing (20 columns per chunk)")
+        with span("excel_sheet", sheet="Printable"):
+            chunked_df = create_printable_chunks(df, chunk_size=PRINTABLE_CHUNK_SIZE)
+            chunked_df.to_excel(writer, sheet_name="Printable", header=False)
+
+        # Format the sheets before they are saved, no reload needed
+        with span("excel_format", variants=len(variants)):
+            writer.book.add_named_style(
+                NamedStyle(name=NAME_STYLE, font=Font(bold=True))
+            )
+            fill = PatternFill(
+                start_color=VARIANT_COLOR, end_color=VARIANT_COLOR, fill_type="solid"
+            )
+            for sheet_name, chunk_size in [
+                ("Original", None),
+                ("Printable", PRINTABLE_CHUNK_SIZE),
+            ]:
+                ws = writer.sheets[sheet_name]
+
+                # Set Right-to-Left direction
+                ws.sheet_view.rightToLeft = True
+
+                # Bold the first column (Column A - source names)
+                for cell in ws["A"]:
+                    if cell.value:
+                        cell.style = NAME_STYLE
+
+                ranges = _variant_ranges(variants, len(texts), chunk_size)
+                if ranges:
+                    ws.conditional_formatting.add(
+                        " ".join(ranges), FormulaRule(formula=["TRUE"], fill=fill)
+                    )
+
+    logger.info(f"Written Excel alignment to {output_file}")
+    logger.info(
+        f"  - 'Original' tab: Full alignment ({len(df.columns)} columns, "
+        f"{len(variants)} with variants highlighted)"
+    )
+    logger.info(
+        f"  - 'Printable' tab: Chunked for A4 printing "
+        f"({PRINTABLE_CHUNK_SIZE} columns per chunk)"
+    )
 
 
 def main():
@@ -0,0 +1,224 @@
+"""
+Paginated browsing of a multiple alignment, one page of word columns at a time.
+
+A page only decodes the alignment columns of its own words: the word
+breaks of the alignment (``MSAFile.word_boundaries``) map a range of word
+columns to a range of alignment columns, which a ``.tsmsa`` file reads
+straight from its memory map. The full word table is never built.
+
+Searching goes through a word index, built in one streaming pass on the
+first search: every word to the word columns where any witness reads it.
+A phrase matches where its words follow each other in consecutive columns.
+"""
+
+import bisect
+import html
+from collections import defaultdict
+from dataclasses import dataclass
+
+from .apparatus import iter_msa_word_columns
+from .genalog_alignment import GAP_CHAR
+from .to_excel import iter_word_columns
+
+PAGE_WORDS = 50
+
+
+class RowsAlignment:
+    """In-memory aligned rows with the column range interface of ``msa_format.MSAFile``"""
+
+    def __init__(self, rows, gap_char=GAP_CHAR):
+        self.ids = [tid for tid, _ in rows]
+        self._rows = [row for _, row in rows]
+        self.num_columns = len(self._rows[0]) if self._rows else 0
+        self.gap_char = gap_char
+        self.word_boundaries = [
+            i for i, chars in enumerate(zip(*self._rows)) if " " in chars
+        ]
+
+    def rows(self, start=0, end=None):
+        return [(tid, row[start:end]) for tid, row in zip(self.ids, self._rows)]
+
+    def close(self):
+        pass
+
+
+@dataclass
+class Page:
+    """The word columns ``[first, first + len(columns))`` of an alignment"""
+
+    number: int
+    first: int  # index of the first word column
+    ids: list  # witness ids, one row each
+    columns: list  # word tuples, one word per witness
+
+    @property
+    def variants(self):
+        """Indices, within the page, of the columns where the witnesses differ"""
+        return [i for i, words in enumerate(self.columns) if len(set(words)) > 1]
+
+    def to_html(self, highlight=()):
+        """A right-to-left HTML table of the page, variant columns marked
+
+        Arguments:
+            highlight (iterable, optional) : word column indices to mark as search hits
+        """
+        variants = set(self.variants)
+        hits = {c - self.first for c in highlight}
+        lines = ['<table class="synopsis" dir="rtl">']
+        number = "".join(
+            f"<th>{self.first + i + 1}</th>" for i in range(len(self.columns))
+        )
+        lines.append(f"<tr><th></th>{number}</tr>")
+        for row, tid in enumerate(self.ids):
+            cells = []
+            for i, words in enumerate(self.columns):
+                classes = " ".join(
+                    name
+                    for name, on in (("variant", i in variants), ("hit", i in hits))
+                    if on
+                )
+                attr = f' class="{classes}"' if classes else ""
+                cells.append(f"<td{attr}>{html.escape(words[row])}</td>")
+            lines.append(f"<tr><th>{html.escape(tid)}</th>{''.join(cells)}</tr>")
+        lines.append("</table>")
+        return "\n".join(lines)
+
+
+class AlignmentViewer:
+    """Pages and word search over an ``MSAFile`` or ``RowsAlignment``"""
+
+    def __init__(self, alignment, page_words=PAGE_WORDS):
+        self.alignment = alignment
+        self.page_words = page_words
+        self._index = None
+        self._coords = None
+
+    @classmethod
+    def open(cls, path, page_words=PAGE_WORDS):
+        """A viewer over a ``.tsmsa`` file, read lazily from its memory map, or
+        over its contents as bytes"""
+        from .msa_format import load_msa
+
+        return cls(load_msa(path), page_words=page_words)
+
+    @classmethod
+    def from_rows(cls, rows, page_words=PAGE_WORDS):
+        """A viewer over ``(id, aligned_row)`` tuples, as returned by ``StarAligner.align()``"""
+        return cls(RowsAlignment(rows), page_words=page_words)
+
+    def close(self):
+        self.alignment.close()
+
+    @property
+    def num_words(self):
+        """Number of word columns"""
+        return len(self.alignment.word_boundaries) + 1
+
+    @property
+    def num_pages(self):
+        return self.count_pages()
+
+    def count_pages(self, page_words=None):
+        """Number of pages of ``page_words`` word columns (default self.page_words)"""
+        return -(-self.num_words // (page_words or self.page_words))
+
+    def page_of(self, word, page_words=None):
+        """The page showing word column ``word``, see ``page()``"""
+        page_words = page_words or self.page_words
+        return min(max(word, 0), self.num_words - 1) // page_words
+
+    def _column_range(self, first, last):
+        """Alignment columns of word columns ``[first, last)``"""
+        boundaries = self.alignment.word_boundaries
+        start = int(boundaries[first - 1]) + 1 if first > 0 else 0
+        end = (
+            int(boundaries[last - 1])
+            if last - 1 < len(boundaries)
+            else self.alignment.num_columns
+        )
+        return start, end
+
+    def page(self, number, page_words=None):
+        """Decode page ``number`` (clamped to the pages there are)
+
+        Arguments:
+            number (int) : the page
+            page_words (int, optional) : word columns per page, for callers that
+                share the viewer. Defaults to self.page_words.
+
+        Returns:
+            Page : its word columns
+        """
+        page_words = page_words or self.page_words
+        number = min(max(number, 0), self.count_pages(page_words) - 1)
+        first = number * page_words
+        last = min(first + page_words, self.num_words)
+        start, end = self._column_range(first, last)
+        rows = [row for _, row in self.alignment.rows(start, end)]
+        columns = list(iter_word_columns(rows, gap_char=self.alignment.gap_char))
+        return Page(
+            number=number, first=first, ids=list(self.alignment.ids), columns=columns
+        )
+
+    def locate(self, tid, word):
+        """The word column holding word ``word`` of the text of witness ``tid``
+
+        Raises:
+            IndexError: for a word past the end of the text
+        """
+        if self._coords is None:
+            from .coords import AlignmentIndex
+
+            self._coords = AlignmentIndex(
+                self.alignment.rows(),
+                gap_char=self.alignment.gap_char,
+                word_boundaries=self.alignment.word_boundaries,
+            )
+        return self._coords.word_column_of(self._coords.column_of_word(tid, word))
+
+    def build_index(self):
+        """Index the words of all witnesses, in one pass over the alignment"""
+        index = defaultdict(list)
+        if isinstance(self.alignment, RowsAlignment):
+            columns = iter_word_columns(
+                [row for _, row in self.alignment.rows()],
+                gap_char=self.alignment.gap_char,
+            )
+        else:
+            columns = iter_msa_word_columns(self.alignment)
+        for k, words in enumerate(columns):
+            for word in set(words):
+                if word:
+                    index[word].append(k)
+        self._index = dict(index)
+        return self._index
+
+    def search(self, query, limit=None):
+        """Word columns where any witness reads the words of ``query`` in a row
+
+        Arguments:
+            query (str) : a word or a phrase
+            limit (int, optional) : stop after this many matches. Defaults to all.
+
+        Returns:
+            list : the word column of the first word of every match, in order
+        """
+        index = self._index if self._index is not None else self.build_index()
+        words = query.split()
+        if not words:
+            return []
+        matches = []
+        following = [index.get(word, []) for word in words[1:]]
+        for k in index.get(words[0], []):
+            if all(
+                _contains(positions, k + i + 1) for i, positions in enumerate(following)
+            ):
+                matches.append(k)
+                if limit is not None and len(matches) >= limit:
+                    break
+        return matches
+
+
+def _contains(sorted_values, value):
+    i = bisect.bisect_left(sorted_values, value)
+    return i < len(sorted_values) and sorted_values[i] == value
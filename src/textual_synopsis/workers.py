@@ -0,0 +1,222 @@
+"""
+Run pairwise alignments in isolated worker processes with per-pair limits.
+
+Every attempt runs in a process of its own, so a pair that overruns its
+time limit can be terminated, and one that exhausts its memory limit dies
+alone, without taking the rest of the collation with it. A failed attempt
+is retried with the next, cheaper engine of the pair's fallback chain, and
+reported as a ``PairFailure`` once the chain is exhausted. A cancelled
+run terminates its running workers straight away.
+"""
+
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # Not available on Windows, memory limits are not enforced there
+    resource = None
+
+from .engines import run_engine
+from .instrument import record_span
+from .planner import engine_cells
+
+logger = logging.getLogger(__name__)
+
+# How often a cancel token is polled while waiting on workers
+CANCEL_POLL_SECONDS = 0.1
+
+
+@dataclass
+class PairJob:
+    """One pairwise alignment to run, with the engines to try in order"""
+
+    key: object  # identifies the pair to the caller
+    other_id: str
+    gt: str
+    noise: str
+    engines: list  # (engine, params) tuples, from best quality to cheapest
+
+
+@dataclass
+class PairFailure:
+    """Why a pair could not be aligned by any engine of its fallback chain"""
+
+    other_id: str
+    reason: str  # "timeout", "memory", "error" or "crashed" for the last attempt
+    engine: str  # the last engine tried
+    detail: str = ""
+    attempts: list = field(default_factory=list)  # (engine, reason) of every attempt
+
+    def describe(self):
+        tried = ", ".join(f"{engine}: {reason}" for engine, reason in self.attempts)
+        return f"{self.reason} ({self.detail}); tried {tried}"
+
+
+def _limit_memory(memory_limit):
+    """Cap the address space of this process at its current size plus ``memory_limit`` bytes"""
+    if resource is None:
+        return
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[0]) * resource.getpagesize()
+    except OSError:
+        return
+    limit = current + memory_limit
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _context():
+    """Start workers by forking, unless other threads run: forking those can deadlock the child"""
+    if (
+        threading.active_count() > 1
+        and "forkserver" in multiprocessing.get_all_start_methods()
+    ):
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([run_engine.__module__])
+        return context
+    return multiprocessing.get_context()
+
+
+def _worker(conn, engine, params, gt, noise, memory_limit):
+    if memory_limit is not None:
+        _limit_memory(memory_limit)
+    try:
+        conn.send(("ok", run_engine(engine, gt, noise, **params)))
+    except MemoryError:
+        conn.send(("memory", "MemoryError"))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def run_pairs(
+    jobs, timeout=None, memory_limit=None, max_workers=None, cancel=None, on_done=None
+):
+    """Run pairwise alignment jobs in isolated processes
+
+    Arguments:
+        jobs (list) : a list of ``PairJob``
+        timeout (float, optional) : seconds allowed for one attempt. Defaults to no limit.
+        memory_limit (int, optional) : bytes an attempt may allocate. Defaults to no limit.
+        max_workers (int, optional) : number of concurrent processes. Defaults to the CPU count.
+        cancel (CancelToken, optional) : polled while waiting; cancelling terminates
+            every running worker. Defaults to None.
+        on_done (callable, optional) : called with each job once it is aligned or has
+            failed for good. Defaults to None.
+
+    Raises:
+        AlignmentCancelled: when ``cancel`` is cancelled
+
+    Returns:
+        tuple : ``(results, failures)`` where ``results`` maps each aligned job key to
+        its ``(aligned_gt, aligned_noise)`` and ``failures`` is a list of ``PairFailure``
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    context = _context()
+    pending = deque((job, 0, []) for job in jobs)
+    running = {}  # connection -> (job, engine index, attempts, process, start time)
+    results = {}
+    failures = []
+
+    try:
+        while pending or running:
+            if cancel is not None:
+                cancel.check()
+            while pending and len(running) < max_workers:
+                job, idx, attempts = pending.popleft()
+                engine, params = job.engines[idx]
+                recv_conn, send_conn = context.Pipe(duplex=False)
+                process = context.Process(
+                    target=_worker,
+                    args=(send_conn, engine, params, job.gt, job.noise, memory_limit),
+                    daemon=True,
+                )
+                process.start()
+                send_conn.close()
+                running[recv_conn] = (job, idx, attempts, process, time.monotonic())
+
+            wait_for = None
+            if timeout is not None:
+                first_deadline = (
+                    min(started for *_, started in running.values()) + timeout
+                )
+                wait_for = max(0.0, first_deadline - time.monotonic())
+            if cancel is not None:
+                wait_for = min(
+                    CANCEL_POLL_SECONDS if wait_for is None else wait_for,
+                    CANCEL_POLL_SECONDS,
+                )
+            ready = wait(list(running), timeout=wait_for)
+
+            now = time.monotonic()
+            for conn in list(running):
+                job, idx, attempts, process, started = running[conn]
+                if conn in ready:
+                    try:
+                        status, payload = conn.recv()
+                    except EOFError:
+                        process.join()
+                        # The kernel OOM killer sends SIGKILL
+                        if process.exitcode == -signal.SIGKILL:
+                            status = "memory"
+                        else:
+                            status = "crashed"
+                        payload = f"worker exited with code {process.exitcode}"
+                elif timeout is not None and now - started >= timeout:
+                    process.terminate()
+                    status, payload = "timeout", f"exceeded {timeout:g}s"
+                else:
+                    continue
+
+                del running[conn]
+                conn.close()
+                process.join()
+                engine, params = job.engines[idx]
+                record_span(
+                    "pairwise_alignment",
+                    now - started,
+                    other=job.other_id,
+                    engine=engine,
+                    status=status,
+                    cells=int(
+                        engine_cells(engine, len(job.gt), len(job.noise), params)
+                    ),
+                )
+
+                if status == "ok":
+                    results[job.key] = payload
+                elif idx + 1 < len(job.engines):
+                    logger.warning(
+                        f"{job.other_id}: {engine} alignment {status}, retrying..."
+                    )
+                    pending.appendleft((job, idx + 1, attempts + [(engine, status)]))
+                    continue
+                else:
+                    failures.append(
+                        PairFailure(
+                            other_id=job.other_id,
+                            reason=status,
+                            engine=engine,
+                            detail=payload,
+                            attempts=attempts + [(engine, status)],
+                        )
+                    )
+                if on_done is not None:
+                    on_done(job)
+    finally:
+        # Workers are only left running when cancelled or interrupted
+        for conn, (_, _, _, process, _) in running.items():
+            process.terminate()
+            process.join()
+            conn.close()
+
+    return results, failures
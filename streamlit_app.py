@@ -1,8 +1,63 @@
 import streamlit as st
-import tempfile
-import os
-import shutil
-from textual_synopsis.pipeline import run_alignment_pipeline
+import pandas as pd
+import time
+from textual_synopsis.jobs import JobManager
+from textual_synopsis.multi_align import normalize_text
+from textual_synopsis.preview import PREVIEW_WORDS, align_preview
+from textual_synopsis.to_excel import align_to_words
+from textual_synopsis.viewer import PAGE_WORDS, AlignmentViewer
+
+VIEWER_CSS = """
+<style>
+table.synopsis td, table.synopsis th { padding: 2px 6px; white-space: nowrap; }
+table.synopsis td.variant { background-color: #FFF2CC; }
+table.synopsis td.hit { outline: 2px solid #E06666; }
+</style>
+"""
+
+
+@st.cache_data(max_entries=8)
+def preview_files(files, words):
+    texts = [(name, normalize_text(data.decode("utf-8"))) for name, data in files]
+    return align_preview(texts, words=words)
+
+
+@st.cache_resource(max_entries=4)
+def get_viewer(key, _rows=None, msa=None):
+    # Keyed by the job key or the uploaded file, the rows are not hashed.
+    # Shared by all sessions, so the page size is passed per call, never set.
+    if msa is not None:
+        return AlignmentViewer.open(msa)
+    return AlignmentViewer.from_rows(_rows)
+
+
+def show_viewer(viewer, key):
+    st.subheader("Browse the alignment")
+    left, middle, right = st.columns(3)
+    page_words = left.number_input(
+        "Words per page", min_value=10, max_value=500, value=PAGE_WORDS, step=10
+    )
+    query = right.text_input("Search words", key=f"query_{key}")
+    hits = viewer.search(query) if query.strip() else []
+    if query.strip():
+        right.caption(f"{len(hits)} matches")
+    jump = middle.number_input(
+        f"Go to word (of {viewer.num_words})",
+        min_value=1,
+        max_value=viewer.num_words,
+        value=hits[0] + 1 if hits else 1,
+        key=f"jump_{key}_{query}",
+    )
+    page = viewer.page(viewer.page_of(jump - 1, page_words), page_words)
+    st.caption(f"Page {page.number + 1} of {viewer.count_pages(page_words)}")
+    st.markdown(VIEWER_CSS + page.to_html(highlight=hits), unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_job_manager():
+    # Shared by all sessions: jobs queue on one pool and share the result cache
+    return JobManager()
+
 
 st.title("Align Text Files")
 
@@ -17,43 +72,59 @@ uploaded_files = st.file_uploader(
     "Choose text files", accept_multiple_files=True, type=["txt"]
 )
 
+manager = get_job_manager()
+job_key = st.session_state.get("job_key")
+job = manager.get(job_key) if job_key else None
+
 if uploaded_files:
     if len(uploaded_files) < 2:
         st.warning("Please upload at least 2 files to align.")
     else:
-        if st.button("Align Files"):
-            with st.spinner("Processing..."):
-                # Create a temporary directory for the entire process
-                with tempfile.TemporaryDirectory() as tmpdir:
-                    input_dir = os.path.join(tmpdir, "input")
-                    output_dir = os.path.join(tmpdir, "output")
-                    os.makedirs(input_dir)
-                    # output_dir will be created by pipeline
-
-                    # Save uploaded files
-                    for uploaded_file in uploaded_files:
-                        file_path = os.path.join(input_dir, uploaded_file.name)
-                        with open(file_path, "wb") as f:
-                            f.write(uploaded_file.getbuffer())
-
-                    st.info(f"Aligning {len(uploaded_files)} files...")
-
-                    # Run alignment
-                    success = run_alignment_pipeline(input_dir, output_dir)
-
-                    if success:
-                        excel_path = os.path.join(output_dir, "alignment_table.xlsx")
-                        if os.path.exists(excel_path):
-                            st.success("Alignment complete!")
-
-                            with open(excel_path, "rb") as f:
-                                st.download_button(
-                                    label="Download Alignment Excel",
-                                    data=f,
-                                    file_name="alignment_table.xlsx",
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                )
-                        else:
-                            st.error("Alignment finished but Excel file was not found.")
-                    else:
-                        st.error("Alignment failed. Please check your files.")
+        files = [(f.name, f.getvalue()) for f in uploaded_files]
+        if st.button(f"Preview first {PREVIEW_WORDS} words"):
+            preview = preview_files(files, PREVIEW_WORDS)
+            table = align_to_words(
+                [{"name": tid, "content": row} for tid, row in preview.rows]
+            )
+            st.caption(preview.describe())
+            st.dataframe(pd.DataFrame(table, index=[tid for tid, _ in preview.rows]))
+        if st.button("Align Files", disabled=job is not None and not job.done()):
+            job = manager.submit(files)
+            st.session_state["job_key"] = job.key
+
+if job is not None and not job.done():
+    st.info(f"Aligning {job.num_files} files...")
+    if st.button("Cancel"):
+        job.cancel()
+    bar = st.progress(0.0, text="Waiting for a free worker...")
+    # Clicking Cancel reruns the script, which interrupts this loop
+    while not job.done():
+        progress = job.progress
+        if progress is not None:
+            bar.progress(progress.fraction, text=progress.describe())
+        time.sleep(0.2)
+    st.rerun()
+elif job is not None:
+    status = job.status
+    if status == "done":
+        result = job.result()
+        st.success(f"Alignment complete! ({result.seconds:.1f}s)")
+        for failure in result.failures:
+            st.warning(f"Could not align {failure.other_id}: {failure.describe()}")
+        st.download_button(
+            label="Download Alignment Excel",
+            data=result.excel,
+            file_name="alignment_table.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        show_viewer(get_viewer(job.key, _rows=result.rows), job.key)
+    elif status == "cancelled":
+        st.warning("Alignment cancelled.")
+    else:
+        st.error(f"Alignment failed: {job.future.exception()}")
+
+with st.expander("Open a saved alignment (.tsmsa)"):
+    saved = st.file_uploader("Saved alignment", type=["tsmsa"])
+    if saved is not None:
+        key = f"{saved.name}_{saved.size}"
+        show_viewer(get_viewer(key, msa=saved.getvalue()), key)
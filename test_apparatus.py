@@ -0,0 +1,75 @@
+import csv
+import json
+
+from textual_synopsis.apparatus import (
+    export_apparatus,
+    iter_apparatus,
+    iter_msa_word_columns,
+    write_apparatus,
+)
+from textual_synopsis.msa_format import load_msa, save_msa
+from textual_synopsis.to_excel import iter_word_columns
+
+ROWS = [
+    ("a.txt", "the cat@ sat on the mat"),
+    ("b.txt", "the cart sat on @@@ mat"),
+    ("c.txt", "the cat@ sat on the mat"),
+]
+
+
+def test_word_columns():
+    columns = list(iter_word_columns([row for _, row in ROWS]))
+    assert columns[1] == ("cat", "cart", "cat")
+    assert columns[4] == ("the", "", "the")
+    assert len(columns) == 6
+
+
+def test_apparatus_entries():
+    entries = [
+        entry
+        for entry, _ in iter_apparatus(
+            ["A", "B", "C"], iter_word_columns([row for _, row in ROWS])
+        )
+    ]
+    assert [e.is_variant for e in entries] == [False, True, False, False, True, False]
+    assert entries[1].consensus == "cat"
+    assert entries[1].readings == {"cat": ["A", "C"], "cart": ["B"]}
+    assert entries[4].readings == {"the": ["A", "C"], "": ["B"]}
+    assert round(entries[4].agreement, 3) == 0.667
+
+
+def test_msa_word_columns_match_in_chunks(tmp_path):
+    rows = [(tid, " ".join([row] * 50)) for tid, row in ROWS]
+    save_msa(tmp_path / "a.tsmsa", rows, pivot_id="a.txt")
+    expected = list(iter_word_columns([row for _, row in rows]))
+    with load_msa(tmp_path / "a.tsmsa") as msa:
+        assert list(iter_msa_word_columns(msa, chunk_columns=7)) == expected
+        assert list(iter_msa_word_columns(msa)) == expected
+
+
+def test_write_apparatus(tmp_path):
+    columns = iter_word_columns([row for _, row in ROWS])
+    stats = write_apparatus(["A", "B", "C"], columns, tmp_path, "csv")
+    assert (tmp_path / "consensus.txt").read_text(encoding="utf-8") == (
+        "the cat sat on the mat"
+    )
+    with open(tmp_path / "apparatus.csv", encoding="utf-8") as f:
+        lines = list(csv.DictReader(f))
+    assert [(line["column"], line["reading"], line["witnesses"]) for line in lines] == [
+        ("1", "cat", "A C"),
+        ("1", "cart", "B"),
+        ("4", "the", "A C"),
+        ("4", "", "B"),
+    ]
+    assert stats["variant_columns"] == 2
+    assert stats["witness_agreement"] == {"A": 1.0, "B": 4 / 6, "C": 1.0}
+
+
+def test_export_from_aligned_files(tmp_path):
+    for tid, row in ROWS:
+        (tmp_path / f"aligned_{tid}").write_text(row, encoding="utf-8")
+    export_apparatus(str(tmp_path), tmp_path / "out", variants_only=False)
+    with open(tmp_path / "out" / "apparatus.jsonl", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert len(entries) == 6
+    assert entries[1]["readings"] == {"cat": ["a", "c"], "cart": ["b"]}
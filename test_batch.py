@@ -0,0 +1,97 @@
+import json
+import os
+
+from textual_synopsis import batch
+from textual_synopsis.batch import (
+    REPORT_FILENAME,
+    STATE_FILENAME,
+    _align_pair,
+    discover_collections,
+    main,
+    run_batch,
+)
+
+TEXTS = {
+    "a.txt": "the planet mars i scarcely need remind the reader",
+    "b.txt": "the plamet maris i scacely neee remind te reader",
+}
+
+
+def _write_collection(directory):
+    os.makedirs(directory)
+    for name, content in TEXTS.items():
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def test_batch_aligns_and_skips_unchanged(tmp_path):
+    root = tmp_path / "corpus"
+    _write_collection(root / "book" / "ch1")
+    _write_collection(root / "book" / "ch2")
+    state = str(tmp_path / "state.json")
+
+    collections = discover_collections(str(root))
+    assert [c.name for c in collections] == ["book/ch1", "book/ch2"]
+
+    run_batch(collections, state_path=state, max_workers=2)
+    assert [c.status for c in collections] == ["aligned", "aligned"]
+    aligned_dir = root / "book" / "ch1" / "aligned"
+    assert (aligned_dir / "alignment_table.xlsx").exists()
+    with open(aligned_dir / "aligned_b.txt", encoding="utf-8") as f:
+        assert f.read().replace("@", "") == TEXTS["b.txt"]
+
+    with open(root / "book" / "ch2" / "b.txt", "a", encoding="utf-8") as f:
+        f.write(" again")
+    collections = discover_collections(str(root))
+    run_batch(collections, state_path=state, max_workers=2)
+    assert [c.status for c in collections] == ["skipped", "aligned"]
+
+
+def test_manifest_lists_collections(tmp_path):
+    _write_collection(tmp_path / "ch1")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# chapters\nch1\n\n", encoding="utf-8")
+    collections = discover_collections(str(manifest), output_root=str(tmp_path / "out"))
+    assert [(c.name, c.output_dir) for c in collections] == [
+        ("ch1", str(tmp_path / "out" / "ch1"))
+    ]
+
+
+def test_second_run_skips_its_own_state_and_report(tmp_path):
+    root = tmp_path / "corpus"
+    _write_collection(root)
+    argv = [str(root), "--no-excel", "--max-workers", "1"]
+    assert main(argv) == 0
+    assert (root / STATE_FILENAME).exists()
+
+    assert main(argv) == 0
+    with open(root / REPORT_FILENAME, encoding="utf-8") as f:
+        report = json.load(f)
+    assert [(c["name"], c["status"]) for c in report["collections"]] == [
+        (".", "skipped")
+    ]
+    assert not (root / "aligned" / f"aligned_{STATE_FILENAME}").exists()
+
+
+def _crash_on_marker(engines, gt, noise):
+    if "CRASH" in gt + noise:
+        os._exit(1)  # as a worker killed out of memory
+    return _align_pair(engines, gt, noise)
+
+
+def test_dead_worker_fails_only_its_pair(tmp_path, monkeypatch):
+    root = tmp_path / "corpus"
+    for name in ["ch1", "ch2", "ch3"]:
+        _write_collection(root / name)
+    with open(root / "ch2" / "c.txt", "w", encoding="utf-8") as f:
+        f.write("the planet CRASH")
+    monkeypatch.setattr(batch, "_align_pair", _crash_on_marker)
+
+    assert main([str(root), "--max-workers", "2", "--no-excel"]) == 0
+    with open(root / REPORT_FILENAME, encoding="utf-8") as f:
+        report = json.load(f)
+    collections = {c["name"]: c for c in report["collections"]}
+    assert {c["status"] for c in collections.values()} == {"aligned"}
+    (failure,) = collections["ch2"]["failures"]
+    assert (failure["other_id"], failure["reason"]) == ("c.txt", "crashed")
+    assert not collections["ch1"]["failures"] and not collections["ch3"]["failures"]
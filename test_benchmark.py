@@ -0,0 +1,31 @@
+from benchmark import MIN_SLACK_SECONDS, find_regressions
+
+
+def _result(seconds, peak_rss_mb, stage="star_align", size=1000):
+    return {
+        "stage": stage,
+        "size": size,
+        "witnesses": 3,
+        "seconds": seconds,
+        "peak_rss_mb": peak_rss_mb,
+    }
+
+
+BASELINE = {"results": [_result(1.0, 100.0), _result(0.001, 50.0, stage="lcs")]}
+
+
+def test_results_within_tolerance_pass():
+    results = [
+        _result(1.2, 120.0),
+        _result(0.001 + MIN_SLACK_SECONDS, 50.0, stage="lcs"),
+        _result(9.0, 900.0, size=5000),  # not in the baseline
+    ]
+    assert find_regressions(results, BASELINE, tolerance=0.25) == []
+
+
+def test_slower_or_larger_results_fail():
+    results = [_result(1.3, 100.0), _result(0.001, 80.0, stage="lcs")]
+    regressions = find_regressions(results, BASELINE, tolerance=0.25)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("star_align (size 1000): seconds")
+    assert regressions[1].startswith("lcs (size 1000): peak_rss_mb")
@@ -0,0 +1,57 @@
+import pytest
+
+from textual_synopsis.coords import AlignmentIndex
+from textual_synopsis.genalog_alignment import GAP_CHAR
+from textual_synopsis.multi_align import StarAligner
+from textual_synopsis.to_excel import align_to_words
+from textual_synopsis.viewer import AlignmentViewer
+
+TEXTS = [
+    ("a", "the quick brown fox jumps over the lazy dog " * 20),
+    ("b", "the quick brwn fox jumped over a lazy dog " * 20),
+    ("c", "quick brown foxes jump over the lazy dogs " * 20),
+]
+
+
+@pytest.fixture
+def aligned():
+    aligner = StarAligner([(tid, text.strip()) for tid, text in TEXTS], index=True)
+    return aligner.align(), aligner.index
+
+
+def test_index_matches_row_scans(aligned):
+    rows, index = aligned
+    index_small = AlignmentIndex(rows, sample=7)
+    for tid, row in rows:
+        columns = [k for k, char in enumerate(row) if char != GAP_CHAR]
+        assert index.length(tid) == len(columns)
+        for position, column in enumerate(columns):
+            assert index.column_of(tid, position) == column
+            assert index_small.column_of(tid, position) == column
+            assert index_small.position_at(tid, column) == position
+        for column in range(0, len(row) + 1, 5):
+            before = sum(char != GAP_CHAR for char in row[:column])
+            assert index_small.chars_before(tid, column) == before
+        with pytest.raises(IndexError):
+            index.column_of(tid, len(columns))
+
+
+def test_word_lookups(aligned):
+    rows, index = aligned
+    words = align_to_words([{"name": tid, "content": row} for tid, row in rows])
+    ids = [tid for tid, _ in rows]
+    for word in range(len(words[0])):
+        start, end = index.word_columns(word)
+        for k, tid in enumerate(ids):
+            assert rows[k][1][start:end].replace(GAP_CHAR, "") == words[k][word]
+        assert index.word_column_of(start) == word
+
+    text_b = dict(rows)["b"].replace(GAP_CHAR, "")
+    position = text_b.index("brwn")
+    column = index.column_of_word("b", 2)
+    assert column == index.column_of("b", position)
+    assert index.reading("b", position, "a") == "brown"
+    assert index.project("b", 0, "a") == 0
+
+    viewer = AlignmentViewer.from_rows(rows)
+    assert viewer.locate("b", 2) == index.word_column_of(column)
@@ -0,0 +1,101 @@
+import hashlib
+
+from textual_synopsis import corpus
+from textual_synopsis.corpus import load_corpus, normalize, scan_corpus
+from textual_synopsis.instrument import start_trace, stop_trace
+from textual_synopsis.jobs import digest_key, job_key
+from textual_synopsis.multi_align import load_texts_from_directory, normalize_text
+
+FILES = {
+    "b.txt": "שלום   עולם\nומלואו",
+    "a.txt": "hello\tworld ",
+    "c.md": "notes",
+}
+
+
+def _write(tmp_path):
+    for name, content in FILES.items():
+        (tmp_path / name).write_text(content, encoding="utf-8")
+    (tmp_path / "image.png").write_bytes(b"\x89PNG\r\n\x00\x00")
+    (tmp_path / "latin1.txt").write_bytes("caf\xe9".encode("latin-1"))
+    (tmp_path / ".hidden").write_text("x")
+
+
+def test_scan_and_load(tmp_path):
+    _write(tmp_path)
+    scanned = scan_corpus(str(tmp_path), extensions=["txt"])
+    assert [(f.name, f.size) for f in scanned] == [
+        ("a.txt", 12),
+        ("b.txt", len(FILES["b.txt"].encode("utf-8"))),
+        ("latin1.txt", 4),
+    ]
+
+    # Binaries and files that are not UTF-8 are skipped
+    loaded = load_corpus(str(tmp_path))
+    assert [(f.name, f.text) for f in loaded] == [
+        ("a.txt", "hello world"),
+        ("b.txt", "שלום עולם ומלואו"),
+        ("c.md", "notes"),
+    ]
+    data = FILES["a.txt"].encode("utf-8")
+    assert loaded[0].sha256 == hashlib.sha256(data).hexdigest()
+    assert load_texts_from_directory(str(tmp_path), extensions=[".md"]) == [
+        ("c.md", "notes")
+    ]
+
+
+def test_mmap_and_parallel_loads_match(tmp_path, monkeypatch):
+    _write(tmp_path)
+    expected = [(f.name, f.sha256, f.text) for f in load_corpus(str(tmp_path))]
+    monkeypatch.setattr(corpus, "MMAP_MIN_BYTES", 1)
+    monkeypatch.setattr(corpus, "PARALLEL_MIN_BYTES", 0)
+    loaded = load_corpus(str(tmp_path), max_workers=2)
+    assert [(f.name, f.sha256, f.text) for f in loaded] == expected
+
+
+def test_load_traces_every_file(tmp_path, monkeypatch):
+    _write(tmp_path)
+    monkeypatch.setattr(corpus, "PARALLEL_MIN_BYTES", 0)
+    start_trace()
+    try:
+        load_corpus(str(tmp_path), max_workers=2)
+    finally:
+        trace = stop_trace()
+    names = {}
+    for s in trace.spans:
+        names.setdefault(s["name"], []).append(s["fields"].get("file"))
+    assert sorted(names["read"]) == [
+        "a.txt",
+        "b.txt",
+        "c.md",
+        "image.png",
+        "latin1.txt",
+    ]
+    assert sorted(names["normalize"]) == ["a.txt", "b.txt", "c.md"]
+    assert names["load"] == [None]
+
+
+def test_normalize_matches_normalize_text():
+    for text in ["a b", "a  b", " a b\n", "x\ty", "a\u200fb c", "a\xa0b", "", " "]:
+        assert normalize(text) == normalize_text(text)
+
+
+def test_manifest(tmp_path):
+    _write(tmp_path)
+    (tmp_path / "list").mkdir()
+    manifest = tmp_path / "list" / "witnesses.txt"
+    manifest.write_text("# order matters\n../c.md\n\n../a.txt\n", encoding="utf-8")
+    assert load_texts_from_directory(str(manifest)) == [
+        ("c.md", "notes"),
+        ("a.txt", "hello world"),
+    ]
+
+
+def test_digest_key_matches_job_key(tmp_path):
+    _write(tmp_path)
+    options = {"pivot": "longest"}
+    files = [(name, content.encode("utf-8")) for name, content in FILES.items()]
+    loaded = load_corpus(str(tmp_path), extensions=[".txt", ".md"])
+    assert digest_key([(f.name, f.sha256) for f in loaded], options) == job_key(
+        files, options
+    )
@@ -0,0 +1,55 @@
+import pytest
+
+from textual_synopsis.engines import ENGINES, locate_fragment, run_engine
+from textual_synopsis.genalog_alignment import GAP_CHAR
+from textual_synopsis.planner import plan_alignment
+
+PAIRS = [
+    ("hello world", "helo wrld"),
+    (
+        "The planet Mars, I scarcely need remind the reader,",
+        "The plamet Maris, I scacely neee remind te reader,",
+    ),
+    ("alpha beta gamma delta", "zzz yyy alpha beta gamma delta"),
+    ("zzz alpha beta gamma delta", "alpha beta gamma delta"),
+    ("a-b c", "a b c"),
+]
+
+
+@pytest.mark.parametrize("engine", sorted(ENGINES))
+@pytest.mark.parametrize("gt,noise", PAIRS)
+def test_engine_contract(engine, gt, noise):
+    params = {"max_seg_length": 5} if engine == "anchored" else {}
+    aligned_gt, aligned_noise = run_engine(engine, gt, noise, **params)
+    assert len(aligned_gt) == len(aligned_noise)
+    assert aligned_gt.replace(GAP_CHAR, "") == gt
+    assert aligned_noise.replace(GAP_CHAR, "") == noise
+
+
+def test_plan_respects_budgets():
+    pivot = ("p", "the quick brown fox jumps over the lazy dog " * 50)
+    others = [("a", "the quick brown fox jumped over a lazy dog " * 50)]
+
+    plan = plan_alignment(pivot, others)
+    assert plan.get("a").engine == "global"
+
+    plan = plan_alignment(pivot, others, memory_budget=100_000)
+    assert plan.get("a").engine != "global"
+    assert plan.peak_memory <= 100_000
+    assert plan.fits
+    assert "memory budget" in plan.describe()
+
+
+def test_fragment_is_aligned_at_its_locus():
+    words = [f"w{i}" for i in range(3000)]
+    pivot = " ".join(words)
+    fragment = " ".join(words[1200:1260]).replace("w1230", "w123")
+    start = pivot.index("w1200")
+    assert locate_fragment(pivot, fragment)[0] == start
+
+    aligned_pivot, aligned_fragment = run_engine("fragment", pivot, fragment)
+    assert aligned_pivot == pivot
+    assert aligned_fragment.index("w1200") == start
+
+    plan = plan_alignment(("p", pivot), [("f", fragment)])
+    assert plan.get("f").engine == "fragment"
@@ -0,0 +1,58 @@
+import json
+
+from textual_synopsis import genalog_alignment
+from textual_synopsis.evaluate import (
+    alignment_score,
+    column_agreement,
+    evaluate_texts,
+    main,
+    word_table_diff,
+)
+from textual_synopsis.synthetic import generate_witness_family
+
+
+def test_alignment_score_matches_optimal_score():
+    gt, noise = "the cat sat on the mat", "the cart sat on mat"
+    aligned = genalog_alignment.align(gt, noise)
+    assert alignment_score(*aligned) == genalog_alignment.score(gt, noise)
+    # A gap in the other row opens a new gap
+    assert alignment_score("ab@c", "a@bc") == 2 - 0.5 - 0.5
+    assert alignment_score("abc", "@@c") == 1 - 0.5 - 0.1
+
+
+def test_agreement_and_word_diffs():
+    reference = ("the cat sat", "the c@t sat")
+    shifted = ("the cat@ sat", "the c@@t sat")
+    assert column_agreement(reference, reference) == 1.0
+    assert column_agreement(reference, shifted) == 19 / 21
+    assert word_table_diff(reference, reference) == 0
+    # A shift within a word keeps the word table
+    assert word_table_diff(reference, shifted) == 0
+    assert word_table_diff(("a b", "@@b"), ("a b", "b@@")) == 2
+
+
+def test_evaluate_engines(tmp_path):
+    family = generate_witness_family(1000, 2, seed=1)
+    results = evaluate_texts("synthetic", family, engines=["global", "anchored"])
+    assert [r.engine for r in results] == ["global", "anchored"]
+    reference = results[0]
+    assert (reference.agreement, reference.word_diffs, reference.score_gap) == (
+        1.0,
+        0,
+        0.0,
+    )
+    assert all(r.error is None and r.peak_mb is not None for r in results)
+
+    main(
+        [
+            "--sizes",
+            "500",
+            "--engines",
+            "segmented",
+            "--output",
+            str(tmp_path / "e.json"),
+        ]
+    )
+    report = json.loads((tmp_path / "e.json").read_text())
+    assert set(report["summary"]) == {"segmented"}
+    assert len(report["results"]) == 2
@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+from textual_synopsis import genalog_alignment
+from textual_synopsis.genalog_alignment import GAP_CHAR, _gapped_from_coordinates
+from textual_synopsis.gotoh import align_batch, align_batch_coordinates
+from textual_synopsis.progress import AlignmentCancelled, CancelToken
+
+
+def _random_pairs(count, seed=0):
+    rng = random.Random(seed)
+
+    def text():
+        return "".join(rng.choice("ab cd") for _ in range(rng.randint(0, 30)))
+
+    return [(text(), text()) for _ in range(count)]
+
+
+def test_batch_scores_are_optimal():
+    pairs = _random_pairs(200)
+    for (gt, noise), (score, coordinates) in zip(pairs, align_batch_coordinates(pairs)):
+        assert score == pytest.approx(genalog_alignment.score(gt, noise))
+        aligned_gt, aligned_noise = _gapped_from_coordinates(gt, noise, coordinates)
+        assert aligned_gt.replace(GAP_CHAR, "") == gt
+        assert aligned_noise.replace(GAP_CHAR, "") == noise
+
+
+def test_batch_matches_pairwise_align():
+    pairs = _random_pairs(100, seed=1) + [("hello world", "helo wrld"), ("", "")]
+    for (gt, noise), aligned in zip(pairs, align_batch(pairs)):
+        aligned_gt, aligned_noise = aligned
+        assert len(aligned_gt) == len(aligned_noise)
+        assert aligned_gt.replace(GAP_CHAR, "") == gt
+        assert aligned_noise.replace(GAP_CHAR, "") == noise
+    assert align_batch([("hello world", "helo wrld")]) == [
+        genalog_alignment.align("hello world", "helo wrld")
+    ]
+
+
+def test_batch_can_be_cancelled():
+    cancel = CancelToken()
+    cancel.cancel()
+    with pytest.raises(AlignmentCancelled):
+        align_batch(_random_pairs(10), cancel=cancel)
@@ -0,0 +1,63 @@
+import random
+
+from textual_synopsis.incremental import diff_windows, update_alignment
+from textual_synopsis.multi_align import StarAligner
+from textual_synopsis.pipeline import run_alignment_pipeline
+
+
+def _texts(seed=0, words=400):
+    rng = random.Random(seed)
+    vocab = ["".join(rng.choice("abcdefghij") for _ in range(5)) for _ in range(300)]
+    base = [rng.choice(vocab) for _ in range(words)]
+    noisy = [w if rng.random() > 0.05 else w[:-1] for w in base]
+    return [("a.txt", " ".join(base)), ("b.txt", " ".join(noisy))]
+
+
+def test_diff_windows():
+    old = " ".join(f"w{i}" for i in range(1000))
+    new = old.replace("w100 ", "w100x ").replace("w900 ", "")
+    windows = diff_windows(old, new, margin=20)
+    assert len(windows) == 2
+    for old_start, old_end, new_start, new_end in windows:
+        assert old_end - old_start < 100
+    # Outside the windows the texts are identical
+    (s1, e1, n1, m1), (s2, e2, n2, m2) = windows
+    assert old[:s1] == new[:n1]
+    assert old[e1:s2] == new[m1:n2]
+    assert old[e2:] == new[m2:]
+    assert diff_windows(old, old) == []
+
+
+def test_update_alignment_splices_edits():
+    texts = _texts()
+    rows = StarAligner(texts).align()
+    edited = texts[1][1][:300] + " inserted " + texts[1][1][300:]
+    new_texts = [texts[0], ("b.txt", edited), ("c.txt", "extra")]
+    assert update_alignment(rows, new_texts, pivot_id="a.txt") is None
+
+    new_texts = new_texts[:2]
+    updated, edited_ids = update_alignment(rows, new_texts, pivot_id="a.txt")
+    assert edited_ids == ["b.txt"]
+    assert len({len(row) for _, row in updated}) == 1
+    for (tid, row), (_, text) in zip(updated, new_texts):
+        assert row.replace("@", "") == text
+    # The columns far from the edit are untouched
+    assert dict(updated)["b.txt"][-200:] == dict(rows)["b.txt"][-200:]
+
+
+def test_incremental_pipeline(tmp_path):
+    input_dir = tmp_path / "in"
+    input_dir.mkdir()
+    texts = _texts(seed=1)
+    for tid, content in texts:
+        (input_dir / tid).write_text(content, encoding="utf-8")
+    output_dir = tmp_path / "out"
+    assert run_alignment_pipeline(input_dir, output_dir, excel=False, incremental=True)
+
+    (input_dir / "b.txt").write_text("typo " + texts[1][1], encoding="utf-8")
+    assert run_alignment_pipeline(
+        input_dir, output_dir, excel=False, output_format="both", incremental=True
+    )
+    aligned = (output_dir / "aligned_b.txt").read_text(encoding="utf-8")
+    assert aligned.replace("@", "") == "typo " + texts[1][1]
+    assert (output_dir / "alignment.tsmsa").exists()
@@ -0,0 +1,35 @@
+import io
+
+import openpyxl
+
+from textual_synopsis.jobs import JobManager, job_key
+
+FILES = [
+    ("a.txt", "the planet mars i scarcely need remind the reader".encode("utf-8")),
+    ("b.txt", "the plamet maris i scacely neee remind te reader".encode("utf-8")),
+]
+
+
+def test_job_key_ignores_upload_order_but_not_settings():
+    assert job_key(FILES, {}) == job_key(FILES[::-1], {})
+    assert job_key(FILES, {}) != job_key(FILES, {"pivot": "b.txt"})
+    changed = [FILES[0], ("b.txt", b"the planet")]
+    assert job_key(FILES, {}) != job_key(changed, {})
+
+
+def test_results_are_cached_in_memory():
+    manager = JobManager(max_jobs=1)
+    try:
+        job = manager.submit(FILES)
+        result = job.result(timeout=60)
+        assert job.status == "done"
+        assert [name for name, _ in result.rows] == ["a.txt", "b.txt"]
+
+        wb = openpyxl.load_workbook(io.BytesIO(result.excel))
+        assert wb.sheetnames == ["Original", "Printable"]
+        assert wb["Original"]["A1"].value == "a"
+
+        assert manager.submit(FILES[::-1]) is job
+        assert manager.submit(FILES, pivot="b.txt") is not job
+    finally:
+        manager.shutdown()
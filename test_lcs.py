@@ -1,4 +1,4 @@
-from lib.genalog_lcs import LCS
+from textual_synopsis.genalog_lcs import LCS
 
 
 def test_lcs():
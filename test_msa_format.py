@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from textual_synopsis.msa_format import MAGIC, MSAFile, load_msa, save_msa
+from textual_synopsis.multi_align import StarAligner
+from textual_synopsis.to_excel import align_to_words
+
+
+def _mutate(text, rng, edits=30):
+    chars = list(text)
+    for _ in range(edits):
+        k = rng.randrange(len(chars))
+        r = rng.random()
+        if r < 0.3:
+            chars[k] = "x"
+        elif r < 0.6:
+            del chars[k]
+        else:
+            chars.insert(k, "ש")
+    return " ".join("".join(chars).split())
+
+
+@pytest.fixture
+def rows():
+    rng = random.Random(1)
+    words = ["".join(rng.choice("אבגדה") for _ in range(4)) for _ in range(100)]
+    base = " ".join(words)
+    texts = [("a.txt", base)] + [(f"{name}.txt", _mutate(base, rng)) for name in "bcd"]
+    return StarAligner(texts).align()
+
+
+def test_round_trip_and_column_ranges(tmp_path, rows):
+    path = tmp_path / "alignment.tsmsa"
+    save_msa(path, rows, pivot_id="a.txt")
+    assert path.stat().st_size < sum(len(row.encode("utf-8")) for _, row in rows)
+
+    rng = random.Random(2)
+    with load_msa(path) as msa:
+        assert msa.pivot_id == "a.txt"
+        assert msa.rows() == rows
+        for _ in range(100):
+            start = rng.randrange(msa.num_columns + 5)
+            end = start + rng.randrange(40)
+            assert msa.rows(start, end) == [(t, r[start:end]) for t, r in rows]
+        texts = msa.texts()
+        boundaries = list(msa.word_boundaries)
+
+    assert [t["name"] for t in texts] == ["a", "b", "c", "d"]
+    assert len(align_to_words(texts)[0]) == len(boundaries) + 1
+
+
+def test_identical_and_empty_rows(tmp_path):
+    path = tmp_path / "alignment.tsmsa"
+    for rows in ([("a", ""), ("b", "")], [("a", "abc"), ("b", "abc")]):
+        save_msa(path, rows)
+        with load_msa(path) as msa:
+            assert msa.rows() == rows
+    with pytest.raises(ValueError, match="without rows"):
+        save_msa(path, [])
+
+
+def test_bad_files_are_closed(tmp_path, monkeypatch):
+    closed = []
+    close = MSAFile.close
+    monkeypatch.setattr(MSAFile, "close", lambda self: closed.append(close(self)))
+    path = tmp_path / "alignment.tsmsa"
+    save_msa(path, [("a", "abc"), ("b", "a@c")])
+    data = path.read_bytes()
+    header_start = len(MAGIC) + 4
+    corrupt = {
+        "magic": b"XXXX" + data[4:],
+        "version": data.replace(b'"version": 1', b'"version": 9'),
+        "json": data[:header_start] + b"]" + data[header_start + 1 :],
+    }
+    for problem, content in corrupt.items():
+        path.write_bytes(content)
+        for source in (str(path), content):
+            with pytest.raises(ValueError):
+                load_msa(source)
+    assert len(closed) == 2 * len(corrupt)
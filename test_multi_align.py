@@ -0,0 +1,226 @@
+import sys
+import time
+
+import pytest
+
+from textual_synopsis import engines, evaluate, genalog_alignment, multi_align
+from textual_synopsis.instrument import start_trace, stop_trace
+from textual_synopsis.genalog_anchor import get_common_anchors
+from textual_synopsis.multi_align import StarAligner, align_in_blocks, pairwise_scores
+from textual_synopsis.progress import AlignmentCancelled, CancelToken
+
+TEXTS = [
+    ("a", "the planet mars i scarcely need remind the reader"),
+    ("b", "the plamet maris i scacely neee remind te reader"),
+    ("c", "the planet mars i scarcely need remind the reader revolves"),
+]
+
+
+def test_pairwise_scores_matches_full_alignment():
+    scores = pairwise_scores(TEXTS, max_workers=1)
+    assert list(scores.index) == ["a", "b", "c"]
+    assert scores.loc["a", "b"] == scores.loc["b", "a"]
+    for (i, a), (j, b) in [(TEXTS[0], TEXTS[1]), (TEXTS[1], TEXTS[2])]:
+        aligned = genalog_alignment.align(a, b)
+        assert scores.loc[i, j] == pytest.approx(evaluate.alignment_score(*aligned))
+
+
+def test_pairwise_scores_parallel_and_normalized():
+    serial = pairwise_scores(TEXTS, max_workers=1, normalize=True)
+    parallel = pairwise_scores(TEXTS, max_workers=2, normalize=True)
+    assert serial.equals(parallel)
+    assert serial.loc["a", "a"] == 1.0
+    assert 0 < serial.loc["a", "b"] < 1
+
+
+def test_centroid_pivot():
+    aligner = StarAligner(TEXTS, pivot="centroid", max_workers=1)
+    assert aligner._select_pivot() == 0
+    assert StarAligner(TEXTS, pivot="b")._select_pivot() == 1
+
+
+def test_trace_records_stages_and_cells():
+    start_trace()
+    try:
+        StarAligner(TEXTS).align()
+    finally:
+        trace = stop_trace()
+    summary = trace.summary()
+    assert summary["pivot_selection"]["count"] == 1
+    assert summary["merge"]["count"] == 1
+    assert summary["pairwise_alignment"]["count"] == 2
+    cells = [
+        s["fields"]["cells"] for s in trace.spans if s["name"] == "pairwise_alignment"
+    ]
+    assert all(c > 0 for c in cells)
+    events = trace.to_chrome_trace()["traceEvents"]
+    assert {e["ph"] for e in events} == {"X"}
+
+
+def test_trace_cells_are_the_engine_estimate():
+    texts = [
+        ("p", "the quick brown fox jumps over the lazy dog " * 50),
+        ("a", "the quick brown fox jumped over a lazy dog " * 50),
+    ]
+    start_trace()
+    try:
+        StarAligner(texts, memory_budget=100_000).align()
+    finally:
+        trace = stop_trace()
+    (pair,) = [s for s in trace.spans if s["name"] == "pairwise_alignment"]
+    assert pair["fields"]["engine"] != "global"
+    assert 0 < pair["fields"]["cells"] < len(texts[0][1]) * len(texts[1][1]) / 2
+
+
+def test_isolated_workers_match_in_process():
+    expected = StarAligner(TEXTS).align()
+    aligner = StarAligner(TEXTS, timeout=60, max_workers=2)
+    assert aligner.align() == expected
+    assert aligner.failures == []
+
+
+def _hang(gt, noise, gap_char="@", **params):
+    time.sleep(60)
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="workers must be forked")
+def test_overrun_pairs_are_reported_and_dropped(monkeypatch):
+    for name in engines.ENGINES:
+        monkeypatch.setitem(engines.ENGINES, name, _hang)
+    aligner = StarAligner(TEXTS, timeout=0.1)
+    results = aligner.align()
+    assert [tid for tid, _ in results] == [aligner.pivot_id]
+    assert sorted(f.other_id for f in aligner.failures) == ["a", "b"]
+    failure = aligner.failures[0]
+    assert failure.reason == "timeout"
+    assert [engine for engine, _ in failure.attempts] == [
+        "global",
+        "anchored",
+        "segmented",
+    ]
+
+
+def test_duplicates_are_aligned_once():
+    words = [f"w{i % 300}" for i in range(1200)]
+    text = " ".join(words)
+    edited = text.replace("w100 ", "w10O ", 1)
+    texts = TEXTS + [("a2", TEXTS[0][1]), ("b2", TEXTS[1][1])]
+    aligner = StarAligner(texts)
+    assert [job.other_id for job in aligner.pair_jobs()] == ["a", "b"]
+    assert aligner.duplicates == {3: 0, 4: 1}
+    results = dict(aligner.align())
+    assert results["a2"] == results["a"]
+    assert results["b2"] == results["b"]
+
+    texts = [("x", text), ("y", edited), ("z", edited[:-5])]
+    aligner = StarAligner(texts)
+    assert aligner.pair_jobs() == []
+    assert aligner.near_duplicates == {1: 0, 2: 0}
+    results = aligner.align()
+    assert len({len(row) for _, row in results}) == 1
+    for (tid, row), (_, content) in zip(results, texts):
+        assert row.replace("@", "") == content
+    assert results == StarAligner(texts, deduplicate=False).align()
+
+
+def test_progress_reports_every_pair():
+    reports = []
+    StarAligner(TEXTS, progress=reports.append).align()
+    done = reports[-1]
+    assert (done.pairs_done, done.pairs_total) == (2, 2)
+    assert done.cells_done == done.cells_total > 0
+    assert done.fraction == 1.0
+    assert done.eta == 0.0
+    assert [r.current for r in reports if r.current] == ["a", "b"]
+
+
+def test_cancelled_before_start():
+    token = CancelToken()
+    token.cancel()
+    with pytest.raises(AlignmentCancelled):
+        StarAligner(TEXTS, cancel=token).align()
+
+
+class _CancelAfter(CancelToken):
+    """Cancels itself once checked after a delay, without a thread forked workers would copy"""
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.deadline = time.monotonic() + seconds
+
+    def check(self):
+        if time.monotonic() >= self.deadline:
+            self.cancel()
+        super().check()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="workers must be forked")
+def test_cancel_terminates_running_workers(monkeypatch):
+    for name in engines.ENGINES:
+        monkeypatch.setitem(engines.ENGINES, name, _hang)
+    token = _CancelAfter(0.2)
+    started = time.monotonic()
+    with pytest.raises(AlignmentCancelled):
+        StarAligner(TEXTS, isolate=True, cancel=token).align()
+    assert time.monotonic() - started < 5
+
+
+def test_common_anchors_are_ordered_in_every_text():
+    token_lists = [
+        "a bb cc dd ee ff gg".split(),
+        "xx bb cc ee dd ff gg".split(),
+        "bb zz cc dd ee ff gg hh".split(),
+    ]
+    anchors = get_common_anchors(token_lists)
+    words = [[tokens[i] for i in idx] for tokens, idx in zip(token_lists, anchors)]
+    assert words[0] == words[1] == words[2]
+    assert "dd" not in words[0] or "ee" not in words[0]
+    assert all(idx == sorted(idx) for idx in anchors)
+
+
+def test_align_in_blocks_bounds_blocks_in_flight(monkeypatch):
+    submitted = []
+
+    class CountingExecutor(multi_align.ProcessPoolExecutor):
+        def submit(self, fn, job):
+            submitted.append(job)
+            return super().submit(fn, job)
+
+    monkeypatch.setattr(multi_align, "ProcessPoolExecutor", CountingExecutor)
+    words = [f"w{i}" for i in range(400)]
+    texts = [
+        ("a", " ".join(words)),
+        ("b", " ".join(w + "x" if i % 7 == 0 else w for i, w in enumerate(words))),
+    ]
+    pieces = align_in_blocks(texts, min_block_length=50, max_workers=2)
+    for k, _ in enumerate(pieces):
+        # Submitted, less the blocks yielded so far and the one being yielded
+        assert len(submitted) - (k + 1) <= multi_align.BLOCKS_PER_WORKER * 2
+    assert k + 1 == len(submitted) > multi_align.BLOCKS_PER_WORKER * 2 + 1
+
+
+def test_align_in_blocks_restores_texts():
+    texts = TEXTS + [("d", "mars i need remind the reader")]
+    pieces = list(align_in_blocks(texts, min_block_length=10, max_workers=1))
+    assert len(pieces) > 1
+    rows = ["".join(row) for row in zip(*pieces)]
+    assert len({len(row) for row in rows}) == 1
+    for (_, content), row in zip(texts, rows):
+        assert row.replace(genalog_alignment.GAP_CHAR, "") == content
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="workers must be forked")
+def test_align_in_blocks_reports_failures(monkeypatch):
+    for name in engines.ENGINES:
+        monkeypatch.setitem(engines.ENGINES, name, _hang)
+    texts = TEXTS + [("d", "mars i need remind the reader")]
+    failures = []
+    pieces = list(
+        align_in_blocks(
+            texts, min_block_length=10, max_workers=1, failures=failures, timeout=0.05
+        )
+    )
+    assert failures and all(f.detail.startswith("block ") for f in failures)
+    rows = ["".join(row) for row in zip(*pieces)]
+    for (_, content), row in zip(texts, rows):
+        assert row.replace(genalog_alignment.GAP_CHAR, "") == content
@@ -0,0 +1,59 @@
+import pytest
+
+from textual_synopsis.preview import WINDOW_SEPARATOR, align_preview, sample_windows
+
+WORDS = (
+    "the planet mars i scarcely need remind the reader revolves about the sun".split()
+)
+
+
+def _witness(words, typos=()):
+    return " ".join(w[:-1] if i in typos else w for i, w in enumerate(words))
+
+
+def test_preview_aligns_only_the_first_words():
+    texts = [
+        ("a.txt", _witness(WORDS * 20)),
+        ("b.txt", _witness(WORDS * 20, typos={3, 17})),
+    ]
+    preview = align_preview(texts, words=10)
+    rows = dict(preview.rows)
+    assert preview.partial
+    assert len(rows["a.txt"]) == len(rows["b.txt"])
+    assert rows["a.txt"].replace("@", "") == " ".join(WORDS[:10])
+    assert "Partial preview" in preview.describe()
+
+
+def test_preview_windows_start_at_common_anchors():
+    words = [f"w{i}" for i in range(300)]
+    texts = [("a.txt", " ".join(words)), ("b.txt", " ".join(["extra"] * 7 + words))]
+    starts, samples = sample_windows(texts, words=5, windows=3)
+    assert len(starts) == 3
+    for window in samples:
+        (_, a), (_, b) = window
+        assert a == b
+    preview = align_preview(texts, words=5, windows=3)
+    assert dict(preview.rows)["a.txt"].count(WINDOW_SEPARATOR) == 2
+
+
+def test_agreement_flags_an_unrelated_witness():
+    texts = [
+        ("a.txt", _witness(WORDS * 4)),
+        ("b.txt", _witness(WORDS * 4, typos={2})),
+        ("c.txt", _witness(WORDS * 4, typos={5})),
+        ("junk.txt", " ".join(["lorem", "ipsum", "dolor"] * 16)),
+    ]
+    agreement = align_preview(texts, words=40).agreement
+    assert agreement["junk.txt"] < 0.5
+    assert min(agreement[t] for t in ("a.txt", "b.txt", "c.txt")) > 0.8
+
+
+def test_cli_rejects_an_empty_preview(monkeypatch, tmp_path, capsys):
+    from textual_synopsis import pipeline
+
+    for words in ["0", "-5"]:
+        monkeypatch.setattr("sys.argv", ["pipeline", str(tmp_path), "--preview", words])
+        with pytest.raises(SystemExit) as exit_info:
+            pipeline.main()
+        assert exit_info.value.code == 2
+        assert "--preview: must be at least 1" in capsys.readouterr().err
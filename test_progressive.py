@@ -0,0 +1,48 @@
+from textual_synopsis.multi_align import StarAligner
+from textual_synopsis.pipeline import run_alignment_pipeline
+from textual_synopsis.progressive import (
+    ProgressiveAligner,
+    estimate_similarity,
+    guide_tree,
+    sketch,
+)
+from textual_synopsis.synthetic import generate_witness_family
+
+
+def test_guide_tree_joins_closest_first():
+    texts = [
+        "the cat sat on the mat",
+        "a dog ran in the park today",
+        "the cat sat on a mat",
+        "a dog ran in the park",
+    ]
+    assert estimate_similarity(sketch(texts[0]), sketch(texts[0])) == 1.0
+    merges = guide_tree(texts)
+    assert len(merges) == 3
+    assert {frozenset(m) for m in merges[:2]} == {
+        frozenset((0, 2)),
+        frozenset((1, 3)),
+    }
+    assert set(merges[2]) == {4, 5}
+
+
+def test_progressive_alignment_is_valid_and_compact():
+    family = generate_witness_family(800, 12, 0.03, seed=3)
+    rows = ProgressiveAligner(family, max_workers=1).align()
+    assert [tid for tid, _ in rows] == [tid for tid, _ in family]
+    assert len({len(row) for _, row in rows}) == 1
+    for (_, text), (_, row) in zip(family, rows):
+        assert row.replace("@", "") == text
+
+    star = StarAligner(family).align()
+    assert len(rows[0][1]) < len(star[0][1])
+    assert ProgressiveAligner(family, max_workers=2).align() == rows
+
+
+def test_pipeline_progressive(tmp_path):
+    for tid, text in generate_witness_family(300, 3, seed=4):
+        (tmp_path / tid).write_text(text, encoding="utf-8")
+    assert run_alignment_pipeline(
+        str(tmp_path), str(tmp_path / "out"), excel=False, progressive=True
+    )
+    assert (tmp_path / "out" / "aligned_w03.txt").exists()
@@ -0,0 +1,139 @@
+import io
+import json
+import random
+import threading
+import urllib.error
+import urllib.request
+
+import openpyxl
+import pytest
+
+from textual_synopsis.server import RequestError, make_server, parse_request
+
+TEXTS = [
+    {"name": "a.txt", "content": "the planet mars i scarcely need remind the reader"},
+    {"name": "b.txt", "content": "the plamet maris i scacely neee remind te reader"},
+]
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server = make_server(port=0, workers=1, timeout=30)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    server.service.shutdown()
+
+
+def _post(url, body, content_type):
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": content_type}
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.headers["Content-Type"], response.read()
+
+
+def test_align_json_rows(base_url):
+    body = json.dumps({"texts": TEXTS}).encode("utf-8")
+    _, data = _post(f"{base_url}/align", body, "application/json")
+    result = json.loads(data)
+    assert result["pivot"] == "a.txt"
+    rows = {r["name"]: r["row"] for r in result["rows"]}
+    assert len(rows["a.txt"]) == len(rows["b.txt"])
+    assert rows["b.txt"].replace("@", "") == TEXTS[1]["content"]
+
+
+def test_align_multipart_xlsx(base_url):
+    boundary = "XyZ"
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="format"\r\n\r\nxlsx\r\n'
+    ]
+    for t in TEXTS:
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; "
+            f'name="texts"; filename="{t["name"]}"\r\n'
+            f"Content-Type: text/plain\r\n\r\n{t['content']}\r\n"
+        )
+    body = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+    content_type, data = _post(
+        f"{base_url}/align", body, f"multipart/form-data; boundary={boundary}"
+    )
+    assert content_type.startswith("application/vnd.openxmlformats")
+    assert openpyxl.load_workbook(io.BytesIO(data)).sheetnames == [
+        "Original",
+        "Printable",
+    ]
+
+
+def test_metrics_and_errors(base_url):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{base_url}/align", b"{}", "application/json")
+    assert error.value.code == 400
+
+    with urllib.request.urlopen(f"{base_url}/metrics") as response:
+        metrics = json.loads(response.read())
+    assert metrics["in_flight"] == 0
+    assert metrics["workers"] == 1
+    assert set(metrics["latency_seconds"]) == {"p50", "p90", "p99"}
+
+
+def test_parse_request_rejects_unknown_options():
+    body = json.dumps({"texts": TEXTS, "options": {"timeout": 1}}).encode("utf-8")
+    with pytest.raises(RequestError, match="Unknown options"):
+        parse_request("application/json", body)
+
+
+def test_parse_request_options():
+    boundary = "XyZ"
+    parts = [
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        for name, value in [("pivot", "2"), ("memory_budget", "64")]
+    ]
+    for t in TEXTS:
+        parts.append(
+            f"--{boundary}\r\nContent-Disposition: form-data; "
+            f'name="texts"; filename="{t["name"]}"\r\n\r\n{t["content"]}\r\n'
+        )
+    body = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+    _, options, _ = parse_request(f"multipart/form-data; boundary={boundary}", body)
+    # A pivot is a text id, the memory budget is in MB like on the command line
+    assert options == {"pivot": "2", "memory_budget": 64 * 1024 * 1024}
+
+    body = json.dumps({"texts": TEXTS, "options": {"time_budget": "soon"}})
+    with pytest.raises(RequestError, match="must be a number"):
+        parse_request("application/json", body.encode("utf-8"))
+
+
+def test_bad_pivot_is_a_client_error(base_url):
+    body = json.dumps({"texts": TEXTS, "options": {"pivot": "c.txt"}})
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _post(f"{base_url}/align", body.encode("utf-8"), "application/json")
+    assert error.value.code == 400
+
+
+def test_timed_out_request_frees_its_worker():
+    server = make_server(port=0, workers=1, timeout=0.5)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        rng = random.Random(0)
+        slow = [
+            {"name": f"{k}.txt", "content": "".join(rng.choices("abcd ", k=3000))}
+            for k in range(40)
+        ]
+        body = json.dumps({"texts": slow}).encode("utf-8")
+        with pytest.raises(urllib.error.HTTPError) as error:
+            _post(f"{base_url}/align", body, "application/json")
+        assert error.value.code == 504
+
+        # The worker stopped the abandoned request and takes the next one
+        body = json.dumps({"texts": TEXTS}).encode("utf-8")
+        _, data = _post(f"{base_url}/align", body, "application/json")
+        assert json.loads(data)["pivot"] == "a.txt"
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.service.shutdown()
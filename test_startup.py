@@ -0,0 +1,50 @@
+import json
+import subprocess
+import sys
+
+# Importing the CLI must stay well below what pandas, openpyxl and Bio cost (~0.5s)
+IMPORT_BUDGET_SECONDS = 0.3
+HEAVY_MODULES = ["pandas", "openpyxl", "Bio", "numpy"]
+
+
+def _run(code):
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def _loaded_heavy_modules(code):
+    return _run(
+        code
+        + f"\nimport json, sys\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+
+
+def test_cli_import_is_light():
+    assert _loaded_heavy_modules("import textual_synopsis.pipeline") == []
+
+
+def test_import_time_budget():
+    code = (
+        "import json, time\n"
+        "start = time.perf_counter()\n"
+        "import textual_synopsis.pipeline\n"
+        "print(json.dumps(time.perf_counter() - start))"
+    )
+    seconds = min(_run(code) for _ in range(3))
+    assert seconds < IMPORT_BUDGET_SECONDS
+
+
+def test_text_only_run_skips_excel_dependencies(tmp_path):
+    for name, content in [("a.txt", "hello world"), ("b.txt", "helo wrld")]:
+        (tmp_path / name).write_text(content, encoding="utf-8")
+    code = (
+        "from textual_synopsis.pipeline import run_alignment_pipeline\n"
+        f"assert run_alignment_pipeline({str(tmp_path)!r}, {str(tmp_path / 'out')!r}, excel=False)"
+    )
+    loaded = _loaded_heavy_modules(code)
+    assert "pandas" not in loaded
+    assert "openpyxl" not in loaded
+    assert (tmp_path / "out" / "aligned_b.txt").exists()
+    assert not (tmp_path / "out" / "alignment_table.xlsx").exists()
@@ -0,0 +1,44 @@
+import io
+import xml.etree.ElementTree as ET
+
+from textual_synopsis.msa_format import save_msa
+from textual_synopsis.tei import TEI_NS, export_tei, write_tei, xml_ids
+from textual_synopsis.to_excel import iter_word_columns
+
+ROWS = [
+    ("a.txt", "the cat@ sat on the mat"),
+    ("b.txt", "the cart sat on @@@ mat"),
+    ("1 c.txt", "the cat@ sat on the mat"),
+]
+NS = {"tei": TEI_NS}
+
+
+def test_xml_ids_are_valid_and_unique():
+    assert xml_ids(["A", "1 c", "A", "ב"]) == ["A", "w1_c", "A_2", "ב"]
+
+
+def test_parallel_segmentation():
+    out = io.StringIO()
+    sigla = ["A", "B", "C"]
+    columns, apps = write_tei(sigla, iter_word_columns([r for _, r in ROWS]), out)
+    assert (columns, apps) == (6, 2)
+
+    root = ET.fromstring(out.getvalue())
+    witnesses = root.findall(".//tei:listWit/tei:witness", NS)
+    assert [w.text for w in witnesses] == sigla
+    ab = root.find(".//tei:body/tei:ab", NS)
+    assert ab.text.strip() == "the"
+    first, second = ab.findall("tei:app", NS)
+    assert [(r.get("wit"), r.text) for r in first] == [("#A #C", "cat"), ("#B", "cart")]
+    assert first.tail.strip() == "sat on"
+    assert [(r.get("wit"), r.text) for r in second] == [("#A #C", "the"), ("#B", None)]
+    assert second.tail.strip() == "mat"
+
+
+def test_export_from_msa(tmp_path):
+    save_msa(tmp_path / "alignment.tsmsa", ROWS)
+    export_tei(str(tmp_path / "alignment.tsmsa"), tmp_path / "out.xml", title="T")
+    root = ET.parse(tmp_path / "out.xml").getroot()
+    assert root.find(".//tei:title", NS).text == "T"
+    ids = [w.get("{http://www.w3.org/XML/1998/namespace}id") for w in root.iter()]
+    assert "w1_c" in ids
@@ -0,0 +1,42 @@
+import io
+
+import openpyxl
+
+from textual_synopsis.to_excel import (
+    _variant_ranges,
+    create_excel_from_texts,
+    variant_columns,
+)
+
+TEXTS = [
+    {"name": "a", "content": "the cat@ sat on the mat"},
+    {"name": "b", "content": "the cart sat on @@@ mat"},
+]
+
+
+def test_variant_ranges_follow_the_sheet_layout():
+    variants = [0, 1, 2, 5, 19, 20, 21, 40]
+    assert _variant_ranges(variants, 3) == ["B1:D3", "G1:G3", "U1:W3", "AP1:AP3"]
+    # Printable chunks of 20 columns, each followed by a blank row
+    assert _variant_ranges(variants, 3, chunk_size=20) == [
+        "B1:D3",
+        "G1:G3",
+        "U1:U3",
+        "B5:C7",
+        "B9:B11",
+    ]
+
+
+def test_variants_are_highlighted_by_sheet_rules():
+    output = io.BytesIO()
+    create_excel_from_texts(TEXTS, output)
+    workbook = openpyxl.load_workbook(io.BytesIO(output.getvalue()))
+    for sheet_name in ["Original", "Printable"]:
+        sheet = workbook[sheet_name]
+        assert sheet.sheet_view.rightToLeft
+        assert sheet["A1"].font.b and sheet["A1"].style == "Witness"
+        assert not sheet["B1"].font.b
+        (rule_range,) = list(sheet.conditional_formatting)
+        assert str(rule_range.sqref) == "C1:C2 F1:F2"
+        assert len(rule_range.rules) == 1
+    assert variant_columns([["the", "cat"], ["the", "cart"]]) == [1]
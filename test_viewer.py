@@ -0,0 +1,44 @@
+from textual_synopsis.msa_format import save_msa
+from textual_synopsis.to_excel import align_to_words
+from textual_synopsis.viewer import AlignmentViewer
+
+ROWS = [
+    ("a.txt", "the cat@ sat on the mat and the dog@ sat on the log"),
+    ("b.txt", "the cart sat on @@@ mat and the dogs sat in the log"),
+    ("c.txt", "the cat@ sat on the mat and the dog@ sat on the log"),
+]
+
+
+def test_pages_match_word_table(tmp_path):
+    table = align_to_words([{"name": tid, "content": row} for tid, row in ROWS])
+    columns = [tuple(column) for column in zip(*table)]
+    save_msa(tmp_path / "alignment.tsmsa", ROWS)
+    viewers = [
+        AlignmentViewer.from_rows(ROWS, page_words=5),
+        AlignmentViewer.open(str(tmp_path / "alignment.tsmsa"), page_words=5),
+        AlignmentViewer.open((tmp_path / "alignment.tsmsa").read_bytes(), page_words=5),
+    ]
+    for viewer in viewers:
+        assert (viewer.num_words, viewer.num_pages) == (13, 3)
+        pages = [viewer.page(n) for n in range(viewer.num_pages)]
+        assert [c for page in pages for c in page.columns] == columns
+        assert pages[0].variants == [1, 4]
+        assert viewer.page(99).number == 2
+        assert viewer.page(1, page_words=10).columns == columns[10:]
+        assert (viewer.count_pages(10), viewer.page_of(12, 10)) == (2, 1)
+        assert viewer.page_words == 5
+        viewer.close()
+
+
+def test_search_and_html():
+    viewer = AlignmentViewer.from_rows(ROWS, page_words=5)
+    assert viewer.search("sat on") == [2, 9]
+    assert viewer.search("sat on", limit=1) == [2]
+    assert viewer.search("dogs sat in") == [8]
+    assert viewer.search("mat the") == []
+    assert viewer.page_of(9) == 1
+
+    html = viewer.page(1).to_html(highlight=[9])
+    assert 'dir="rtl"' in html
+    assert '<td class="hit">sat</td>' in html
+    assert '<td class="variant">dogs</td>' in html